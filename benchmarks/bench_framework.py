@@ -0,0 +1,265 @@
+"""
+Microbenchmarks of the framework's own hot paths, with a stored baseline and a regression gate.
+
+Usage:
+    python -m benchmarks.bench_framework                  # run and compare with benchmarks/baseline.json
+    python -m benchmarks.bench_framework -k validator     # only benchmarks whose name contains `validator`
+    python -m benchmarks.bench_framework --save-baseline  # run and store the results as the new baseline
+
+Covered:
+- `send_request` against the in-process stub server, next to the bare transport call for the same
+  request. The difference is the client-side overhead per request: metrics, timeouts, coalescing
+  and the rate limiter;
+- the `ResponseValidator` checks on a single product and on the product list;
+- `load_json_schema`, `ReadConfig` getters and `setup_logger`;
+- the `helpers.py` generators;
+- payload-template rendering.
+
+Each benchmark is timed in `--rounds` rounds of at least `--round-ms`, and the rounds of all
+benchmarks are interleaved. The median and fastest time per call are reported, and the overhead
+uses the fastest round, which other work on the machine disturbs least. Machines differ, so each
+benchmark's fastest round is divided by the fastest round of a pure-Python calibration loop timed in
+the same pass. This is repeated for `--passes` passes, and the median of these relative times is
+stored and compared. One pass with a disturbed calibration then cannot move every benchmark at once.
+
+A benchmark fails the gate, with exit status 1, when its relative time is more than `--threshold`
+percent above the baseline. The `send_request` and `transport` rows are not gated. They are bound by
+sockets and the stub server, which a CPU calibration loop does not track, so they are reported
+only, together with the client-side overhead.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from utilities.helpers import generate_random_email, generate_random_name, generate_random_password
+from utilities.json_validator import ResponseValidator
+from utilities.logger import setup_logger
+from utilities.payload_template import load_template
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request
+from utilities.schema_loader import load_json_schema
+from utilities.stub_server import start_stub_server
+from utilities.transport import get_transport
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+CALIBRATION = "calibration"
+
+# send_request benchmark -> the bare transport call it is compared with
+OVERHEAD_PAIRS = {
+    "send_request GET product": "transport GET product",
+    "send_request GET product list": "transport GET product list",
+    "send_request POST login": "transport POST login",
+}
+# Network round trips: reported, but not gated
+UNGATED = frozenset(OVERHEAD_PAIRS) | frozenset(OVERHEAD_PAIRS.values())
+
+
+def _calibration():
+    total = 0
+    for index in range(1000):
+        total += index * index % 7
+    return total
+
+
+def _benchmarks(base_url):
+    """:return: Dict of name -> zero-argument callable; the stub server at `base_url` must be running."""
+    login = {"username": ReadConfig.get_admin_username(), "password": ReadConfig.get_admin_password()}
+    transport = get_transport()
+    product = send_request("GET", "products/1")
+    product_list = send_request("GET", "products/")
+    product_schema = load_json_schema("product_schema.json")
+    all_product_schema = load_json_schema("all_products_schema.json")
+    field_types = {"_id": int, "name": str, "price": str, "countInStock": int}
+    field_values = {field: product.json()[field] for field in ("_id", "name", "price")}
+    product_template = load_template("product_template.json")
+    product_payload = product_template.render_json(name="Product 1")
+
+    return {
+        CALIBRATION: _calibration,
+        "send_request GET product": lambda: send_request("GET", "products/1"),
+        "transport GET product": lambda: transport.request("GET", f"{base_url}products/1", timeout=10),
+        "send_request GET product list": lambda: send_request("GET", "products/"),
+        "transport GET product list": lambda: transport.request("GET", f"{base_url}products/", timeout=10),
+        "send_request POST login": lambda: send_request("POST", "users/login/", payload=login),
+        "transport POST login": lambda: transport.request("POST", f"{base_url}users/login/", json=login, timeout=10),
+        "validator headers": lambda: ResponseValidator(product).validate_response_headers(),
+        "validator response time": lambda: ResponseValidator(product).validate_response_time(),
+        "validator payload size": lambda: ResponseValidator(product_list).validate_payload_size(),
+        "validator data types": lambda: ResponseValidator(product).validate_data_type(field_types),
+        "validator field values": lambda: ResponseValidator(product).validate_field_value(field_values),
+        "validator schema product": lambda: ResponseValidator(product).validate_json_schema(product_schema),
+        "validator schema product list": lambda: ResponseValidator(product_list).validate_json_schema(
+            all_product_schema),
+        "load_json_schema": lambda: load_json_schema("all_products_schema.json"),
+        "ReadConfig.get_base_url": ReadConfig.get_base_url,
+        "ReadConfig.get_products_endpoint": ReadConfig.get_products_endpoint,
+        "ReadConfig.get_end_points": ReadConfig.get_end_points,
+        "setup_logger": setup_logger,
+        "generate_random_name": generate_random_name,
+        "generate_random_email": generate_random_email,
+        "generate_random_password": generate_random_password,
+        "json.dumps product payload": lambda: json.dumps({**product_payload, "name": "Product 1"}).encode(),
+        "template render product payload": lambda: product_template.render(name="Product 1"),
+    }
+
+
+def _calls_per_round(function, round_seconds):
+    function()
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= round_seconds:
+            return calls
+        calls = max(calls * 2, int(calls * round_seconds / elapsed * 1.2) if elapsed else calls * 10)
+
+
+def measure(benchmarks, rounds=15, round_seconds=0.02):
+    """
+    Times the benchmarks in interleaved rounds, one round of each in turn, so drift in machine load
+    hits all of them alike.
+
+    :param benchmarks: Dict of name -> zero-argument callable.
+    :return: Dict of name -> median and minimum seconds per call over the rounds.
+    """
+    calls = {name: _calls_per_round(function, round_seconds) for name, function in benchmarks.items()}
+    per_call = {name: [] for name in benchmarks}
+    for _ in range(rounds):
+        for name, function in benchmarks.items():
+            started = time.perf_counter()
+            for _ in range(calls[name]):
+                function()
+            per_call[name].append((time.perf_counter() - started) / calls[name])
+    return {name: {"median_s": statistics.median(times), "min_s": min(times), "calls": calls[name] * rounds}
+            for name, times in per_call.items()}
+
+
+def run(name_filter=None, rounds=7, round_seconds=0.02, product_count=100, passes=5):
+    """
+    Starts the stub server, points the framework at it and times every benchmark in `passes` passes.
+
+    :return: Dict of name -> median of the passes' medians, fastest round overall and `relative`: the
+        median over the passes of the fastest round divided by the calibration's fastest round.
+    """
+    server = start_stub_server(admin_username=ReadConfig.get_admin_username(),
+                               admin_password=ReadConfig.get_admin_password(), product_count=product_count)
+    previous_base_url = os.environ.get("API_BASE_URL")
+    os.environ["API_BASE_URL"] = server.base_url
+    try:
+        benchmarks = {name: function for name, function in _benchmarks(server.base_url).items()
+                      if name == CALIBRATION or not name_filter or name_filter in name}
+        measured = [measure(benchmarks, rounds, round_seconds) for _ in range(passes)]
+    finally:
+        if previous_base_url is None:
+            os.environ.pop("API_BASE_URL", None)
+        else:
+            os.environ["API_BASE_URL"] = previous_base_url
+        server.stop()
+    return {
+        name: {
+            "median_s": statistics.median(item[name]["median_s"] for item in measured),
+            "min_s": min(item[name]["min_s"] for item in measured),
+            "calls": sum(item[name]["calls"] for item in measured),
+            "relative": statistics.median(item[name]["min_s"] / item[CALIBRATION]["min_s"] for item in measured),
+        }
+        for name in benchmarks
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Stores the results, keeping the baseline entries of benchmarks this run filtered out."""
+    stored = (load_baseline(path) or {}).get("results", {})
+    stored.update({name: {"min_us": round(result["min_s"] * 1e6, 3), "relative": round(result["relative"], 4)}
+                   for name, result in results.items()})
+    baseline = {"python": platform.python_version(), "machine": platform.machine(), "results": stored}
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2)
+        file.write("\n")
+
+
+def compare(results, baseline, threshold_percent):
+    """
+    :return: Dict of name -> change in percent of the relative time against the baseline
+        (None for benchmarks the baseline does not have), and the gated names over the threshold.
+    """
+    changes, regressions = {}, []
+    previous = (baseline or {}).get("results", {})
+    for name, result in results.items():
+        if name == CALIBRATION or name not in previous:
+            changes[name] = None
+            continue
+        changes[name] = (result["relative"] / previous[name]["relative"] - 1) * 100
+        if changes[name] > threshold_percent and name not in UNGATED:
+            regressions.append(name)
+    return changes, regressions
+
+
+def _format_time(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def print_results(results, changes):
+    print(f"{'benchmark':<36}{'median':>12}{'min':>12}{'ops/s':>12}{'vs baseline':>13}")
+    for name, result in results.items():
+        change = changes.get(name)
+        change = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<36}{_format_time(result['median_s']):>12}{_format_time(result['min_s']):>12}"
+              f"{1 / result['median_s']:>12,.0f}{change:>13}{'  (not gated)' if name in UNGATED else ''}")
+    overheads = [(name, results[name]["min_s"] - results[bare]["min_s"], results[bare]["min_s"])
+                 for name, bare in OVERHEAD_PAIRS.items() if name in results and bare in results]
+    if overheads:
+        print("\nClient-side overhead of send_request over the bare transport call:")
+        for name, overhead, bare in overheads:
+            print(f"{name:<36}{_format_time(overhead):>12} per request ({overhead / bare:+.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the framework's own hot paths and gate on regressions.")
+    parser.add_argument("-k", dest="name_filter", help="Only benchmarks whose name contains this text")
+    parser.add_argument("--rounds", type=int, default=7, help="Timing rounds per pass")
+    parser.add_argument("--passes", type=int, default=5,
+                        help="Repeated passes; the gate uses the median relative time over them")
+    parser.add_argument("--round-ms", type=float, default=20.0, help="Minimum duration of a timing round")
+    parser.add_argument("--products", type=int, default=100, help="Products in the stub's product list")
+    parser.add_argument("--threshold", type=float, default=25.0,
+                        help="Fail when the relative time is this many percent above the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.name_filter, args.rounds, args.round_ms / 1000, args.products, args.passes)
+    baseline = load_baseline(args.baseline)
+    changes, regressions = compare(results, baseline, args.threshold)
+    print_results(results, changes)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    if regressions:
+        print(f"\nRegressed by more than {args.threshold:g}%: {', '.join(regressions)}")
+        return 1
+    print(f"\nNo regression above {args.threshold:g}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
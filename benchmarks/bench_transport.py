@@ -0,0 +1,119 @@
+"""
+Throughput and tail latency of each transport against a local h2-capable stand-in server.
+
+Usage:
+    python -m benchmarks.bench_transport --requests 2000 --concurrency 32
+
+The stand-in is served by hypercorn (HTTP/1.1 and cleartext HTTP/2 on one port) when it is installed,
+otherwise by the standard-library stub and only the HTTP/1.1 transports are measured.
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from utilities.stub_server import StubApi, start_h2_stub_server, start_stub_server
+from utilities.transport import Http2Transport, RequestsTransport, http2_available
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _calls(base_url, count):
+    # Small JSON GETs and POSTs to one host, like the test suite
+    login = {"username": "admin@example.com", "password": "1234"}
+    for index in range(count):
+        if index % 4 == 3:
+            yield "POST", f"{base_url}users/login/", login
+        else:
+            yield "GET", f"{base_url}products/{index % 20 + 1}", None
+
+
+def _summary(name, latencies, elapsed):
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    return {
+        "transport": name,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def bench_threads(name, request, base_url, count, concurrency):
+    def timed(call):
+        method, url, payload = call
+        started = time.perf_counter()
+        response = request(method, url, headers=JSON_HEADERS, json=payload, timeout=10)
+        assert response.status_code == 200, response.status_code
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, _calls(base_url, count)))
+    return _summary(name, latencies, time.perf_counter() - started)
+
+
+def bench_async(name, transport, base_url, count, concurrency):
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(call):
+            method, url, payload = call
+            async with semaphore:
+                started = time.perf_counter()
+                response = await transport.request_async(method, url, headers=JSON_HEADERS, json=payload, timeout=10)
+                assert response.status_code == 200, response.status_code
+                return (time.perf_counter() - started) * 1000
+
+        return await asyncio.gather(*(timed(call) for call in _calls(base_url, count)))
+
+    started = time.perf_counter()
+    latencies = list(asyncio.run(run()))
+    return _summary(name, latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTTP/1.1 and HTTP/2 transports.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--server-latency-ms", type=float, default=2.0, help="Artificial server time per request")
+    args = parser.parse_args()
+
+    api = StubApi(latency_ms=args.server_latency_ms, admin_username="admin@example.com", admin_password="1234")
+    try:
+        server = start_h2_stub_server(api=api)
+        h2_server = True
+    except ImportError:
+        print("hypercorn not installed: serving HTTP/1.1 only, HTTP/2 transports skipped")
+        server = start_stub_server(api=api)
+        h2_server = False
+
+    results = []
+    with server:
+        results.append(bench_threads("requests, no pooling", requests.request, server.base_url,
+                                     args.requests, args.concurrency))
+        pooled = RequestsTransport(pool_maxsize=args.concurrency)
+        results.append(bench_threads("http1 pooled", pooled.request, server.base_url, args.requests, args.concurrency))
+        pooled.close()
+        if http2_available() and h2_server:
+            http2 = Http2Transport(prior_knowledge=True)
+            results.append(bench_threads("http2 threads", http2.request, server.base_url,
+                                         args.requests, args.concurrency))
+            results.append(bench_async("http2 asyncio", http2, server.base_url, args.requests, args.concurrency))
+            http2.close()
+
+    print(f"{'transport':<22}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in results:
+        print(f"{row['transport']:<22}{row['requests']:>10}{row['rps']:>10.1f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
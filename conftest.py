@@ -1,7 +1,11 @@
 import pytest
 
+from utilities.read_config import ReadConfig
+
+pytest_plugins = ["utilities.duration_history", "utilities.result_sink", "utilities.profiling", "utilities.slo", "utilities.db_snapshot", "utilities.single_flight", "utilities.dashboard", "utilities.adaptive_timeout", "utilities.compression"]
+
+
 @pytest.fixture(scope="session")
 def base_url():
-    return "http://127.0.0.1:8000/api/"
-
+    return ReadConfig.get_base_url()
 
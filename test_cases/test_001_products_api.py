@@ -1,7 +1,10 @@
+import json
+
 import pytest
 from utilities.get_token import get_auth_token
 from utilities.json_validator import ResponseValidator
 from utilities.logger import setup_logger
+from utilities.payload_template import load_template
 from utilities.read_config import ReadConfig
 from utilities.request_handler import send_request
 from utilities.schema_loader import load_json_schema
@@ -12,6 +15,7 @@ endpoint = ReadConfig.get_products_endpoint()
 product_id = 1
 product_schema = load_json_schema("product_schema.json")
 all_product_schema = load_json_schema("all_products_schema.json")
+product_template = load_template("product_template.json")
 headers = {'Content-Type': 'application/json'}
 
 # ----- Fixture for creating and deleting a product -----
@@ -23,21 +27,14 @@ def created_product():
         'Authorization': f'Bearer {token}'
     }
 
-    payload = {
-        "name": "Fixture Product",
-        "image": "/images/test_fixture.jpg",
-        "brand": "BrandFixture",
-        "category": "CategoryFixture",
-        "description": "Created from fixture",
-        "price": "99.99",
-        "countInStock": 5
-    }
+    body = product_template.render(name="Fixture Product")
+    payload = json.loads(body)
 
     response = send_request(
         method="POST",
         endpoint=f"{endpoint}/create/",
         headers=auth_headers,
-        payload=payload,
+        data=body,
         logger=logger
     )
     assert response.status_code == 200, f"Setup failed with status: {response.status_code}"
@@ -84,6 +81,7 @@ def test_get_products_list():
     validator = ResponseValidator(response, logger=logger)
     validator.validate_response_headers()
     validator.validate_response_time()
+    validator.validate_payload_size()
     validator.validate_json_schema(schema=all_product_schema)
 
 
@@ -30,6 +30,7 @@ def test_get_users():
     validator = ResponseValidator(response, logger=logger)
     validator.validate_response_headers()
     validator.validate_response_time()
+    validator.validate_payload_size()
 
 def test_get_user_by_id(create_user):
     user_id = create_user['id']
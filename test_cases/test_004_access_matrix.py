@@ -0,0 +1,13 @@
+from utilities.access_matrix import AccessMatrix, load_matrix
+from utilities.logger import setup_logger
+from utilities.read_config import ReadConfig
+
+logger = setup_logger(log_file_path=ReadConfig.get_logs_access_matrix_path())
+
+
+def test_access_matrix():
+    report = AccessMatrix(load_matrix(ReadConfig.get_access_matrix()), logger=logger).run()
+    logger.info("Access matrix:\n" + report.format_table(only_mismatches=False))
+    assert not report.mismatches, (
+        f"{len(report.mismatches)} of {len(report.cells)} access checks failed:\n{report.format_table()}"
+    )
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from utilities.payload_template import PayloadTemplate, compile_request_specs, load_template
+
+
+def compact(document):
+    return json.dumps(document, separators=(",", ":")).encode("ascii")
+
+
+def test_render_matches_json_dumps():
+    document = {
+        "name": "Zoë \"quoted\" \\ tab\t",
+        "price": 9.99,
+        "countInStock": 0,
+        "active": True,
+        "deleted": False,
+        "parent": None,
+        "tags": ["a", 1, {"nested": [None, 2.5]}],
+        "empty": {},
+    }
+    assert PayloadTemplate(document).render() == compact(document)
+
+
+def test_value_slot_keeps_json_type():
+    template = PayloadTemplate({"count": "{{count}}", "tags": "{{tags}}", "flag": "{{flag}}"})
+    values = {"count": 5, "tags": ["x", {"y": None}], "flag": False}
+    assert template.render(**values) == compact(values)
+
+
+def test_text_slot_is_interpolated_and_escaped():
+    template = PayloadTemplate({"name": "Product {{n}} of {{total}}"})
+    body = template.render(n='"7"', total=10)
+    assert json.loads(body) == {"name": 'Product "7" of 10'}
+    assert body == compact({"name": 'Product "7" of 10'})
+
+
+def test_bind_folds_values_into_constants():
+    template = PayloadTemplate({"user": "{{user_id}}", "note": "for {{user_id}}", "email": "{{email}}"})
+    bound = template.bind(user_id=42)
+    assert bound.placeholders == ("email",)
+    assert json.loads(bound.render(email="a@b.c")) == {"user": 42, "note": "for 42", "email": "a@b.c"}
+    assert template.placeholders == ("user_id", "email")
+    with pytest.raises(ValueError):
+        template.bind(unknown=1)
+
+
+def test_generators_and_missing_values():
+    template = PayloadTemplate({"a": "{{random_email}}", "b": "{{random_email}}"},
+                               generators={"random_email": iter(["x@y.z", "other@y.z"]).__next__})
+    assert json.loads(template.render()) == {"a": "x@y.z", "b": "x@y.z"}
+    with pytest.raises(ValueError):
+        PayloadTemplate({"a": "{{nothing}}"}).render()
+
+
+def test_constant_template_renders_same_bytes():
+    template = PayloadTemplate({"username": "admin", "password": "1234"})
+    assert template.placeholders == ()
+    assert template.render() is template.render()
+
+
+def test_resource_templates():
+    product = json.loads(load_template("product_template.json").render(name="Fixture Product"))
+    assert product["name"] == "Fixture Product" and product["countInStock"] == 5
+    user = load_template("user_template.json")
+    values = user.resolve()
+    assert json.loads(user.render(**values)) == {
+        "name": values["random_name"], "email": values["random_email"], "password": values["random_password"]
+    }
+
+
+def test_compile_request_specs():
+    get, post = compile_request_specs([
+        {"method": "GET", "endpoint": "products/"},
+        {"method": "POST", "endpoint": "users/login/", "payload": {"username": "u"}, "headers": {"X-Trace": "1"}},
+    ])
+    assert get["template"] is None
+    assert post["template"].render() == b'{"username":"u"}'
+    assert post["headers"] == {"Content-Type": "application/json", "X-Trace": "1"}
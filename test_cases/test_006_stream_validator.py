@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from jsonschema import ValidationError, validate
+
+from utilities.stream_validator import StreamValidationError, validate_stream
+
+PRODUCT = {
+    "type": "object",
+    "required": ["_id", "name", "price"],
+    "additionalProperties": False,
+    "properties": {
+        "_id": {"type": "integer", "minimum": 1},
+        "name": {"type": "string", "minLength": 1, "maxLength": 20, "pattern": "^[A-Z]"},
+        "price": {"type": "number", "exclusiveMinimum": 0, "multipleOf": 0.01},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 2},
+        "status": {"enum": ["new", "used", None]},
+    },
+}
+
+CASES = [
+    (PRODUCT, b'{"_id": 1, "name": "Phone", "price": 9.99, "tags": ["a", "b"], "status": null}'),
+    (PRODUCT, b'{"_id": 0, "name": "Phone", "price": 9.99}'),
+    (PRODUCT, b'{"_id": 1, "name": "phone", "price": 9.99}'),
+    (PRODUCT, b'{"_id": 1, "name": "Phone", "price": 0}'),
+    (PRODUCT, b'{"_id": 1, "name": "Phone"}'),
+    (PRODUCT, b'{"_id": 1, "name": "Phone", "price": 1, "extra": 1}'),
+    (PRODUCT, b'{"_id": 1, "name": "Phone", "price": 1, "tags": ["a", "b", "c"]}'),
+    (PRODUCT, b'{"_id": 1, "name": "Phone", "price": 1, "status": "old"}'),
+    (PRODUCT, b'{"_id": 1.0, "name": "Ph\\u00f6ne", "price": 1}'),
+    (PRODUCT, b'{"_id": true, "name": "Phone", "price": 1}'),
+    ({"type": "array", "items": {"type": "object"}}, b'[{}, {"a": [1, {"b": null}]}]'),
+    ({"type": "array", "items": {"type": "object"}}, b'[{}, 1]'),
+    ({"enum": [[1], {"a": 0}]}, b'[1]'),
+    ({"enum": [[1], {"a": 0}]}, b'[true]'),
+    ({"enum": [[1], {"a": 0}]}, b'{"a": 0}'),
+    ({"enum": [[1], {"a": 0}]}, b'{"a": false}'),
+    ({"const": {"flags": [False, 0]}}, b'{"flags": [false, 0]}'),
+    ({"const": {"flags": [False, 0]}}, b'{"flags": [0, false]}'),
+    ({"enum": [1]}, b'true'),
+    ({"type": "string"}, b'"a\\tb"'),
+    ({"type": "string"}, b'"a\x01b"'),
+    ({"type": "string"}, b'"a\tb"'),
+    ({"type": "string"}, b'"a\\qb"'),
+    ({"type": "object"}, b'{"a\x1fb": 1}'),
+    ({"type": "object"}, b'{"a": 1,}'),
+    ({"type": "array"}, b'[1] 2'),
+]
+
+
+def reference_result(schema, body):
+    try:
+        validate(json.loads(body), schema)
+    except (ValueError, ValidationError):
+        return False
+    return True
+
+
+def streaming_result(schema, body):
+    try:
+        validate_stream(body, schema)
+    except StreamValidationError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("schema, body", CASES)
+def test_streaming_matches_jsonschema(schema, body):
+    assert streaming_result(schema, body) == reference_result(schema, body)
+
+
+def test_extracts_fields_while_validating():
+    body = json.dumps({"page": 1, "products": [{"_id": 1, "name": "A", "price": 1},
+                                               {"_id": 2, "name": "B", "price": 2}]}).encode("utf-8")
+    schema = {"type": "object", "properties": {"products": {"type": "array", "items": PRODUCT}}}
+    assert validate_stream(body, schema, fields=("page", "products.*._id")) == {"page": 1, "products.*._id": [1, 2]}
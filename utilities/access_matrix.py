@@ -0,0 +1,274 @@
+"""
+Role-based access matrix: every (role, endpoint) pair checked in one concurrent pass.
+
+A matrix (see `resources/matrices/access_matrix.json`) lists the roles - `anonymous`, `user`, `admin` - and
+the endpoints. Each endpoint has a method, a path built from `[end_points]` keys, an optional payload, and
+the expected result per role: `allow` (2xx), `deny` (401/403) or an exact status code. The executor:
+
+1. gets each role's token once: the admin logs in, `user` is a throwaway account registered for the run;
+2. creates a fresh target (user or product) for every cell of an endpoint with `target`, so a DELETE
+   allowed for one role cannot turn another role's cell into a 404;
+3. sends the whole cross product concurrently and compares each status with the expectation;
+4. deletes the throwaway account, the targets and whatever `creates` endpoints made.
+
+Path and payload strings may use `{<[end_points] key>}`, `{user_id}` / `{product_id}` (the cell's target),
+`{self_name}` / `{self_email}` (the acting role), `{member_email}` / `{member_password}` (the throwaway
+account) and `{unique_name}` / `{unique_email}` (fresh for every cell).
+
+Usage:
+    python -m utilities.access_matrix access_matrix.json --workers 32
+"""
+import argparse
+import json
+import os
+import sys
+
+from utilities.helpers import generate_random_email, generate_random_name, generate_random_password
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request, send_requests_concurrently
+
+_resources_dir = os.path.join(os.path.dirname(__file__), "..", "resources")
+
+ROLES = ("anonymous", "user", "admin")
+ALLOW, DENY = "allow", "deny"
+_TARGETS = ("user", "product")
+
+
+def load_matrix(matrix):
+    """
+    :param matrix: Path, or file name under `resources/matrices/`.
+    """
+    path = matrix if os.path.exists(matrix) else os.path.join(_resources_dir, "matrices", matrix)
+    with open(path) as file:
+        return json.load(file)
+
+
+def _load_payload(name):
+    with open(os.path.join(_resources_dir, "payloads", name)) as file:
+        return json.load(file)
+
+
+def outcome(status):
+    """`allow` for 2xx, `deny` for 401/403, otherwise the status itself."""
+    if status is None:
+        return "no response"
+    if 200 <= status < 300:
+        return ALLOW
+    if status in (401, 403):
+        return DENY
+    return f"status {status}"
+
+
+def _fill(value, context):
+    if isinstance(value, str):
+        try:
+            return value.format_map(context)
+        except KeyError as error:
+            raise ValueError(f"Unknown placeholder {error} in '{value}'") from None
+    if isinstance(value, dict):
+        return {key: _fill(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, context) for item in value]
+    return value
+
+
+class AccessCell:
+    __slots__ = ("endpoint", "method", "path", "template", "role", "expected", "status")
+
+    def __init__(self, endpoint, method, path, template, role, expected, status=None):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        # Path with the target placeholder left in, the same for every role
+        self.template = template
+        self.role = role
+        self.expected = expected
+        self.status = status
+
+    @property
+    def ok(self):
+        if isinstance(self.expected, int):
+            return self.status == self.expected
+        return outcome(self.status) == self.expected
+
+    def __repr__(self):
+        return f"AccessCell({self.endpoint!r}, {self.role!r}, expected={self.expected!r}, status={self.status})"
+
+
+class AccessMatrixReport:
+    def __init__(self, roles, cells):
+        self.roles = roles
+        self.cells = cells
+
+    @property
+    def mismatches(self):
+        return [cell for cell in self.cells if not cell.ok]
+
+    def format_table(self, only_mismatches=True):
+        """One row per endpoint, one column per role; a mismatched cell shows what was expected."""
+        rows = {}
+        for cell in self.cells:
+            row = rows.setdefault((cell.endpoint, f"{cell.method} {cell.template}"), {})
+            text = str(cell.status) if cell.status is not None else "-"
+            row[cell.role] = text if cell.ok else f"{text} (expected {cell.expected}) X"
+        if only_mismatches:
+            rows = {key: row for key, row in rows.items() if any(text.endswith(" X") for text in row.values())}
+        if not rows:
+            return "no mismatches" if only_mismatches else ""
+        header = ["endpoint", "request", *self.roles]
+        lines = [[name, request, *(row.get(role, "") for role in self.roles)] for (name, request), row in rows.items()]
+        widths = [max(len(line[column]) for line in [header, *lines]) for column in range(len(header))]
+        return "\n".join("  ".join(text.ljust(width) for text, width in zip(line, widths)).rstrip()
+                         for line in [header, *lines])
+
+
+class AccessMatrix:
+    """
+    :param matrix: Matrix dict (see `load_matrix`).
+    :param max_workers: Requests in flight (default `[access_matrix] max_workers`).
+    :param logger: Optional logger passed to every request.
+    """
+
+    def __init__(self, matrix, max_workers=None, logger=None):
+        self.roles = matrix.get("roles", list(ROLES))
+        unknown = set(self.roles) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown roles {sorted(unknown)}; supported roles are {', '.join(ROLES)}.")
+        self.endpoints = matrix["endpoints"]
+        for endpoint in self.endpoints:
+            missing = set(self.roles) - set(endpoint["expect"])
+            if missing:
+                raise ValueError(f"Endpoint '{endpoint['name']}' has no expectation for {sorted(missing)}.")
+            if endpoint.get("target") not in (None, *_TARGETS):
+                raise ValueError(f"Endpoint '{endpoint['name']}' has unknown target '{endpoint['target']}'.")
+        self.max_workers = max_workers or ReadConfig.get_access_matrix_max_workers()
+        self.logger = logger
+        self.paths = ReadConfig.get_end_points()
+        self.member_password = generate_random_password()
+        self._created = []  # (kind, id) to delete afterwards
+
+    def _headers(self, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return headers
+
+    def _sign_in(self):
+        """:return: Dict of role -> identity (token, name, email)."""
+        response = send_request("POST", self.paths["login_endpoint"], headers=self._headers(), logger=self.logger,
+                                payload={"username": ReadConfig.get_admin_username(),
+                                         "password": ReadConfig.get_admin_password()})
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Admin login failed: {getattr(response, 'status_code', 'no response')}")
+        admin = response.json()
+        member = self._register(self.member_password)
+        return {
+            "anonymous": {"token": None, "name": "", "email": ""},
+            "user": {"token": member["token"], "name": member["name"], "email": member["email"]},
+            "admin": {"token": admin["token"], "name": admin.get("name", ""), "email": admin.get("email", "")},
+        }
+
+    def _register(self, password=None):
+        payload = {"name": generate_random_name(), "email": generate_random_email(),
+                   "password": password or generate_random_password()}
+        response = send_request("POST", self.paths["register_user_endpoint"], headers=self._headers(),
+                                payload=payload, logger=self.logger)
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Registering a matrix user failed: {getattr(response, 'status_code', 'no response')}")
+        data = response.json()
+        self._created.append(("user", data["_id"]))
+        return data
+
+    def _create_targets(self, kinds, admin_token):
+        """Creates one target per entry of `kinds` concurrently; returns their IDs in order."""
+        product_payload = _load_payload("product_payload.json")
+        specs = []
+        for kind in kinds:
+            if kind == "user":
+                specs.append({"method": "POST", "endpoint": self.paths["register_user_endpoint"],
+                              "headers": self._headers(), "logger": self.logger,
+                              "payload": {"name": generate_random_name(), "email": generate_random_email(),
+                                          "password": generate_random_password()}})
+            else:
+                specs.append({"method": "POST", "endpoint": f"{self.paths['products_endpoint']}/create/",
+                              "headers": self._headers(admin_token), "payload": product_payload,
+                              "logger": self.logger})
+        ids = []
+        for kind, response in zip(kinds, send_requests_concurrently(specs, self.max_workers)):
+            if isinstance(response, Exception) or response is None or response.status_code != 200:
+                raise RuntimeError(f"Creating a {kind} target failed: {getattr(response, 'status_code', response)}")
+            ids.append(response.json()["_id"])
+            self._created.append((kind, ids[-1]))
+        return ids
+
+    def _cleanup(self, admin_token):
+        specs = []
+        for kind, entity_id in self._created:
+            endpoint = (f"{self.paths['delete_user_endpoint']}{entity_id}/" if kind == "user"
+                        else f"{self.paths['products_endpoint']}/delete/{entity_id}/")
+            specs.append({"method": "DELETE", "endpoint": endpoint, "headers": self._headers(admin_token),
+                          "logger": self.logger})
+        # Already-deleted targets (an allowed DELETE cell) answer 404, which is fine here
+        send_requests_concurrently(specs, self.max_workers)
+        self._created = []
+
+    def run(self):
+        """:return: `AccessMatrixReport` with one cell per (endpoint, role)."""
+        identities = self._sign_in()
+        admin_token = identities["admin"]["token"]
+        try:
+            pairs = [(endpoint, role) for endpoint in self.endpoints for role in self.roles]
+            target_indexes = [index for index, (endpoint, _) in enumerate(pairs) if endpoint.get("target")]
+            target_ids = dict(zip(
+                target_indexes,
+                self._create_targets([pairs[index][0]["target"] for index in target_indexes], admin_token),
+            ))
+            cells, specs = [], []
+            for index, (endpoint, role) in enumerate(pairs):
+                identity = identities[role]
+                context = {
+                    **self.paths,
+                    "self_name": identity["name"], "self_email": identity["email"],
+                    "member_email": identities["user"]["email"], "member_password": self.member_password,
+                    "unique_name": generate_random_name(), "unique_email": generate_random_email(),
+                }
+                template = None
+                if endpoint.get("target"):
+                    placeholder = f"{endpoint['target']}_id"
+                    template = _fill(endpoint["path"], {**context, placeholder: f"{{{placeholder}}}"})
+                    context[placeholder] = target_ids[index]
+                payload = endpoint.get("payload")
+                if "payload_file" in endpoint:
+                    payload = _load_payload(endpoint["payload_file"])
+                path = _fill(endpoint["path"], context)
+                template = template or path
+                cells.append(AccessCell(endpoint["name"], endpoint["method"], path, template, role,
+                                        endpoint["expect"][role]))
+                specs.append({"method": endpoint["method"], "endpoint": path, "headers": self._headers(identity["token"]),
+                              "payload": _fill(payload, context), "logger": self.logger})
+            for cell, (endpoint, _), response in zip(cells, pairs, send_requests_concurrently(specs, self.max_workers)):
+                if isinstance(response, Exception) or response is None:
+                    continue
+                cell.status = response.status_code
+                creates = endpoint.get("creates")
+                if creates and 200 <= response.status_code < 300:
+                    self._created.append((creates, response.json()["_id"]))
+            return AccessMatrixReport(self.roles, cells)
+        finally:
+            self._cleanup(admin_token)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check every role against every endpoint in one pass.")
+    parser.add_argument("matrix", nargs="?", default=None, help="Matrix path or name in resources/matrices/")
+    parser.add_argument("--workers", type=int, default=None, help="Maximum requests in flight")
+    args = parser.parse_args(argv)
+
+    report = AccessMatrix(load_matrix(args.matrix or ReadConfig.get_access_matrix()), max_workers=args.workers).run()
+    print(report.format_table(only_mismatches=False))
+    print(f"{len(report.cells)} cells, {len(report.mismatches)} mismatches")
+    return 1 if report.mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""
+Adaptive per-endpoint timeouts learned from latency history.
+
+`send_request` calls that do not pass a `timeout` get one per endpoint, as a (connect, read) pair:
+
+- read: the endpoint's `[timeouts] percentile` latency times `safety_factor`, clamped to
+  `read_floor_seconds` .. `read_cap_seconds`;
+- connect: the same percentile over all endpoints times `safety_factor`, clamped to
+  `connect_floor_seconds` .. `connect_cap_seconds`. Any response implies its connection was made,
+  so a latency is an upper bound on the connect time. The floor stays above TCP's SYN retransmit
+  delays, so that a busy listen queue is not mistaken for a dead host.
+
+A hung login then fails after about a second, while a slow bulk list still gets several times its
+usual time. Endpoints with fewer than `min_samples` latencies use `default_seconds`.
+
+The distribution is seeded from the last `history_runs` runs stored in `[timeouts] database_path`,
+per base URL, and keeps learning from every response of the current run. Connection errors are
+ignored. A read timeout is a censored sample - the response would have taken at least the limit - so
+it is recorded at the limit, and an adaptive limit is widened by `safety_factor` (up to
+`read_cap_seconds`): an endpoint that has become slower than it used to be gets more time instead of
+timing out for this run and the next `history_runs`. A response that takes more than `warn_ratio` of
+its endpoint's read timeout is logged. Both are summed up at the end of the run.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import pytest
+
+from utilities.latency_histogram import LatencyHistogram
+from utilities.metrics import normalize_endpoint, request_metrics
+from utilities.read_config import ReadConfig
+
+_log = logging.getLogger(__name__)
+
+# Limits are recomputed after this many new samples of an endpoint, not on every request
+_RECOMPUTE_EVERY = 32
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS endpoint_latencies (
+    base_url TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    histogram TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_endpoint_latencies ON endpoint_latencies (base_url, endpoint, recorded_at);
+"""
+
+
+class LatencyHistory:
+    """
+    SQLite store of one latency histogram per endpoint and run.
+
+    :param path: Database file; created on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record_run(self, base_url, histograms, run_id=None):
+        """:param histograms: Dict of endpoint key -> `LatencyHistogram` recorded in this run."""
+        run_id = run_id or uuid.uuid4().hex
+        now = time.time()
+        rows = [(base_url, endpoint, run_id, json.dumps(histogram.to_dict()), now)
+                for endpoint, histogram in histograms.items() if histogram.total]
+        with self._connect() as connection:
+            connection.executemany("INSERT INTO endpoint_latencies VALUES (?, ?, ?, ?, ?)", rows)
+
+    def load(self, base_url, runs=10):
+        """:return: Dict of endpoint key -> `LatencyHistogram` merged over its last `runs` runs."""
+        query = """
+            SELECT endpoint, histogram FROM (
+                SELECT endpoint, histogram,
+                       ROW_NUMBER() OVER (PARTITION BY endpoint ORDER BY recorded_at DESC) AS recency
+                FROM endpoint_latencies WHERE base_url = ?
+            ) WHERE recency <= ?
+        """
+        histograms = defaultdict(LatencyHistogram)
+        with self._connect() as connection:
+            for endpoint, histogram in connection.execute(query, (base_url, runs)):
+                histograms[endpoint].merge(LatencyHistogram.from_dict(json.loads(histogram)))
+        return dict(histograms)
+
+
+class _Endpoint:
+    __slots__ = ("learned", "recorded", "pending", "read", "near_limit", "timeouts")
+
+    def __init__(self, learned=None):
+        # History plus this run; `recorded` holds this run only, for saving
+        self.learned = learned or LatencyHistogram()
+        self.recorded = LatencyHistogram()
+        self.pending = 0
+        self.read = None
+        self.near_limit = 0
+        self.timeouts = 0
+
+
+class AdaptiveTimeouts:
+    """
+    :param history: Dict of endpoint key -> `LatencyHistogram` to start from.
+    :param percentile: Latency percentile the limits are based on.
+    :param safety_factor: Multiplier applied to that percentile.
+    :param min_samples: Samples an endpoint needs before its timeout adapts.
+    :param default_seconds: Timeout of endpoints without enough samples.
+    :param read_bounds: (floor, cap) of read timeouts in seconds.
+    :param connect_bounds: (floor, cap) of the connect timeout in seconds.
+    :param warn_ratio: Share of the read timeout above which a response is reported.
+    """
+
+    def __init__(self, history=None, percentile=99.9, safety_factor=3.0, min_samples=50, default_seconds=10.0,
+                 read_bounds=(1.0, 30.0), connect_bounds=(3.05, 10.0), warn_ratio=0.8):
+        self.percentile = percentile
+        self.safety_factor = safety_factor
+        self.min_samples = min_samples
+        self.default_seconds = default_seconds
+        self.read_bounds = read_bounds
+        self.connect_bounds = connect_bounds
+        self.warn_ratio = warn_ratio
+        self._lock = threading.Lock()
+        self._endpoints = {endpoint: _Endpoint(histogram) for endpoint, histogram in (history or {}).items()}
+        self._overall = LatencyHistogram()
+        for histogram in (history or {}).values():
+            self._overall.merge(histogram)
+        self._overall_pending = 0
+        self._connect = None
+        self.initial = {}
+        with self._lock:
+            for endpoint, state in self._endpoints.items():
+                self._update(state)
+                self.initial[endpoint] = state.read
+            self._update_connect()
+
+    def _limit(self, histogram, bounds):
+        if histogram.total < self.min_samples:
+            return None
+        floor, cap = bounds
+        return min(cap, max(floor, histogram.percentile(self.percentile) / 1000 * self.safety_factor))
+
+    def _update(self, state):
+        state.read = self._limit(state.learned, self.read_bounds)
+        state.pending = 0
+
+    def _update_connect(self):
+        self._connect = self._limit(self._overall, self.connect_bounds)
+        self._overall_pending = 0
+
+    def timeout(self, endpoint):
+        """:return: (connect_seconds, read_seconds) for a request to `endpoint`."""
+        state = self._endpoints.get(normalize_endpoint(endpoint))
+        read = state.read if state is not None and state.read is not None else self.default_seconds
+        connect = self._connect if self._connect is not None else self.default_seconds
+        return connect, read
+
+    def observe(self, sample):
+        """
+        `request_metrics` listener: learns from every response, reports those close to their limit and
+        widens the limit of endpoints that time out.
+        """
+        if sample.status is None and not sample.timed_out:
+            return  # a connection error says nothing about how long a response takes
+        with self._lock:
+            state = self._endpoints.get(sample.endpoint)
+            if state is None:
+                state = self._endpoints[sample.endpoint] = _Endpoint()
+            limit = state.read if state.read is not None else self.default_seconds
+            latency_ms = sample.latency_ms
+            if sample.timed_out:
+                # Censored: the response would have taken at least the limit
+                latency_ms = max(latency_ms, limit * 1000)
+                state.timeouts += 1
+                if state.read is not None:
+                    state.read = min(self.read_bounds[1], state.read * self.safety_factor)
+                    _log.warning(f"{sample.method} {sample.endpoint} hit the adaptive limit of {limit:.2f}s; "
+                                 f"widened to {state.read:.2f}s")
+            elif latency_ms > limit * 1000 * self.warn_ratio:
+                state.near_limit += 1
+                _log.warning(f"{sample.method} {sample.endpoint} took {latency_ms / 1000:.2f}s, "
+                             f"{latency_ms / 10 / limit:.0f}% of its {limit:.2f}s adaptive timeout")
+            state.learned.record(latency_ms)
+            state.recorded.record(latency_ms)
+            self._overall.record(latency_ms)
+            state.pending += 1
+            self._overall_pending += 1
+            if state.pending >= _RECOMPUTE_EVERY or (state.read is None and state.learned.total >= self.min_samples):
+                self._update(state)
+            if self._overall_pending >= _RECOMPUTE_EVERY or (self._connect is None
+                                                              and self._overall.total >= self.min_samples):
+                self._update_connect()
+
+    def recorded(self):
+        """:return: Dict of endpoint key -> `LatencyHistogram` of this run's responses."""
+        with self._lock:
+            return {endpoint: LatencyHistogram().merge(state.recorded) for endpoint, state in self._endpoints.items()
+                    if state.recorded.total}
+
+    def merge_recorded(self, data):
+        """Adds a worker's `recorded()` (as `to_dict` dicts) so that the controller saves every response."""
+        with self._lock:
+            for endpoint, item in data.get("histograms", {}).items():
+                state = self._endpoints.get(endpoint)
+                if state is None:
+                    state = self._endpoints[endpoint] = _Endpoint()
+                histogram = LatencyHistogram.from_dict(item)
+                state.learned.merge(histogram)
+                state.recorded.merge(histogram)
+                self._overall.merge(histogram)
+                self._update(state)
+            self._update_connect()
+            for endpoint, count in data.get("near_limit", {}).items():
+                self._endpoints[endpoint].near_limit += count
+            for endpoint, count in data.get("timeouts", {}).items():
+                self._endpoints[endpoint].timeouts += count
+
+    def report(self):
+        """:return: Dict of endpoint key -> limits at the start and now, samples, responses near the limit and timeouts."""
+        with self._lock:
+            return {endpoint: {"initial_s": self.initial.get(endpoint), "read_s": state.read,
+                               "samples": state.learned.total, "run_samples": state.recorded.total,
+                               "percentile_ms": state.learned.percentile(self.percentile),
+                               "slowest_ms": state.recorded.max_us / 1000 if state.recorded.total else None,
+                               "near_limit": state.near_limit, "timeouts": state.timeouts}
+                    for endpoint, state in sorted(self._endpoints.items())}
+
+
+_adaptive_timeouts = None
+_adaptive_timeouts_lock = threading.Lock()
+
+
+def get_adaptive_timeouts():
+    """Returns the process-wide adaptive timeouts built from `[timeouts]`, or None when they are disabled."""
+    global _adaptive_timeouts
+    if not ReadConfig.get_timeouts_adaptive():
+        return None
+    if _adaptive_timeouts is None:
+        with _adaptive_timeouts_lock:
+            if _adaptive_timeouts is None:
+                history = LatencyHistory(ReadConfig.get_timeouts_database_path()).load(
+                    ReadConfig.get_base_url(), ReadConfig.get_timeouts_history_runs()
+                )
+                _adaptive_timeouts = AdaptiveTimeouts(
+                    history,
+                    percentile=ReadConfig.get_timeouts_percentile(),
+                    safety_factor=ReadConfig.get_timeouts_safety_factor(),
+                    min_samples=ReadConfig.get_timeouts_min_samples(),
+                    default_seconds=ReadConfig.get_timeouts_default_seconds(),
+                    read_bounds=(ReadConfig.get_timeouts_read_floor_seconds(),
+                                 ReadConfig.get_timeouts_read_cap_seconds()),
+                    connect_bounds=(ReadConfig.get_timeouts_connect_floor_seconds(),
+                                    ReadConfig.get_timeouts_connect_cap_seconds()),
+                    warn_ratio=ReadConfig.get_timeouts_warn_ratio(),
+                )
+                request_metrics.subscribe(_adaptive_timeouts.observe)
+    return _adaptive_timeouts
+
+
+def resolve_timeout(endpoint, timeout=None):
+    """:return: `timeout` when given, else the endpoint's adaptive (connect, read) pair or `[timeouts] default_seconds`."""
+    if timeout is not None:
+        return timeout
+    adaptive_timeouts = get_adaptive_timeouts()
+    if adaptive_timeouts is None:
+        return ReadConfig.get_timeouts_default_seconds()
+    return adaptive_timeouts.timeout(endpoint)
+
+
+def pytest_sessionfinish(session):
+    if _adaptive_timeouts is None:
+        return
+    workeroutput = getattr(session.config, "workeroutput", None)
+    if workeroutput is not None:
+        report = _adaptive_timeouts.report()
+        workeroutput["adaptive_timeouts"] = {
+            "histograms": {endpoint: histogram.to_dict() for endpoint, histogram in _adaptive_timeouts.recorded().items()},
+            "near_limit": {endpoint: item["near_limit"] for endpoint, item in report.items() if item["near_limit"]},
+            "timeouts": {endpoint: item["timeouts"] for endpoint, item in report.items() if item["timeouts"]},
+        }
+        return
+    recorded = _adaptive_timeouts.recorded()
+    if recorded:
+        LatencyHistory(ReadConfig.get_timeouts_database_path()).record_run(ReadConfig.get_base_url(), recorded)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    data = getattr(node, "workeroutput", {}).get("adaptive_timeouts")
+    adaptive_timeouts = get_adaptive_timeouts()
+    if data and adaptive_timeouts:
+        adaptive_timeouts.merge_recorded(data)
+
+
+def format_report(report):
+    """Lines for endpoints whose timeout changed during the run, that came close to it or hit it."""
+    lines = []
+    for endpoint, item in report.items():
+        changed = item["initial_s"] != item["read_s"]
+        if not (item["near_limit"] or item["timeouts"] or (changed and item["run_samples"])):
+            continue
+        initial = f"{item['initial_s']:.2f}s" if item["initial_s"] is not None else "default"
+        current = f"{item['read_s']:.2f}s" if item["read_s"] is not None else "default"
+        lines.append(f"{endpoint:<40}{item['run_samples']:>9}{initial:>10}{current:>10}{item['near_limit']:>12}"
+                     f"{item['timeouts']:>10}")
+    if not lines:
+        return []
+    header = f"{'endpoint':<40}{'samples':>9}{'before':>10}{'after':>10}{'near limit':>12}{'timeouts':>10}"
+    return [header, *lines]
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if hasattr(config, "workerinput") or _adaptive_timeouts is None:
+        return
+    lines = format_report(_adaptive_timeouts.report())
+    if lines:
+        terminalreporter.section("Adaptive timeouts")
+        for line in lines:
+            terminalreporter.write_line(line)
@@ -0,0 +1,411 @@
+"""
+Capacity search: finds the highest request rate a scenario sustains before latency or errors give way.
+
+The scenario's weighted request mix (`resources/scenarios/`) is offered open-loop at a fixed rate for
+`[capacity] step_seconds` after a short warm-up. New requests keep being sent on schedule however slow
+the responses get. The rate then changes, either by fixed steps (`step`) or by doubling and then
+bisecting (`binary`), until the search finds the knee. A step fails when any of these is true:
+
+- an endpoint's p99 latency is above `p99_limit_ms`;
+- an endpoint's error rate (5xx or no response) is above `max_error_percent`;
+- fewer than `min_throughput_ratio` of the offered requests came back successfully, because the
+  backend or the `max_concurrency` in flight could not keep up.
+
+An endpoint's maximum sustainable rate is its successful rate in the fastest step where that endpoint
+stayed within the limits. Every run goes into a SQLite history (`[capacity] database_path`), labelled
+with the backend release. Each run is compared with the previous run of the same scenario and
+environment, and any endpoint that lost more than `regression_percent` of its capacity is reported.
+
+Usage:
+    python -m utilities.capacity search get_products.json --mode binary --label 1.4.2
+    python -m utilities.capacity history get_products.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+import uuid
+
+from utilities.distributed import EndpointStats, load_scenario
+from utilities.latency_histogram import LatencyHistogram
+from utilities.metrics import request_metrics
+from utilities.payload_template import compile_request_specs
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request_async
+
+MODES = ("step", "binary")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS capacity_runs (
+    run_id TEXT PRIMARY KEY,
+    scenario TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    base_url TEXT NOT NULL,
+    label TEXT,
+    mode TEXT NOT NULL,
+    limits TEXT NOT NULL,
+    max_rps REAL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_capacity_runs_scenario ON capacity_runs (scenario, environment, started_at);
+CREATE TABLE IF NOT EXISTS capacity_steps (
+    run_id TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    target_rps REAL NOT NULL,
+    achieved_rps REAL NOT NULL,
+    passed INTEGER NOT NULL,
+    reason TEXT
+);
+CREATE TABLE IF NOT EXISTS capacity_endpoints (
+    run_id TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    max_rps REAL,
+    p99_ms REAL,
+    error_rate REAL,
+    knee_rps REAL,
+    knee_reason TEXT
+);
+"""
+
+
+def default_limits():
+    """Limits from `[capacity]`: `p99_limit_ms`, `max_error_rate` (0..1) and `min_throughput_ratio`."""
+    return {
+        "p99_limit_ms": ReadConfig.get_capacity_p99_limit_ms(),
+        "max_error_rate": ReadConfig.get_capacity_max_error_percent() / 100,
+        "min_throughput_ratio": ReadConfig.get_capacity_min_throughput_ratio(),
+    }
+
+
+class CapacityHistory:
+    """
+    SQLite store of capacity runs, their steps and the per-endpoint results.
+
+    :param path: Database file; created on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record_run(self, result):
+        """:param result: Result dict of `CapacitySearch.run`."""
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO capacity_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (result["run_id"], result["scenario"], result["environment"], result["base_url"], result["label"],
+                 result["mode"], json.dumps(result["limits"]), result["max_rps"], result["started"],
+                 result["finished"]),
+            )
+            connection.executemany(
+                "INSERT INTO capacity_steps VALUES (?, ?, ?, ?, ?, ?)",
+                [(result["run_id"], index, step["target_rps"], step["achieved_rps"], step["passed"],
+                  "; ".join(step["reasons"]) or None) for index, step in enumerate(result["steps"])],
+            )
+            connection.executemany(
+                "INSERT INTO capacity_endpoints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(result["run_id"], endpoint, item["max_rps"], item["p99_ms"], item["error_rate"], item["knee_rps"],
+                  item["knee_reason"]) for endpoint, item in result["endpoints"].items()],
+            )
+
+    def runs(self, scenario, environment, limit=20):
+        """:return: The latest runs of a scenario, newest first, each with its per-endpoint `max_rps`."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT run_id, label, mode, max_rps, started_at FROM capacity_runs "
+                "WHERE scenario = ? AND environment = ? ORDER BY started_at DESC LIMIT ?",
+                (scenario, environment, limit),
+            ).fetchall()
+            runs = []
+            for run_id, label, mode, max_rps, started_at in rows:
+                endpoints = dict(connection.execute(
+                    "SELECT endpoint, max_rps FROM capacity_endpoints WHERE run_id = ?", (run_id,)
+                ))
+                runs.append({"run_id": run_id, "label": label, "mode": mode, "max_rps": max_rps,
+                             "started": started_at, "endpoints": endpoints})
+        return runs
+
+    def previous(self, result):
+        """:return: The run before `result` for the same scenario and environment, or None."""
+        for run in self.runs(result["scenario"], result["environment"]):
+            if run["run_id"] != result["run_id"] and run["started"] < result["started"]:
+                return run
+        return None
+
+
+def compare(result, previous, regression_percent):
+    """
+    :return: List of (endpoint, previous_rps, current_rps, change_percent, regressed) for endpoints in both runs.
+    """
+    rows = []
+    for endpoint, item in sorted(result["endpoints"].items()):
+        before = previous["endpoints"].get(endpoint)
+        if not before:
+            continue
+        current = item["max_rps"] or 0.0
+        change = (current - before) / before * 100
+        rows.append((endpoint, before, current, change, change < -regression_percent))
+    return rows
+
+
+class _StepRecorder:
+    """`request_metrics` listener keeping the requests that started inside the measured window."""
+
+    def __init__(self):
+        self.stats = EndpointStats()
+        self.window = (float("inf"), float("inf"))
+
+    def __call__(self, sample):
+        started = sample.timestamp - sample.latency_ms / 1000
+        if self.window[0] <= started < self.window[1]:
+            self.stats.record(sample)
+
+
+class CapacitySearch:
+    """
+    :param scenario: Scenario dict (see `utilities.distributed.load_scenario`); its duration and concurrency are ignored.
+    :param mode: `step` (start, start + step, ...) or `binary` (double until the knee, then bisect).
+    :param limits: Dict as returned by `default_limits`.
+    :param seed: Seed of the request mix.
+    """
+
+    def __init__(self, scenario, mode=None, limits=None, start_rps=None, step_rps=None, max_rps=None,
+                 resolution_rps=None, step_seconds=None, warmup_seconds=None, max_concurrency=None, seed=0):
+        self.scenario = scenario
+        self.mode = mode or ReadConfig.get_capacity_mode()
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown capacity search mode '{self.mode}'; expected one of {', '.join(MODES)}.")
+        self.limits = limits or default_limits()
+        self.start_rps = start_rps or ReadConfig.get_capacity_start_rps()
+        self.step_rps = step_rps or ReadConfig.get_capacity_step_rps()
+        self.max_rps = max_rps or ReadConfig.get_capacity_max_rps()
+        self.resolution_rps = resolution_rps or ReadConfig.get_capacity_resolution_rps()
+        self.step_seconds = step_seconds or ReadConfig.get_capacity_step_seconds()
+        self.warmup_seconds = ReadConfig.get_capacity_warmup_seconds() if warmup_seconds is None else warmup_seconds
+        self.max_concurrency = max_concurrency or ReadConfig.get_capacity_max_concurrency()
+        self.seed = seed
+        self.steps = []
+        self._recorder = _StepRecorder()
+
+    async def _offer(self, rate, seconds, chooser):
+        """Sends requests at `rate` per second for `seconds`, on schedule; :return: requests skipped at the cap."""
+        requests = compile_request_specs(self.scenario["requests"])
+        weights = [spec.get("weight", 1) for spec in requests]
+        timeout = self.scenario.get("timeout_seconds", 10)
+        in_flight = set()
+        skipped = 0
+
+        async def call(spec):
+            template = spec["template"]
+            try:
+                # coalesce=False: identical concurrent GETs are the load, not something to share
+                await send_request_async(spec["method"], spec["endpoint"], headers=spec.get("headers"),
+                                         data=template.render() if template else None, timeout=timeout,
+                                         coalesce=False)
+            except Exception:
+                pass  # recorded as a request without a response
+
+        interval = 1 / rate
+        next_at = time.monotonic()
+        deadline = next_at + seconds
+        while next_at < deadline:
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_at += interval
+            if len(in_flight) >= self.max_concurrency:
+                skipped += 1
+                continue
+            task = asyncio.ensure_future(call(chooser.choices(requests, weights)[0]))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+        return skipped
+
+    async def _step_async(self, rate):
+        chooser = random.Random(self.seed * 100003 + len(self.steps))
+        measure_from = time.time() + self.warmup_seconds
+        self._recorder.stats.drain()
+        self._recorder.window = (measure_from, measure_from + self.step_seconds)
+        skipped = await self._offer(rate, self.warmup_seconds + self.step_seconds, chooser)
+        self._recorder.window = (float("inf"), float("inf"))
+        return self._evaluate(rate, self._recorder.stats.drain(), skipped)
+
+    def _evaluate(self, rate, drained, skipped):
+        endpoints = {}
+        reasons = []
+        successes = 0
+        for endpoint, item in sorted(drained.items()):
+            histogram = LatencyHistogram.from_dict(item["histogram"])
+            count, errors = histogram.total, item["errors"]
+            p99 = histogram.percentile(99)
+            error_rate = errors / count if count else 0.0
+            failures = []
+            if p99 is not None and p99 > self.limits["p99_limit_ms"]:
+                failures.append(f"{endpoint} p99 {p99:.0f} ms > {self.limits['p99_limit_ms']:g} ms")
+            if error_rate > self.limits["max_error_rate"]:
+                failures.append(f"{endpoint} errors {error_rate:.1%} > {self.limits['max_error_rate']:.1%}")
+            successes += count - errors
+            endpoints[endpoint] = {"rps": (count - errors) / self.step_seconds, "count": count, "errors": errors,
+                                   "p99_ms": p99, "error_rate": error_rate, "failures": failures}
+            reasons.extend(failures)
+        achieved = successes / self.step_seconds
+        if achieved < rate * self.limits["min_throughput_ratio"]:
+            reasons.append(f"achieved {achieved:.1f}/s < {self.limits['min_throughput_ratio']:.0%} of {rate:g}/s"
+                           + (f" ({skipped} skipped at {self.max_concurrency} in flight)" if skipped else ""))
+        step = {"target_rps": rate, "achieved_rps": achieved, "skipped": skipped, "passed": not reasons,
+                "reasons": reasons, "endpoints": endpoints}
+        self.steps.append(step)
+        return step
+
+    def step(self, rate):
+        """Offers `rate` requests per second for one step; :return: Step dict."""
+        return asyncio.run(self._step_async(rate))
+
+    def _search(self, on_step):
+        def measure(rate):
+            step = self.step(rate)
+            if on_step:
+                on_step(step)
+            return step["passed"]
+
+        if self.mode == "step":
+            rate = self.start_rps
+            while rate <= self.max_rps and measure(rate):
+                rate += self.step_rps
+            return
+        passed, failed = 0.0, None
+        rate = min(self.start_rps, self.max_rps)
+        while failed is None:
+            if not measure(rate):
+                failed = rate
+            elif rate >= self.max_rps:
+                return
+            else:
+                passed, rate = rate, min(rate * 2, self.max_rps)
+        while failed - passed > self.resolution_rps:
+            rate = (passed + failed) / 2
+            if measure(rate):
+                passed = rate
+            else:
+                failed = rate
+
+    def run(self, on_step=None, label=None, scenario_name=None):
+        """
+        :param on_step: Called with every finished step dict.
+        :param label: Backend release (or any tag) stored with the run.
+        :param scenario_name: Name the run is stored under, normally the scenario file name.
+        :return: Result dict with `steps`, overall `max_rps` and per-endpoint `max_rps` and knee.
+        """
+        started = time.time()
+        self.steps = []
+        request_metrics.subscribe(self._recorder)
+        try:
+            self._search(on_step)
+        finally:
+            request_metrics.unsubscribe(self._recorder)
+        endpoints = {}
+        for step in self.steps:
+            for endpoint, item in step["endpoints"].items():
+                entry = endpoints.setdefault(endpoint, {"max_rps": None, "p99_ms": None, "error_rate": None,
+                                                        "knee_rps": None, "knee_reason": None})
+                if not item["failures"]:
+                    if entry["max_rps"] is None or item["rps"] > entry["max_rps"]:
+                        entry.update(max_rps=item["rps"], p99_ms=item["p99_ms"], error_rate=item["error_rate"])
+                elif entry["knee_rps"] is None or step["target_rps"] < entry["knee_rps"]:
+                    entry.update(knee_rps=step["target_rps"], knee_reason="; ".join(item["failures"]))
+        passing = [step["achieved_rps"] for step in self.steps if step["passed"]]
+        return {
+            "run_id": uuid.uuid4().hex, "scenario": scenario_name or "scenario", "label": label,
+            "environment": ReadConfig.get_environment_name(), "base_url": ReadConfig.get_base_url(),
+            "mode": self.mode, "limits": self.limits, "started": started, "finished": time.time(),
+            "max_rps": max(passing) if passing else None, "steps": self.steps, "endpoints": endpoints,
+        }
+
+
+def _format_rps(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_step(step):
+    verdict = "ok" if step["passed"] else "KNEE: " + "; ".join(step["reasons"])
+    print(f"{step['target_rps']:>9.1f}/s offered  {step['achieved_rps']:>9.1f}/s ok  {verdict}")
+
+
+def print_result(result):
+    print(f"max sustainable rate: {_format_rps(result['max_rps'])}/s ({result['mode']} search, "
+          f"{len(result['steps'])} steps)")
+    print(f"{'endpoint':<40}{'max rps':>9}{'p99 ms':>9}{'errors':>8}  knee")
+    for endpoint, item in sorted(result["endpoints"].items()):
+        p99 = f"{item['p99_ms']:>9.1f}" if item["p99_ms"] is not None else f"{'-':>9}"
+        errors = f"{item['error_rate']:>8.1%}" if item["error_rate"] is not None else f"{'-':>8}"
+        knee = f"at {item['knee_rps']:g}/s: {item['knee_reason']}" if item["knee_rps"] is not None else "not reached"
+        print(f"{endpoint:<40}{_format_rps(item['max_rps']):>9}{p99}{errors}  {knee}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the request rate a scenario sustains within its limits.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search = commands.add_parser("search", help="Run a capacity search and store the result")
+    search.add_argument("scenario", help="Scenario path or name in resources/scenarios/")
+    search.add_argument("--mode", choices=MODES, default=None, help="Ramp (default: [capacity] mode)")
+    search.add_argument("--start", type=float, default=None, help="First rate, requests per second")
+    search.add_argument("--step", type=float, default=None, help="Rate increase per step in step mode")
+    search.add_argument("--max", type=float, default=None, help="Highest rate to try")
+    search.add_argument("--step-seconds", type=float, default=None, help="Measured seconds per step")
+    search.add_argument("--p99", type=float, default=None, help="p99 latency limit in ms")
+    search.add_argument("--errors", type=float, default=None, help="Error-rate limit in percent")
+    search.add_argument("--label", default=None, help="Backend release stored with the run")
+    search.add_argument("--seed", type=int, default=0)
+    history = commands.add_parser("history", help="List stored runs of a scenario")
+    history.add_argument("scenario", help="Scenario name the runs were stored under")
+    history.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    store = CapacityHistory(ReadConfig.get_capacity_database_path())
+    scenario_name = os.path.basename(args.scenario)
+    if args.command == "history":
+        for run in store.runs(scenario_name, ReadConfig.get_environment_name(), args.limit):
+            endpoints = ", ".join(f"{endpoint} {_format_rps(rps)}/s" for endpoint, rps in sorted(run["endpoints"].items()))
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started']))}  {run['label'] or '-':<12}"
+                  f"{_format_rps(run['max_rps']):>9}/s  {endpoints}")
+        return 0
+
+    limits = default_limits()
+    if args.p99 is not None:
+        limits["p99_limit_ms"] = args.p99
+    if args.errors is not None:
+        limits["max_error_rate"] = args.errors / 100
+    capacity_search = CapacitySearch(load_scenario(args.scenario), mode=args.mode, limits=limits,
+                                     start_rps=args.start, step_rps=args.step, max_rps=args.max,
+                                     step_seconds=args.step_seconds, seed=args.seed)
+    result = capacity_search.run(on_step=print_step, label=args.label, scenario_name=scenario_name)
+    store.record_run(result)
+    print_result(result)
+
+    previous = store.previous(result)
+    regressed = False
+    if previous:
+        regression_percent = ReadConfig.get_capacity_regression_percent()
+        print(f"compared with {previous['label'] or previous['run_id'][:8]} "
+              f"({time.strftime('%Y-%m-%d %H:%M', time.localtime(previous['started']))}):")
+        for endpoint, before, current, change, endpoint_regressed in compare(result, previous, regression_percent):
+            regressed = regressed or endpoint_regressed
+            print(f"  {endpoint:<38}{before:>9.1f} -> {current:>9.1f}/s  {change:+.1f}%"
+                  f"{'  REGRESSION' if endpoint_regressed else ''}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Bandwidth accounting, payload-size budgets and a compression benchmark.
+
+The transports offer gzip and deflate in `Accept-Encoding`, plus br and zstd when `brotli` or
+`zstandard` is installed (`[compression] encodings`). Every response records its body size as
+received (`wire_bytes`) and after decoding (`body_bytes`). The terminal summary shows per-endpoint
+totals and how much compression saved.
+
+Budgets are declared per endpoint prefix in `[payload_budgets]`, e.g. `products = body < 1 MB, wire < 256 KB`.
+`ResponseValidator.validate_payload_size` asserts them the way `validate_response_time` asserts SLOs.
+
+`python -m utilities.compression products users` downloads the list bodies uncompressed. It then
+measures, for every codec available here, the bytes saved against the CPU time the client spends
+decoding. It also prints the bandwidth below which the saved transfer time outweighs the decode time.
+"""
+import argparse
+import re
+import sys
+import threading
+import time
+import zlib
+
+import pytest
+
+from utilities.get_token import get_auth_token
+from utilities.metrics import request_metrics
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_UNITS = {"b": 1, "kb": 1024, "mb": 1024 * 1024}
+_SIZE = r"(?P<{name}>\d+(?:\.\d+)?)\s*(?P<{name}_unit>[kKmM]?[bB])"
+_BUDGET_TERM = re.compile(r"^(?P<kind>body|wire)\s*<\s*" + _SIZE.format(name="size") + "$")
+
+
+def parse_size(value, unit="b"):
+    return int(float(value) * _UNITS[unit.lower()])
+
+
+def parse_size_budget(value):
+    """
+    :param value: Budget such as `body < 1 MB, wire < 256 KB`; either term may be omitted.
+    :return: Dict with `body_bytes` and `wire_bytes`; missing terms are None.
+    """
+    budget = {"body_bytes": None, "wire_bytes": None}
+    for term in filter(None, (part.strip() for part in value.split(","))):
+        match = _BUDGET_TERM.match(term)
+        if not match:
+            raise ValueError(f"Invalid payload budget term '{term}'; expected 'body < 1 MB' or 'wire < 256 KB'.")
+        budget[f"{match.group('kind')}_bytes"] = parse_size(match.group("size"), match.group("size_unit"))
+    return budget
+
+
+def format_size(size):
+    if size is None:
+        return "-"
+    for unit, factor in (("MB", 1024 * 1024), ("KB", 1024)):
+        if size >= factor:
+            return f"{size / factor:.1f} {unit}"
+    return f"{size} B"
+
+
+class PayloadBudgets:
+    """
+    :param budgets: Dict of endpoint prefix -> budget dict (see `parse_size_budget`).
+    """
+
+    def __init__(self, budgets):
+        # Longest prefix first so `products/top` wins over `products`
+        self.budgets = dict(sorted(budgets.items(), key=lambda item: -len(item[0])))
+
+    def budget_for(self, endpoint_key):
+        """:return: (prefix, budget) covering the endpoint, or (None, None)."""
+        for prefix, budget in self.budgets.items():
+            if endpoint_key.startswith(prefix):
+                return prefix, budget
+        return None, None
+
+
+_payload_budgets = None
+
+
+def get_payload_budgets():
+    """Returns the budgets from `[payload_budgets]`; empty when none are configured."""
+    global _payload_budgets
+    if _payload_budgets is None:
+        _payload_budgets = PayloadBudgets({prefix: parse_size_budget(value)
+                                           for prefix, value in ReadConfig.get_payload_budgets().items()})
+    return _payload_budgets
+
+
+def response_sizes(response):
+    """:return: (wire_bytes, body_bytes) of a response; wire_bytes is None when the transport did not count it."""
+    return getattr(response, "wire_bytes", None), len(response.content)
+
+
+class BandwidthStats:
+    """Per-endpoint request count, bytes on the wire and decoded bytes; subscribed to `request_metrics`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, sample):
+        if sample.body_bytes is None:
+            return
+        wire = sample.wire_bytes if sample.wire_bytes is not None else sample.body_bytes
+        with self._lock:
+            entry = self._endpoints.get(sample.endpoint)
+            if entry is None:
+                entry = self._endpoints[sample.endpoint] = [0, 0, 0]
+            entry[0] += 1
+            entry[1] += wire
+            entry[2] += sample.body_bytes
+
+    def stats(self):
+        """Dict of endpoint -> `requests`, `wire_bytes` and `body_bytes`."""
+        with self._lock:
+            return {endpoint: {"requests": requests, "wire_bytes": wire, "body_bytes": body}
+                    for endpoint, (requests, wire, body) in self._endpoints.items()}
+
+    def merge_stats(self, stats):
+        with self._lock:
+            for endpoint, item in stats.items():
+                entry = self._endpoints.setdefault(endpoint, [0, 0, 0])
+                entry[0] += item["requests"]
+                entry[1] += item["wire_bytes"]
+                entry[2] += item["body_bytes"]
+
+
+bandwidth_stats = BandwidthStats()
+
+
+def format_stats(stats):
+    lines = []
+    wire_total = body_total = 0
+    for endpoint, item in sorted(stats.items(), key=lambda entry: -entry[1]["body_bytes"]):
+        wire_total += item["wire_bytes"]
+        body_total += item["body_bytes"]
+        saved = 1 - item["wire_bytes"] / item["body_bytes"] if item["body_bytes"] else 0.0
+        lines.append(f"{endpoint:<40}{item['requests']:>9}{format_size(item['wire_bytes']):>12}"
+                     f"{format_size(item['body_bytes']):>12}{saved:>8.0%}")
+    if not lines:
+        return []
+    header = f"{'endpoint':<40}{'requests':>9}{'wire':>12}{'decoded':>12}{'saved':>8}"
+    saved = 1 - wire_total / body_total if body_total else 0.0
+    summary = f"{format_size(wire_total)} on the wire for {format_size(body_total)} of bodies ({saved:.0%} saved)"
+    return [header, *lines, summary]
+
+
+def pytest_configure(config):
+    if ReadConfig.get_compression_bandwidth_summary():
+        request_metrics.subscribe(bandwidth_stats.record)
+
+
+def pytest_sessionfinish(session):
+    workeroutput = getattr(session.config, "workeroutput", None)
+    if workeroutput is not None:
+        workeroutput["bandwidth_stats"] = bandwidth_stats.stats()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    stats = getattr(node, "workeroutput", {}).get("bandwidth_stats")
+    if stats:
+        bandwidth_stats.merge_stats(stats)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if hasattr(config, "workerinput"):
+        return
+    lines = format_stats(bandwidth_stats.stats())
+    if lines:
+        terminalreporter.section("Bandwidth")
+        for line in lines:
+            terminalreporter.write_line(line)
+
+
+# ----- Benchmark -----
+
+def codecs():
+    """Dict of coding -> (compress, decompress) for every coding available in this environment."""
+    available = {
+        "gzip": (lambda data: zlib.compress(data, 6, wbits=31), lambda data: zlib.decompress(data, wbits=31)),
+        "deflate": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    }
+    if brotli is not None:
+        available["br"] = (lambda data: brotli.compress(data, quality=5), brotli.decompress)
+    if zstandard is not None:
+        compressor, decompressor = zstandard.ZstdCompressor(level=3), zstandard.ZstdDecompressor()
+        available["zstd"] = (compressor.compress, decompressor.decompress)
+    return available
+
+
+def _time_per_call(function, data, min_seconds=0.2):
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        function(data)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def benchmark(bodies, min_seconds=0.2):
+    """
+    :param bodies: Dict of name -> uncompressed body bytes.
+    :return: One row per (body, coding) with sizes, encode/decode seconds and the break-even bandwidth.
+    """
+    rows = []
+    for name, body in bodies.items():
+        for coding, (compress, decompress) in codecs().items():
+            compressed = compress(body)
+            decode_s = _time_per_call(decompress, compressed, min_seconds)
+            saved = len(body) - len(compressed)
+            rows.append({
+                "body": name, "coding": coding, "bytes": len(body), "compressed_bytes": len(compressed),
+                "encode_s": _time_per_call(compress, body, min_seconds), "decode_s": decode_s,
+                # Compression pays off while sending the saved bytes takes longer than decoding
+                "break_even_mbit_s": saved * 8 / decode_s / 1e6 if saved > 0 and decode_s else None,
+            })
+    return rows
+
+
+def _download(endpoints):
+    headers = {"Accept-Encoding": "identity", "Authorization": f"Bearer {get_auth_token()}"}
+    bodies = {}
+    for endpoint in endpoints:
+        response = send_request("GET", endpoint, headers=headers, coalesce=False)
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"GET {endpoint} failed: {getattr(response, 'status_code', 'no response')}")
+        bodies[endpoint] = response.content
+    return bodies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare decode CPU with bytes saved for each content coding.")
+    parser.add_argument("endpoints", nargs="*", default=["products", "users"], help="GET endpoints to download")
+    parser.add_argument("--file", action="append", default=[], help="Also benchmark this file's contents")
+    parser.add_argument("--seconds", type=float, default=0.2, help="Minimum timing per measurement")
+    args = parser.parse_args(argv)
+
+    bodies = _download(args.endpoints) if args.endpoints else {}
+    for path in args.file:
+        with open(path, "rb") as file:
+            bodies[path] = file.read()
+    print(f"{'body':<30}{'coding':<9}{'size':>10}{'compressed':>12}{'ratio':>7}"
+          f"{'encode ms':>11}{'decode ms':>11}{'pays below':>14}")
+    for row in benchmark(bodies, args.seconds):
+        break_even = f"{row['break_even_mbit_s']:.0f} Mbit/s" if row["break_even_mbit_s"] else "-"
+        print(f"{row['body']:<30}{row['coding']:<9}{format_size(row['bytes']):>10}"
+              f"{format_size(row['compressed_bytes']):>12}{row['compressed_bytes'] / row['bytes']:>7.2f}"
+              f"{row['encode_s'] * 1000:>11.3f}{row['decode_s'] * 1000:>11.3f}{break_even:>14}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+Write contention: many writers hitting one entity at once, at growing concurrency.
+
+Each workload gets a fresh entity at every concurrency level. All writers start together on a barrier,
+and each sends `[contention] writes_per_writer` writes:
+
+- `stock`: read-modify-write of a product's `countInStock` (GET, +1, PUT). With N successful
+  increments the final count must be the initial count + N; any shortfall is lost updates.
+- `product`: blind PUTs of a whole product whose `name` and `price` belong together. The final
+  product must be exactly one acknowledged write; a mixed pair is a torn write.
+- `profile`: `users/profile/update/` of one user with distinct names. Each response must echo its
+  own name, and the final name must be one that was acknowledged.
+- `delete`: every writer DELETEs the same product, one fresh product per round. Exactly one DELETE per
+  round may succeed; the others should be 404.
+
+Per level the report gives successful writes per second, write latency percentiles, error rates and
+the consistency findings. The client cannot see the backend's locks. The `wait` column therefore
+estimates lock waiting as the median write latency above the single-writer median. Everything the run
+creates is deleted afterwards.
+
+Usage:
+    python -m utilities.contention --workloads stock profile --levels 1 4 16 64
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utilities.helpers import generate_random_email, generate_random_name, generate_random_password
+from utilities.latency_histogram import LatencyHistogram
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request
+
+_resources_dir = os.path.join(os.path.dirname(__file__), "..", "resources")
+
+WORKLOADS = ("stock", "product", "profile", "delete")
+
+
+def _load_payload(name):
+    with open(os.path.join(_resources_dir, "payloads", name)) as file:
+        return json.load(file)
+
+
+class _Tally:
+    """Write outcomes of one level, shared by its writer threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histogram = LatencyHistogram()
+        self.ok = 0
+        self.errors = 0    # 5xx or no response
+        self.rejected = 0  # any other non-2xx, e.g. 404 for a DELETE that lost the race or 409 on a conflict
+        self.acknowledged = []
+
+    def add(self, response, latency_ms, written=None):
+        """:return: True when the write succeeded."""
+        status = response.status_code if response is not None else None
+        with self._lock:
+            self.histogram.record(latency_ms)
+            if status is not None and 200 <= status < 300:
+                self.ok += 1
+                if written is not None:
+                    self.acknowledged.append(written)
+                return True
+            if status is None or status >= 500:
+                self.errors += 1
+            else:
+                self.rejected += 1
+            return False
+
+
+class ContentionBenchmark:
+    """
+    :param writes_per_writer: Writes every writer sends per level (default `[contention] writes_per_writer`).
+    :param logger: Optional logger passed to every request.
+    """
+
+    def __init__(self, writes_per_writer=None, logger=None):
+        self.writes_per_writer = writes_per_writer or ReadConfig.get_contention_writes_per_writer()
+        self.logger = logger
+        self.paths = ReadConfig.get_end_points()
+        self.admin_token = None
+        self._created = []  # (kind, id) to delete afterwards
+
+    def _headers(self, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return headers
+
+    def _send(self, method, endpoint, token=None, payload=None):
+        """:return: (response or None, latency_ms); coalescing is off so concurrent GETs really are concurrent."""
+        started = time.perf_counter()
+        try:
+            response = send_request(method, endpoint, headers=self._headers(token), payload=payload,
+                                    logger=self.logger, coalesce=False)
+        except Exception:
+            response = None
+        return response, (time.perf_counter() - started) * 1000
+
+    def _sign_in(self):
+        response, _ = self._send("POST", self.paths["login_endpoint"], payload={
+            "username": ReadConfig.get_admin_username(), "password": ReadConfig.get_admin_password()})
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Admin login failed: {getattr(response, 'status_code', 'no response')}")
+        self.admin_token = response.json()["token"]
+
+    def _create_product(self):
+        payload = {**_load_payload("product_payload.json"), "name": f"Contention {generate_random_name()}"}
+        response, _ = self._send("POST", f"{self.paths['products_endpoint']}/create/", self.admin_token, payload)
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Creating a product failed: {getattr(response, 'status_code', 'no response')}")
+        product = response.json()
+        self._created.append(("product", product["_id"]))
+        return product
+
+    def _create_user(self):
+        payload = {"name": generate_random_name(), "email": generate_random_email(),
+                   "password": generate_random_password()}
+        response, _ = self._send("POST", self.paths["register_user_endpoint"], payload=payload)
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Registering a user failed: {getattr(response, 'status_code', 'no response')}")
+        user = response.json()
+        self._created.append(("user", user["_id"]))
+        return user
+
+    def _product_url(self, action, product_id):
+        return f"{self.paths['products_endpoint']}/{action}/{product_id}/"
+
+    def _read_product(self, product_id):
+        response, _ = self._send("GET", f"{self.paths['products_endpoint']}/{product_id}")
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Reading product {product_id} failed: {getattr(response, 'status_code', 'no response')}")
+        return response.json()
+
+    def _cleanup(self):
+        for kind, entity_id in self._created:
+            endpoint = (f"{self.paths['delete_user_endpoint']}{entity_id}/" if kind == "user"
+                        else self._product_url("delete", entity_id))
+            self._send("DELETE", endpoint, self.admin_token)  # 404 for products a `delete` round removed
+        self._created = []
+
+    @staticmethod
+    def _run_writers(writers, write):
+        """Runs `write(writer_index)` on `writers` threads released together; :return: Elapsed seconds."""
+        barrier = threading.Barrier(writers + 1)
+
+        def writer(index):
+            barrier.wait()
+            write(index)
+
+        with ThreadPoolExecutor(max_workers=writers) as executor:
+            futures = [executor.submit(writer, index) for index in range(writers)]
+            barrier.wait()
+            started = time.perf_counter()
+            for future in futures:
+                future.result()
+        return time.perf_counter() - started
+
+    # ----- Workloads: each returns (tally, elapsed seconds, findings dict, list of violation messages) -----
+
+    def _stock(self, writers):
+        product = self._create_product()
+        initial = product["countInStock"]
+        tally = _Tally()
+        base = {key: product[key] for key in _load_payload("product_payload.json")}
+
+        def write(index):
+            for _ in range(self.writes_per_writer):
+                response, latency_ms = self._send("GET", f"{self.paths['products_endpoint']}/{product['_id']}")
+                if response is None or response.status_code != 200:
+                    tally.add(response, latency_ms)
+                    continue
+                payload = {**base, "countInStock": response.json()["countInStock"] + 1}
+                tally.add(*self._send("PUT", self._product_url("update", product["_id"]), self.admin_token, payload))
+
+        elapsed = self._run_writers(writers, write)
+        final = self._read_product(product["_id"])["countInStock"]
+        lost = initial + tally.ok - final
+        findings = {"initial": initial, "final": final, "expected": initial + tally.ok, "lost_updates": lost}
+        return tally, elapsed, findings, [f"{lost} lost updates"] if lost else []
+
+    def _product(self, writers):
+        product = self._create_product()
+        tally = _Tally()
+        base = {key: product[key] for key in _load_payload("product_payload.json")}
+
+        def write(index):
+            for sequence in range(self.writes_per_writer):
+                # name and price are written together, so the final pair must come from one write
+                name, price = f"writer {index} write {sequence}", f"{index}.{sequence:02d}"
+                payload = {**base, "name": name, "price": price}
+                response, latency_ms = self._send("PUT", self._product_url("update", product["_id"]),
+                                                  self.admin_token, payload)
+                tally.add(response, latency_ms, (name, price))
+
+        elapsed = self._run_writers(writers, write)
+        final = self._read_product(product["_id"])
+        pair = (final["name"], f"{float(final['price']):.2f}")
+        acknowledged = {(name, f"{float(price):.2f}") for name, price in tally.acknowledged}
+        torn = bool(tally.ok) and pair not in acknowledged
+        findings = {"final": {"name": pair[0], "price": pair[1]}, "torn_write": torn}
+        return tally, elapsed, findings, [f"final state {pair} is not one acknowledged write"] if torn else []
+
+    def _profile(self, writers):
+        user = self._create_user()
+        tally = _Tally()
+        stale = []
+
+        def write(index):
+            for sequence in range(self.writes_per_writer):
+                name = f"Writer {index} Write {sequence}"
+                payload = {"name": name, "email": user["email"], "password": ""}
+                response, latency_ms = self._send("PUT", self.paths["edit_user_endpoint"], user["token"], payload)
+                if tally.add(response, latency_ms, name) and response.json().get("name") != name:
+                    stale.append(name)
+
+        elapsed = self._run_writers(writers, write)
+        response, _ = self._send("GET", f"{self.paths['users_endpoint']}/{user['_id']}", self.admin_token)
+        final = response.json().get("name") if response is not None and response.status_code == 200 else None
+        violations = []
+        if tally.ok and final not in tally.acknowledged:
+            violations.append(f"final name {final!r} was never acknowledged")
+        if stale:
+            violations.append(f"{len(stale)} responses echoed another writer's name")
+        return tally, elapsed, {"final": final, "stale_responses": len(stale)}, violations
+
+    def _delete(self, writers):
+        tally = _Tally()
+        winners = []
+        elapsed = 0.0
+        for _ in range(self.writes_per_writer):
+            product = self._create_product()
+            before = tally.ok
+
+            def write(index):
+                tally.add(*self._send("DELETE", self._product_url("delete", product["_id"]), self.admin_token))
+
+            elapsed += self._run_writers(writers, write)
+            winners.append(tally.ok - before)
+        double = sum(1 for count in winners if count > 1)
+        none = sum(1 for count in winners if count == 0)
+        violations = []
+        if double:
+            violations.append(f"{double} products deleted more than once")
+        if none:
+            violations.append(f"{none} products no DELETE succeeded for")
+        return tally, elapsed, {"rounds": len(winners), "double_deletes": double, "undeleted": none}, violations
+
+    def run_level(self, workload, writers):
+        """:return: Result dict of one workload at one concurrency level."""
+        tally, elapsed, findings, violations = getattr(self, f"_{workload}")(writers)
+        writes = tally.histogram.total
+        return {
+            "workload": workload, "writers": writers, "writes": writes, "ok": tally.ok, "errors": tally.errors,
+            "rejected": tally.rejected, "seconds": elapsed, "ok_per_second": tally.ok / elapsed if elapsed else 0.0,
+            "error_rate": tally.errors / writes if writes else 0.0,
+            "p50_ms": tally.histogram.percentile(50), "p95_ms": tally.histogram.percentile(95),
+            "p99_ms": tally.histogram.percentile(99), "findings": findings, "violations": violations,
+        }
+
+    def run(self, workloads=None, levels=None, on_level=None):
+        """
+        :param workloads: Workload names (default `[contention] workloads`).
+        :param levels: Writer counts (default `[contention] concurrency_levels`); 1 is added for the baseline.
+        :param on_level: Called with every finished level result.
+        :return: List of level results, with `wait_ms` against the workload's single-writer median.
+        """
+        workloads = workloads or ReadConfig.get_contention_workloads()
+        unknown = set(workloads) - set(WORKLOADS)
+        if unknown:
+            raise ValueError(f"Unknown workloads {sorted(unknown)}; supported workloads are {', '.join(WORKLOADS)}.")
+        levels = sorted({1, *(levels or ReadConfig.get_contention_concurrency_levels())})
+        self._sign_in()
+        results = []
+        try:
+            for workload in workloads:
+                baseline = None
+                for writers in levels:
+                    result = self.run_level(workload, writers)
+                    if writers == 1:
+                        baseline = result["p50_ms"]
+                    result["wait_ms"] = (max(0.0, result["p50_ms"] - baseline)
+                                         if result["p50_ms"] is not None and baseline is not None else None)
+                    results.append(result)
+                    if on_level:
+                        on_level(result)
+        finally:
+            self._cleanup()
+        return results
+
+
+def _ms(value):
+    return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_level(result):
+    print(f"{result['workload']:<9}{result['writers']:>8}{result['writes']:>8}{result['ok_per_second']:>9.1f}"
+          f"{_ms(result['p50_ms'])}{_ms(result['p99_ms'])}{_ms(result['wait_ms'])}"
+          f"{result['error_rate']:>8.1%}{result['rejected']:>9}  {'; '.join(result['violations']) or 'consistent'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure write scaling and consistency under contention.")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=None)
+    parser.add_argument("--levels", nargs="+", type=int, default=None, help="Concurrent writers per level")
+    parser.add_argument("--writes", type=int, default=None, help="Writes per writer and level")
+    parser.add_argument("--report", default=None, help="Report path (default: [contention] report_path)")
+    args = parser.parse_args(argv)
+
+    print(f"{'workload':<9}{'writers':>8}{'writes':>8}{'ok/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'wait ms':>9}"
+          f"{'errors':>8}{'rejected':>9}  consistency")
+    results = ContentionBenchmark(writes_per_writer=args.writes).run(args.workloads, args.levels, print_level)
+    report_path = os.path.join(os.path.abspath(os.curdir), args.report or ReadConfig.get_contention_report_path())
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as file:
+        json.dump(results, file, indent=2)
+    return 1 if any(result["violations"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
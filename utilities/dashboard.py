@@ -0,0 +1,483 @@
+"""
+Live run dashboard: `pytest --dashboard` serves http://127.0.0.1:8089 while the tests run.
+
+The request layer only appends to a `collections.deque` (an atomic operation that needs no lock);
+an aggregator thread drains it every `[dashboard] refresh_seconds` into per-endpoint histograms over a
+sliding `[dashboard] window_seconds`, and publishes one immutable snapshot per tick:
+
+- requests per second, requests in flight, totals and error rate (5xx and no response);
+- p50 / p95 / p99 latency, request rate and error rate per endpoint over the window;
+- validator failures per endpoint and check.
+
+Snapshots are pushed to the browser as server-sent events (`/events`) and are also available as
+`/metrics.json`. Under pytest-xdist the controller serves the dashboard and every worker posts its
+drained samples to it in one batch per tick.
+
+Terminal view of a running dashboard:
+
+    python -m utilities.dashboard http://127.0.0.1:8089
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utilities.latency_histogram import LatencyHistogram
+from utilities.metrics import RequestSample, ValidationSample, request_metrics
+from utilities.read_config import ReadConfig
+
+_START = object()
+
+
+class MetricsChannel:
+    """
+    Lock-free hand-off from the request layer: listeners only append to a deque, `drain` empties it.
+    """
+
+    def __init__(self):
+        self._events = deque()
+
+    def on_start(self, method, endpoint):
+        self._events.append(_START)
+
+    def on_request(self, sample):
+        self._events.append(sample)
+
+    def on_validation(self, sample):
+        self._events.append(sample)
+
+    def attach(self):
+        request_metrics.subscribe_start(self.on_start)
+        request_metrics.subscribe(self.on_request)
+        request_metrics.subscribe_validation(self.on_validation)
+        return self
+
+    def detach(self):
+        request_metrics.unsubscribe_start(self.on_start)
+        request_metrics.unsubscribe(self.on_request)
+        request_metrics.unsubscribe_validation(self.on_validation)
+
+    def drain(self):
+        events = []
+        pop = self._events.popleft
+        while True:
+            try:
+                events.append(pop())
+            except IndexError:
+                return events
+
+
+def _is_error(status):
+    return not status or status >= 500
+
+
+class _Second:
+    __slots__ = ("second", "endpoints")
+
+    def __init__(self, second):
+        self.second = second
+        self.endpoints = defaultdict(lambda: [LatencyHistogram(), 0])  # histogram, errors
+
+
+class LiveAggregator:
+    """
+    Turns drained events into snapshots. Only the ticker thread calls `consume` and `snapshot`.
+
+    :param window_seconds: Sliding window for rates and percentiles.
+    """
+
+    def __init__(self, window_seconds=30):
+        self.window_seconds = window_seconds
+        self.started_at = time.time()
+        self.started = 0
+        self.completed = 0
+        self.errors = 0
+        self.totals = defaultdict(lambda: [0, 0])  # endpoint -> requests, errors
+        self.validations = defaultdict(lambda: [0, 0])  # (endpoint, check) -> passed, failed
+        self._seconds = deque()
+
+    def _bucket(self, timestamp):
+        second = int(timestamp)
+        if not self._seconds or self._seconds[-1].second < second:
+            self._seconds.append(_Second(second))
+        for bucket in reversed(self._seconds):
+            if bucket.second <= second:
+                return bucket
+        return self._seconds[0]
+
+    def consume(self, events, starts=0):
+        self.started += starts
+        for event in events:
+            if event is _START:
+                self.started += 1
+            elif isinstance(event, RequestSample):
+                self.completed += 1
+                error = _is_error(event.status)
+                self.errors += error
+                totals = self.totals[event.endpoint]
+                totals[0] += 1
+                totals[1] += error
+                entry = self._bucket(event.timestamp).endpoints[event.endpoint]
+                entry[0].record(event.latency_ms)
+                entry[1] += error
+            elif isinstance(event, ValidationSample):
+                self.validations[(event.endpoint, event.check)][0 if event.passed else 1] += 1
+
+    def snapshot(self):
+        now = time.time()
+        while self._seconds and self._seconds[0].second < int(now) - self.window_seconds:
+            self._seconds.popleft()
+        window = defaultdict(lambda: [LatencyHistogram(), 0])
+        last_second = 0
+        for bucket in self._seconds:
+            for endpoint, (histogram, errors) in bucket.endpoints.items():
+                window[endpoint][0].merge(histogram)
+                window[endpoint][1] += errors
+                if bucket.second == int(now) - 1:
+                    last_second += histogram.total
+        span = max(1.0, min(self.window_seconds, now - self.started_at))
+
+        failures = defaultdict(int)
+        for (endpoint, _), (_, failed) in self.validations.items():
+            failures[endpoint] += failed
+        endpoints = []
+        for endpoint in sorted(set(self.totals) | set(failures)):
+            histogram, errors = window.get(endpoint, (LatencyHistogram(), 0))
+            requests_total, errors_total = self.totals.get(endpoint, (0, 0))
+            endpoints.append({
+                "endpoint": endpoint,
+                "requests": requests_total,
+                "rps": round(histogram.total / span, 2),
+                "error_rate": round(errors / histogram.total, 4) if histogram.total else 0.0,
+                "errors": errors_total,
+                "p50_ms": histogram.percentile(50),
+                "p95_ms": histogram.percentile(95),
+                "p99_ms": histogram.percentile(99),
+                "validation_failures": failures.get(endpoint, 0),
+            })
+        return {
+            "time": now,
+            "elapsed_s": round(now - self.started_at, 1),
+            "window_s": self.window_seconds,
+            "requests": self.completed,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.completed, 4) if self.completed else 0.0,
+            "in_flight": max(0, self.started - self.completed),
+            "rps": last_second,
+            "rps_window": round(sum(item[0].total for item in window.values()) / span, 2),
+            "endpoints": endpoints,
+            "validations": [
+                {"endpoint": endpoint, "check": check, "passed": passed, "failed": failed}
+                for (endpoint, check), (passed, failed) in sorted(self.validations.items())
+            ],
+        }
+
+
+class DashboardServer:
+    """
+    Aggregator thread plus embedded HTTP server.
+
+    :param host: Interface to bind; keep it on localhost.
+    :param port: Port (0 picks a free one); when it is taken, a free one is used instead.
+    :param refresh_seconds: Tick interval.
+    :param window_seconds: Sliding window for rates and percentiles.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8089, refresh_seconds=0.5, window_seconds=30):
+        self.refresh_seconds = refresh_seconds
+        self.channel = MetricsChannel()
+        self.aggregator = LiveAggregator(window_seconds)
+        self.snapshot = self.aggregator.snapshot()
+        self._inbox = deque()
+        self._updated = threading.Condition()
+        self._stop = threading.Event()
+        try:
+            self._httpd = ThreadingHTTPServer((host, port), _DashboardHandler)
+        except OSError:
+            if not port:
+                raise
+            # Another run (or anything else) holds the port; the dashboard must not fail the test session
+            self._httpd = ThreadingHTTPServer((host, 0), _DashboardHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.dashboard = self
+        self.port = self._httpd.server_address[1]
+        self.url = f"http://{host}:{self.port}"
+        self._threads = [
+            threading.Thread(target=self._httpd.serve_forever, name="dashboard-http", daemon=True),
+            threading.Thread(target=self._tick, name="dashboard-aggregator", daemon=True),
+        ]
+
+    def start(self):
+        self.channel.attach()
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.channel.detach()
+        self._stop.set()
+        with self._updated:
+            self._updated.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def ingest(self, batch):
+        """Queues a batch posted by a worker process (see `MetricsForwarder`)."""
+        self._inbox.append(batch)
+
+    def _tick(self):
+        while not self._stop.wait(self.refresh_seconds):
+            self.aggregator.consume(self.channel.drain())
+            while self._inbox:
+                batch = self._inbox.popleft()
+                events = [RequestSample(*item) for item in batch["requests"]]
+                events += [ValidationSample(*item) for item in batch["validations"]]
+                self.aggregator.consume(events, starts=batch["starts"])
+            snapshot = self.aggregator.snapshot()
+            with self._updated:
+                self.snapshot = snapshot
+                self._updated.notify_all()
+
+    def wait_for_update(self, previous, timeout):
+        with self._updated:
+            if self.snapshot is previous and not self._stop.is_set():
+                self._updated.wait(timeout)
+            return self.snapshot
+
+
+class _DashboardHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _send(self, status, content_type, content):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        dashboard = self.server.dashboard
+        if self.path == "/":
+            self._send(200, "text/html; charset=utf-8", _PAGE.encode("utf-8"))
+        elif self.path == "/metrics.json":
+            self._send(200, "application/json", json.dumps(dashboard.snapshot).encode("utf-8"))
+        elif self.path == "/events":
+            self._stream(dashboard)
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _stream(self, dashboard):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        snapshot = None
+        try:
+            while not dashboard._stop.is_set():
+                snapshot = dashboard.wait_for_update(snapshot, timeout=15)
+                self.wfile.write(f"data: {json.dumps(snapshot)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def do_POST(self):
+        if self.path != "/ingest":
+            self._send(404, "text/plain", b"not found")
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.dashboard.ingest(json.loads(body))
+        self._send(204, "text/plain", b"")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsForwarder:
+    """
+    Runs in xdist workers: drains the local channel once per tick and posts one batch to the controller.
+
+    :param url: Dashboard URL of the controller.
+    :param refresh_seconds: Batch interval.
+    """
+
+    def __init__(self, url, refresh_seconds=0.5):
+        self.url = f"{url}/ingest"
+        self.refresh_seconds = refresh_seconds
+        self.channel = MetricsChannel()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dashboard-forwarder", daemon=True)
+
+    def start(self):
+        self.channel.attach()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.channel.detach()
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            self.flush()
+
+    def flush(self):
+        events = self.channel.drain()
+        if not events:
+            return
+        batch = {"starts": 0, "requests": [], "validations": []}
+        for event in events:
+            if event is _START:
+                batch["starts"] += 1
+            elif isinstance(event, RequestSample):
+                batch["requests"].append(list(event))
+            else:
+                batch["validations"].append(list(event))
+        # urllib rather than send_request: the dashboard's own traffic must not show up in the metrics
+        request = urllib.request.Request(
+            self.url, data=json.dumps(batch).encode("utf-8"), headers={"Content-Type": "application/json"}
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except OSError:
+            pass  # the controller is gone or busy; live numbers are best effort
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("dashboard", "live run dashboard")
+    group.addoption("--dashboard", action="store_true", default=False,
+                    help="Serve a live metrics dashboard while the tests run ([dashboard] host/port).")
+    group.addoption("--dashboard-port", type=int, default=None, help="Dashboard port (0 picks a free one).")
+
+
+def pytest_configure(config):
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is not None:
+        if workerinput.get("dashboard_url"):
+            config._dashboard = MetricsForwarder(
+                workerinput["dashboard_url"], ReadConfig.get_dashboard_refresh_seconds()
+            ).start()
+        return
+    if not config.getoption("dashboard"):
+        return
+    port = config.getoption("dashboard_port")
+    port = ReadConfig.get_dashboard_port() if port is None else port
+    config._dashboard = DashboardServer(
+        ReadConfig.get_dashboard_host(),
+        port,
+        ReadConfig.get_dashboard_refresh_seconds(),
+        ReadConfig.get_dashboard_window_seconds(),
+    ).start()
+    reporter = config.pluginmanager.get_plugin("terminalreporter")
+    if reporter:
+        busy = f" (port {port} is in use)" if port and config._dashboard.port != port else ""
+        reporter.write_line(f"Live dashboard: {config._dashboard.url}{busy}")
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    dashboard = getattr(node.config, "_dashboard", None)
+    if isinstance(dashboard, DashboardServer):
+        node.workerinput["dashboard_url"] = dashboard.url
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_unconfigure(config):
+    dashboard = getattr(config, "_dashboard", None)
+    if dashboard:
+        dashboard.stop()
+
+
+def _render(snapshot):
+    lines = [
+        f"elapsed {snapshot['elapsed_s']:>8.1f}s   requests {snapshot['requests']:>8}   rps {snapshot['rps']:>6}"
+        f"   in flight {snapshot['in_flight']:>4}   errors {snapshot['error_rate']:.2%}",
+        "",
+        f"{'endpoint':<36}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'val fail':>9}",
+    ]
+    for item in snapshot["endpoints"]:
+        percentiles = "".join(
+            f"{item[key]:>9.1f}" if item[key] is not None else f"{'-':>9}" for key in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        lines.append(f"{item['endpoint'][:35]:<36}{item['rps']:>8}{percentiles}"
+                     f"{item['error_rate']:>8.1%}{item['validation_failures']:>9}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Terminal view of a running dashboard.")
+    parser.add_argument("url", nargs="?", default=None, help="Dashboard URL (default: [dashboard] host/port)")
+    args = parser.parse_args(argv)
+    url = args.url or f"http://{ReadConfig.get_dashboard_host()}:{ReadConfig.get_dashboard_port()}"
+    try:
+        with urllib.request.urlopen(f"{url}/events") as stream:
+            for line in stream:
+                if line.startswith(b"data: "):
+                    sys.stdout.write("\x1b[H\x1b[2J" + _render(json.loads(line[6:])) + "\n")
+                    sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    except OSError as error:
+        print(f"Cannot read {url}/events: {error}")
+        return 1
+    return 0
+
+
+_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>API test run</title>
+<style>
+body { font: 14px system-ui, sans-serif; margin: 24px; color: #222; }
+.stats span { display: inline-block; min-width: 150px; margin-right: 16px; }
+.stats b { font-size: 22px; display: block; }
+table { border-collapse: collapse; margin-top: 20px; }
+th, td { padding: 4px 12px; text-align: right; border-bottom: 1px solid #ddd; }
+th:first-child, td:first-child { text-align: left; }
+.bad { color: #b00020; font-weight: bold; }
+</style></head>
+<body>
+<h2>API test run <small id="state">connecting...</small></h2>
+<div class="stats">
+  <span><b id="rps">-</b>requests/s</span><span><b id="inflight">-</b>in flight</span>
+  <span><b id="requests">-</b>requests</span><span><b id="errors">-</b>error rate</span>
+</div>
+<table><thead><tr><th>endpoint</th><th>requests</th><th>rps</th><th>p50 ms</th><th>p95 ms</th><th>p99 ms</th>
+<th>errors</th><th>validator failures</th></tr></thead><tbody id="endpoints"></tbody></table>
+<table><thead><tr><th>validation</th><th>check</th><th>passed</th><th>failed</th></tr></thead>
+<tbody id="validations"></tbody></table>
+<script>
+const ms = v => v === null ? "-" : v.toFixed(1);
+const escapes = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"};
+const escape = v => String(v).replace(/[&<>"']/g, c => escapes[c]);
+const cell = (v, bad) => `<td${bad ? ' class="bad"' : ''}>${escape(v)}</td>`;
+const source = new EventSource("/events");
+source.onmessage = event => {
+  const s = JSON.parse(event.data);
+  document.getElementById("state").textContent = `${s.elapsed_s}s, window ${s.window_s}s`;
+  document.getElementById("rps").textContent = s.rps;
+  document.getElementById("inflight").textContent = s.in_flight;
+  document.getElementById("requests").textContent = s.requests;
+  document.getElementById("errors").textContent = (100 * s.error_rate).toFixed(2) + "%";
+  document.getElementById("endpoints").innerHTML = s.endpoints.map(e => "<tr>" + cell(e.endpoint) +
+    cell(e.requests) + cell(e.rps) + cell(ms(e.p50_ms)) + cell(ms(e.p95_ms)) + cell(ms(e.p99_ms)) +
+    cell((100 * e.error_rate).toFixed(1) + "%", e.error_rate > 0) +
+    cell(e.validation_failures, e.validation_failures > 0) + "</tr>").join("");
+  document.getElementById("validations").innerHTML = s.validations.map(v => "<tr>" + cell(v.endpoint) +
+    cell(v.check) + cell(v.passed) + cell(v.failed, v.failed > 0) + "</tr>").join("");
+};
+source.onerror = () => { document.getElementById("state").textContent = "disconnected"; };
+</script>
+</body></html>
+"""
+
+
+if __name__ == "__main__":
+    sys.exit(main())
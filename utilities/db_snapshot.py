@@ -0,0 +1,229 @@
+"""
+Server-state snapshots for a SQLite-backed backend (`[database] database_path`).
+
+Instead of rebuilding preconditions over HTTP and deleting rows afterwards, a known-good database is
+captured once with SQLite's online backup API and restored between test groups:
+
+- `capture(name)` copies the live database page by page while the backend keeps running;
+- `restore(name)` copies the snapshot back the same way (`method="backup"`, safe with open
+  connections), or swaps in a copy-on-write clone of the snapshot file (`method="clone"`, a reflink
+  where the filesystem supports it). Only use "clone" when the backend opens a connection per
+  request (Django's default), because a connection that stays open keeps reading the replaced file.
+- `warm(name, build)` restores a named snapshot if one exists, otherwise runs `build()` (the usual
+  HTTP setup) and captures the result, so expensive preconditions are built once across runs.
+
+As a pytest plugin, `--db-restore module` (or `class`) captures a `baseline` snapshot at session
+start and restores it whenever the next test belongs to another group.
+"""
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import time
+
+import pytest
+
+from utilities.read_config import ReadConfig
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_FICLONE = 0x40049409
+
+
+def clone_file(source, destination):
+    """Copy-on-write clone (Linux FICLONE reflink) with a plain copy as fallback."""
+    if fcntl is not None:
+        with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+            try:
+                fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+                return
+            except OSError:
+                pass  # not supported by the filesystem (ext4, tmpfs, overlay ...); copy instead
+    shutil.copyfile(source, destination)
+
+
+def _backup(source_path, destination_path, source_uri=False):
+    source = sqlite3.connect(source_path, uri=source_uri, timeout=30)
+    destination = sqlite3.connect(destination_path, timeout=30)
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+
+
+class DatabaseSnapshots:
+    """
+    Named snapshots of one SQLite database file.
+
+    :param database_path: The backend's database file.
+    :param snapshot_dir: Directory holding `<name>.sqlite3` snapshots (and `<name>.json` build results).
+    :param restore_method: Default for `restore`: `backup` or `clone`.
+    :param refresh: Default for `warm`: rebuild snapshots even when they exist.
+    """
+
+    def __init__(self, database_path, snapshot_dir, restore_method="backup", refresh=False):
+        if not database_path:
+            raise ValueError("No database configured; set [database] database_path in config.ini.")
+        self.database_path = database_path
+        self.snapshot_dir = snapshot_dir
+        self.restore_method = restore_method
+        self.refresh = refresh
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.snapshot_dir, f"{name}.sqlite3")
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def names(self):
+        return sorted(file[:-len(".sqlite3")] for file in os.listdir(self.snapshot_dir) if file.endswith(".sqlite3"))
+
+    def capture(self, name):
+        """
+        :return: Seconds taken.
+        """
+        started = time.perf_counter()
+        temporary = self.path(name) + ".tmp"
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        _backup(self.database_path, temporary)
+        os.replace(temporary, self.path(name))
+        return time.perf_counter() - started
+
+    def restore(self, name, method=None):
+        """
+        :param method: `backup` (online, page by page) or `clone` (swap in a copy-on-write file copy).
+        :return: Seconds taken.
+        """
+        method = method or self.restore_method
+        if not self.exists(name):
+            raise FileNotFoundError(f"No snapshot named '{name}' in {self.snapshot_dir}")
+        started = time.perf_counter()
+        if method == "backup":
+            # as_uri() percent-encodes '?', '#' and '%' in the path, which SQLite would otherwise parse
+            _backup(pathlib.Path(self.path(name)).resolve().as_uri() + "?mode=ro", self.database_path, source_uri=True)
+        elif method == "clone":
+            temporary = self.database_path + ".restore"
+            clone_file(self.path(name), temporary)
+            for suffix in ("-wal", "-shm", "-journal"):
+                if os.path.exists(self.database_path + suffix):
+                    os.remove(self.database_path + suffix)
+            os.replace(temporary, self.database_path)
+        else:
+            raise ValueError(f"Unknown restore method '{method}'; use 'backup' or 'clone'.")
+        return time.perf_counter() - started
+
+    def delete(self, name):
+        for path in (self.path(name), os.path.join(self.snapshot_dir, f"{name}.json")):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def warm(self, name, build, method=None, refresh=None):
+        """
+        Restores snapshot `name`, or builds and captures it when missing (or when `refresh` is set).
+
+        :param build: Callable that creates the state over HTTP; its JSON-serializable return value
+                      (e.g. created IDs) is stored with the snapshot.
+        :return: What `build` returned when the snapshot was made.
+        """
+        result_path = os.path.join(self.snapshot_dir, f"{name}.json")
+        if (self.refresh if refresh is None else refresh) or not self.exists(name):
+            result = build()
+            self.capture(name)
+            with open(result_path, "w") as file:
+                json.dump(result, file)
+            return result
+        self.restore(name, method)
+        if not os.path.exists(result_path):
+            return None
+        with open(result_path) as file:
+            return json.load(file)
+
+
+def get_database_snapshots():
+    """Snapshots of the configured database, or None when `[database] database_path` is empty."""
+    database_path = ReadConfig.get_database_path()
+    if not database_path:
+        return None
+    return DatabaseSnapshots(
+        database_path, ReadConfig.get_database_snapshot_dir(), ReadConfig.get_database_restore_method()
+    )
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("db-snapshot", "database snapshots")
+    group.addoption("--db-restore", choices=("never", "module", "class"), default="never",
+                    help="Restore the database captured at session start whenever the test group changes.")
+    group.addoption("--db-restore-method", choices=("backup", "clone"), default=None,
+                    help="How to restore (default: [database] restore_method).")
+    group.addoption("--db-refresh-snapshots", action="store_true", default=False,
+                    help="Rebuild warm snapshots instead of restoring them.")
+
+
+def _group(item, scope):
+    if item is None:
+        return None
+    if scope == "class":
+        return item.nodeid.rsplit("::", 1)[0]
+    return item.nodeid.split("::", 1)[0]
+
+
+class SnapshotRestorer:
+    """pytest plugin object registered by `--db-restore`."""
+
+    BASELINE = "baseline"
+
+    def __init__(self, snapshots, scope, method):
+        self.snapshots = snapshots
+        self.scope = scope
+        self.method = method
+        self.restores = 0
+        self.restore_seconds = 0.0
+
+    def pytest_sessionstart(self, session):
+        self.snapshots.capture(self.BASELINE)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_runtest_teardown(self, item, nextitem):
+        if nextitem is not None and _group(item, self.scope) == _group(nextitem, self.scope):
+            return
+        self.restore_seconds += self.snapshots.restore(self.BASELINE, self.method)
+        self.restores += 1
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.restores:
+            terminalreporter.write_line(
+                f"database snapshots: {self.restores} restores of '{self.BASELINE}' by {self.method}, "
+                f"{self.restore_seconds * 1000 / self.restores:.1f} ms each"
+            )
+
+
+@pytest.fixture(scope="session")
+def database_snapshots(request):
+    """Session-wide `DatabaseSnapshots`; tests are skipped when no database is configured."""
+    snapshots = get_database_snapshots()
+    if snapshots is None:
+        pytest.skip("[database] database_path is not configured")
+    snapshots.refresh = request.config.getoption("db_refresh_snapshots")
+    snapshots.restore_method = request.config.getoption("db_restore_method") or snapshots.restore_method
+    return snapshots
+
+
+def pytest_configure(config):
+    scope = config.getoption("db_restore")
+    if scope == "never":
+        return
+    if getattr(config.option, "numprocesses", None):
+        # xdist workers share one database file; one worker's restore would wipe another's preconditions
+        raise pytest.UsageError("--db-restore cannot be combined with -n")
+    snapshots = get_database_snapshots()
+    if snapshots is None:
+        raise pytest.UsageError("--db-restore needs [database] database_path in config.ini")
+    method = config.getoption("db_restore_method") or snapshots.restore_method
+    config.pluginmanager.register(SnapshotRestorer(snapshots, scope, method), "db-snapshot-restorer")
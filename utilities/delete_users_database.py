@@ -1,19 +1,28 @@
 import sqlite3
 
-database_path = r"C:\Users\user\Documents\Python\Django-React_Ecommerce\StankinShop\backend\db.sqlite3"
+from utilities.read_config import ReadConfig
+
+database_path = ReadConfig.get_database_path()
 table_name = "auth_user"
 
 
-def delete_users():
+def _connect():
+    if not database_path:
+        raise ValueError("Set [database] database_path in config.ini to the backend's SQLite file.")
+    return sqlite3.connect(database_path)
+
+
+def delete_users(users_to_keep=None):
     cursor = None
     connection = None
     try:
         # Connect to the SQLite database
-        connection = sqlite3.connect(database_path)
+        connection = _connect()
         cursor = connection.cursor()
 
         # Create a temporary table to store the IDs to keep
-        cursor.execute("CREATE TEMP TABLE temp_ids AS SELECT id FROM auth_user ORDER BY id LIMIT 4")
+        users_to_keep = users_to_keep or ReadConfig.get_database_users_to_keep()
+        cursor.execute("CREATE TEMP TABLE temp_ids AS SELECT id FROM auth_user ORDER BY id LIMIT ?", (users_to_keep,))
 
         # Delete rows from the main table that are not in the temp_ids table
         cursor.execute(f"""
@@ -24,7 +33,7 @@ def delete_users():
         # Commit the changes
         connection.commit()
 
-        print("Users deleted except the first 3 successfully.")
+        print(f"Users deleted except the first {users_to_keep} successfully.")
     except sqlite3.Error as e:
         print(f"Database error occurred: {e}")
     finally:
@@ -39,7 +48,7 @@ def fetch_and_print_users():
     connection = None
     try:
         # Connect to the SQLite database
-        connection = sqlite3.connect(database_path)
+        connection = _connect()
         cursor = connection.cursor()
 
         # Define and execute the SELECT query
@@ -66,7 +75,7 @@ def delete_user_by_id(user_id):
     connection = None
     try:
         # Connect to the SQLite database
-        connection = sqlite3.connect(database_path)
+        connection = _connect()
         cursor = connection.cursor()
 
         # Execute the delete query
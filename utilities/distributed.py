@@ -0,0 +1,568 @@
+"""
+Distributed runs: one coordinator shards tests or a load scenario over worker processes on one or more hosts.
+
+Workers dial in to the coordinator over TCP (`host:port`) or a Unix socket (`unix:/path`), so a worker is
+started on any machine that can reach the coordinator. Both sides exchange length-prefixed JSON frames:
+
+- `tests` jobs: the coordinator collects the node ids once, packs them into one shard per worker with
+  the LPT plan from the duration history (`utilities/duration_history.py`) and each worker runs its
+  shard in-process with pytest - the usual fixtures, `send_request` and plugins. Workers get the
+  pytest arguments unchanged and deselect everything outside their shard at collection. Every test result is
+  streamed back as soon as the test finishes. When a worker drops out, the tests it had not reported
+  yet go to the next idle worker.
+- `load` jobs: every worker runs its share of a scenario's concurrency (weighted request mix, see
+  `resources/scenarios/`) through `send_request_async` until the scenario's duration is up.
+
+In both modes the workers stream per-endpoint `LatencyHistogram` deltas every `[distributed] flush_seconds`;
+the coordinator merges them, prints progress, and writes the merged report to `[distributed] report_path`.
+
+Usage, all on one box:
+    python -m utilities.distributed tests --spawn 4 -- test_cases -k "not rate_limiting"
+    python -m utilities.distributed load browse_products.json --spawn 4
+
+Across hosts, start the coordinator with `--listen 0.0.0.0:7070 --workers 8` and on each host:
+    python -m utilities.distributed worker --connect coordinator-host:7070
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+from utilities.duration_history import DurationHistory, plan_shards
+from utilities.latency_histogram import LatencyHistogram
+from utilities.metrics import request_metrics
+from utilities.payload_template import compile_request_specs
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request_async
+
+_resources_dir = os.path.join(os.path.dirname(__file__), "..", "resources")
+_FRAME = struct.Struct("!I")
+
+
+def load_scenario(scenario):
+    """
+    :param scenario: Path, or file name under `resources/scenarios/`.
+    """
+    path = scenario if os.path.exists(scenario) else os.path.join(_resources_dir, "scenarios", scenario)
+    with open(path) as file:
+        return json.load(file)
+
+
+def parse_address(address):
+    """`host:port` -> (AF_INET, (host, port)); `unix:/path` -> (AF_UNIX, path)."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class Channel:
+    """Length-prefixed JSON frames over a stream socket; `send` may be called from several threads."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._reader = sock.makefile("rb")
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        with self._send_lock:
+            self.sock.sendall(_FRAME.pack(len(data)) + data)
+
+    def receive(self):
+        """:return: The next message, or None once the peer has closed the connection."""
+        header = self._reader.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            return None
+        data = self._reader.read(_FRAME.unpack(header)[0])
+        return json.loads(data)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._reader.close()
+        self.sock.close()
+
+
+class EndpointStats:
+    """Per-endpoint histograms and error counts; `drain` hands over what was recorded since the last call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, sample):
+        with self._lock:
+            entry = self._endpoints.get(sample.endpoint)
+            if entry is None:
+                entry = self._endpoints[sample.endpoint] = [LatencyHistogram(), 0]
+            entry[0].record(sample.latency_ms)
+            entry[1] += not sample.status or sample.status >= 500
+
+    def drain(self):
+        with self._lock:
+            endpoints, self._endpoints = self._endpoints, {}
+        return {endpoint: {"histogram": histogram.to_dict(), "errors": errors}
+                for endpoint, (histogram, errors) in endpoints.items()}
+
+    def merge(self, data):
+        with self._lock:
+            for endpoint, item in data.items():
+                entry = self._endpoints.get(endpoint)
+                if entry is None:
+                    entry = self._endpoints[endpoint] = [LatencyHistogram(), 0]
+                entry[0].merge(LatencyHistogram.from_dict(item["histogram"]))
+                entry[1] += item["errors"]
+
+    def summary(self):
+        with self._lock:
+            return {endpoint: {**histogram.summary(), "errors": errors}
+                    for endpoint, (histogram, errors) in sorted(self._endpoints.items())}
+
+    def total(self):
+        with self._lock:
+            return sum(histogram.total for histogram, _ in self._endpoints.values())
+
+
+# ----- Worker -----
+
+class _ResultStreamer:
+    """pytest plugin inside a worker: runs only its shard and sends each test's outcome as soon as it is known."""
+
+    def __init__(self, channel, job_id, nodeids):
+        self.channel = channel
+        self.job_id = job_id
+        self.nodeids = {nodeid: index for index, nodeid in enumerate(nodeids)}
+        self._results = {}
+
+    def pytest_collection_modifyitems(self, config, items):
+        deselected = [item for item in items if item.nodeid not in self.nodeids]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        # In plan order, longest first
+        selected = [item for item in items if item.nodeid in self.nodeids]
+        items[:] = sorted(selected, key=lambda item: self.nodeids[item.nodeid])
+
+    def pytest_runtest_logreport(self, report):
+        result = self._results.setdefault(report.nodeid, {"outcome": "passed", "duration_s": 0.0, "message": None})
+        result["duration_s"] += report.duration
+        if report.failed:
+            result["outcome"] = "failed" if report.when == "call" else "error"
+            crash = getattr(report.longrepr, "reprcrash", None)
+            result["message"] = (crash.message if crash else report.longreprtext.strip()).splitlines()[0]
+        elif report.skipped and result["outcome"] == "passed":
+            result["outcome"] = "skipped"
+        if report.when == "teardown":  # runs even after a failed or skipped setup
+            self.channel.send({"type": "test", "job": self.job_id, "nodeid": report.nodeid,
+                               **self._results.pop(report.nodeid)})
+
+
+async def _run_load(scenario, concurrency, seed):
+    requests = compile_request_specs(scenario["requests"])
+    weights = [spec.get("weight", 1) for spec in requests]
+    deadline = time.monotonic() + scenario["duration_seconds"]
+    # Optional total rate, split evenly over this worker's tasks
+    interval = concurrency / scenario["rate_per_second"] if scenario.get("rate_per_second") else 0.0
+
+    async def user(index):
+        chooser = random.Random(seed * 100003 + index)
+        next_at = time.monotonic()
+        while time.monotonic() < deadline:
+            spec = chooser.choices(requests, weights)[0]
+            template = spec["template"]
+            try:
+                # coalesce=False: identical concurrent GETs are the load, not something to share
+                await send_request_async(spec["method"], spec["endpoint"], headers=spec.get("headers"),
+                                         data=template.render() if template else None,
+                                         timeout=scenario.get("timeout_seconds", 10), coalesce=False)
+            except Exception:
+                pass  # recorded as a failed request by the request layer; keep the load going
+            if interval:
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+    await asyncio.gather(*(user(index) for index in range(concurrency)))
+
+
+def run_worker(address, auth_token=None, flush_seconds=None):
+    """
+    Connects to a coordinator and runs the jobs it sends until it says stop.
+
+    :return: 0 after a clean stop, 1 when the coordinator went away or refused the worker.
+    """
+    family, target = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(target)
+    if family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    channel = Channel(sock)
+    channel.send({"type": "hello", "host": socket.gethostname(), "pid": os.getpid(),
+                  "token": auth_token if auth_token is not None else ReadConfig.get_distributed_auth_token()})
+
+    stats = EndpointStats()
+    request_metrics.subscribe(stats.record)
+    stop = threading.Event()
+    flush_seconds = flush_seconds or ReadConfig.get_distributed_flush_seconds()
+
+    def flush():
+        endpoints = stats.drain()
+        if endpoints:
+            channel.send({"type": "metrics", "endpoints": endpoints})
+
+    def flusher():
+        while not stop.wait(flush_seconds):
+            try:
+                flush()
+            except OSError:
+                return
+
+    threading.Thread(target=flusher, name="distributed-flusher", daemon=True).start()
+    try:
+        while True:
+            message = channel.receive()
+            if message is None:
+                return 1
+            if message["type"] == "stop":
+                return 0
+            if message["type"] == "tests":
+                # The framework's plugins were imported with this module, before pytest could rewrite them
+                exit_code = pytest.main([*message["args"], "-p", "no:cacheprovider", "-W",
+                                         "ignore::pytest.PytestAssertRewriteWarning"],
+                                        plugins=[_ResultStreamer(channel, message["job"], message["nodeids"])])
+            elif message["type"] == "load":
+                asyncio.run(_run_load(message["scenario"], message["concurrency"], message["seed"]))
+                exit_code = 0
+            else:
+                raise ValueError(f"Unknown job type '{message['type']}'")
+            flush()
+            channel.send({"type": "done", "job": message["job"], "exit_code": int(exit_code)})
+    finally:
+        stop.set()
+        request_metrics.unsubscribe(stats.record)
+        channel.close()
+
+
+# ----- Coordinator -----
+
+def collect_nodeids(pytest_args):
+    """Collects the node ids once, in a separate process, with the current environment."""
+    with tempfile.TemporaryDirectory() as directory:
+        nodeids_file = os.path.join(directory, "nodeids.txt")
+        result = subprocess.run(
+            [sys.executable, "-m", "pytest", *pytest_args, "--collect-only", "-q", "-p", "no:cacheprovider",
+             "-p", "utilities.fanout", "--nodeids-to", nodeids_file],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0 or not os.path.exists(nodeids_file):
+            raise RuntimeError(f"Collection failed:\n{result.stdout}\n{result.stderr}")
+        with open(nodeids_file) as file:
+            return [line.strip() for line in file if line.strip()]
+
+
+class Coordinator:
+    """
+    :param listen: `host:port` or `unix:/path` to accept workers on.
+    :param workers: Number of workers to wait for before handing out jobs.
+    :param auth_token: Shared secret workers must present; empty accepts any worker.
+    :param connect_timeout: Seconds to wait for the workers to connect.
+    """
+
+    def __init__(self, listen=None, workers=1, auth_token=None, connect_timeout=None):
+        self.listen = listen or ReadConfig.get_distributed_listen()
+        self.workers = workers
+        self.auth_token = auth_token if auth_token is not None else ReadConfig.get_distributed_auth_token()
+        self.connect_timeout = connect_timeout or ReadConfig.get_distributed_connect_timeout_seconds()
+        self.stats = EndpointStats()
+        self.tests = {}
+        self._events = queue.Queue()
+        self._channels = {}
+        self._server = None
+        self.address = None
+
+    def start(self):
+        family, target = parse_address(self.listen)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.remove(target)
+        self._server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(target)
+        self._server.listen()
+        bound = self._server.getsockname()
+        self.address = f"unix:{bound}" if family == socket.AF_UNIX else f"{bound[0]}:{bound[1]}"
+        threading.Thread(target=self._accept, name="distributed-accept", daemon=True).start()
+        return self
+
+    def _accept(self):
+        worker_id = 0
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            worker_id += 1
+            threading.Thread(target=self._serve, args=(worker_id, Channel(sock)), daemon=True).start()
+
+    def _serve(self, worker_id, channel):
+        hello = channel.receive()
+        if not hello or hello.get("type") != "hello" or (self.auth_token and hello.get("token") != self.auth_token):
+            channel.close()
+            return
+        self._channels[worker_id] = channel
+        self._events.put(("joined", worker_id, hello))
+        while True:
+            try:
+                message = channel.receive()
+            except (OSError, ValueError):
+                message = None
+            if message is None:
+                self._events.put(("left", worker_id, None))
+                return
+            self._events.put(("message", worker_id, message))
+
+    def _wait_for_workers(self):
+        joined = {}
+        deadline = time.monotonic() + self.connect_timeout
+        while len(joined) < self.workers:
+            try:
+                kind, worker_id, data = self._events.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(f"{len(joined)} of {self.workers} workers connected to {self.address}") from None
+            if kind == "joined":
+                joined[worker_id] = data
+                print(f"worker {worker_id} joined from {data['host']} (pid {data['pid']})")
+            elif kind == "left":
+                joined.pop(worker_id, None)
+        return joined
+
+    def _run_jobs(self, jobs, on_progress, retry=None):
+        """
+        Hands jobs to idle workers until all are done.
+
+        :param jobs: List of job messages (each with a unique `job` id).
+        :param on_progress: Called about once a second.
+        :param retry: Called with the job of a worker that dropped out; returns a job to run instead, or None.
+        :return: Dict of job id -> exit code (-1 for a job lost with its worker).
+        """
+        pending = list(jobs)
+        idle = list(self._wait_for_workers())
+        running = {}
+        exit_codes = {}
+        last_progress = time.monotonic()
+        while pending or running:
+            while pending and idle:
+                job = pending.pop(0)
+                worker_id = idle.pop(0)
+                running[worker_id] = job
+                self._channels[worker_id].send(job)
+            if not running:
+                raise RuntimeError(f"No workers left with {len(pending)} jobs pending")
+            try:
+                kind, worker_id, message = self._events.get(timeout=1.0)
+            except queue.Empty:
+                kind = None
+            if kind == "joined":
+                idle.append(worker_id)
+            elif kind == "left":
+                job = running.pop(worker_id, None)
+                self._channels.pop(worker_id, None)
+                if job is not None:
+                    print(f"worker {worker_id} left during job {job['job']}")
+                    replacement = retry(job) if retry else None
+                    if replacement:
+                        pending.append(replacement)
+                    else:
+                        exit_codes[job["job"]] = -1
+            elif kind == "message":
+                if message["type"] == "metrics":
+                    self.stats.merge(message["endpoints"])
+                elif message["type"] == "test":
+                    self.tests[message["nodeid"]] = {key: message[key] for key in ("outcome", "duration_s", "message")}
+                elif message["type"] == "done":
+                    exit_codes[message["job"]] = message["exit_code"]
+                    running.pop(worker_id, None)
+                    idle.append(worker_id)
+            if time.monotonic() - last_progress >= 1.0:
+                last_progress = time.monotonic()
+                on_progress()
+        return exit_codes
+
+    def stop(self):
+        for channel in list(self._channels.values()):
+            try:
+                channel.send({"type": "stop"})
+            except OSError:
+                pass
+        # Metrics still in flight arrive before the workers close their side
+        deadline = time.monotonic() + 5
+        remaining = set(self._channels)
+        while remaining and time.monotonic() < deadline:
+            try:
+                kind, worker_id, message = self._events.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if kind == "left":
+                remaining.discard(worker_id)
+            elif kind == "message" and message["type"] == "metrics":
+                self.stats.merge(message["endpoints"])
+        self._server.close()
+        if self.address.startswith("unix:") and os.path.exists(self.address[len("unix:"):]):
+            os.remove(self.address[len("unix:"):])
+
+    def run_tests(self, pytest_args=(), shard_count=None):
+        """
+        :param pytest_args: Arguments selecting the tests (paths, -m, -k ...), also passed to every worker.
+        :param shard_count: Shards to plan (default: one per worker).
+        :return: Report dict.
+        """
+        started = time.time()
+        nodeids = collect_nodeids(pytest_args)
+        history = DurationHistory(ReadConfig.get_duration_history_database_path())
+        known = history.estimates(ReadConfig.get_duration_history_window())
+        default = ReadConfig.get_duration_history_default_seconds()
+        shards = plan_shards({nodeid: known.get(nodeid, default) for nodeid in nodeids}, shard_count or self.workers)
+        # Unchanged, option values and paths alike: the workers narrow the collection down to their shard
+        args = list(pytest_args) or ["-q"]
+
+        jobs = [{"type": "tests", "job": f"shard-{index}", "args": args, "nodeids": shard["nodeids"]}
+                for index, shard in enumerate(shards) if shard["nodeids"]]
+
+        def retry(job):
+            # Only the tests the lost worker had not reported yet
+            remaining = [nodeid for nodeid in job["nodeids"] if nodeid not in self.tests]
+            return {**job, "job": f"{job['job']}-retry", "nodeids": remaining} if remaining else None
+
+        def progress():
+            print(f"{len(self.tests)}/{len(nodeids)} tests, {self.stats.total()} requests")
+
+        exit_codes = self._run_jobs(jobs, progress, retry)
+        outcomes = defaultdict(int)
+        for result in self.tests.values():
+            outcomes[result["outcome"]] += 1
+        missing = [nodeid for nodeid in nodeids if nodeid not in self.tests]
+        return {"mode": "tests", "started": started, "finished": time.time(), "workers": self.workers,
+                "tests_collected": len(nodeids), "outcomes": dict(outcomes), "not_run": missing,
+                "exit_codes": exit_codes, "tests": self.tests, "endpoints": self.stats.summary()}
+
+    def run_load(self, scenario, seed=0):
+        """
+        :param scenario: Scenario dict (see `load_scenario`).
+        :return: Report dict.
+        """
+        started = time.time()
+        concurrency = scenario["concurrency"]
+        shares = [concurrency // self.workers + (index < concurrency % self.workers) for index in range(self.workers)]
+        jobs = []
+        for index, share in enumerate(shares):
+            if not share:
+                continue
+            job_scenario = dict(scenario)
+            if scenario.get("rate_per_second"):
+                # Every job paces its own tasks, so each gets the part of the rate its tasks stand for
+                job_scenario["rate_per_second"] = scenario["rate_per_second"] * share / concurrency
+            jobs.append({"type": "load", "job": f"load-{index}", "scenario": job_scenario, "concurrency": share,
+                         "seed": seed + index})
+
+        def progress():
+            elapsed = time.time() - started
+            print(f"{elapsed:6.1f}s  {self.stats.total()} requests, {self.stats.total() / max(elapsed, 1e-9):.0f}/s")
+
+        exit_codes = self._run_jobs(jobs, progress)
+        finished = time.time()
+        return {"mode": "load", "started": started, "finished": finished, "workers": self.workers,
+                "requests": self.stats.total(), "rps": self.stats.total() / (finished - started),
+                "exit_codes": exit_codes, "endpoints": self.stats.summary()}
+
+
+def spawn_workers(address, count):
+    """Starts `count` local worker processes connecting to `address`."""
+    return [subprocess.Popen([sys.executable, "-m", "utilities.distributed", "worker", "--connect", address])
+            for _ in range(count)]
+
+
+def print_report(report):
+    if report["mode"] == "tests":
+        outcomes = ", ".join(f"{count} {outcome}" for outcome, count in sorted(report["outcomes"].items()))
+        print(f"{report['tests_collected']} tests on {report['workers']} workers in "
+              f"{report['finished'] - report['started']:.1f}s: {outcomes or 'none run'}")
+        for nodeid, result in sorted(report["tests"].items()):
+            if result["outcome"] in ("failed", "error"):
+                print(f"  {result['outcome'].upper()} {nodeid}: {result['message']}")
+        for nodeid in report["not_run"]:
+            print(f"  NOT RUN {nodeid}")
+    else:
+        print(f"{report['requests']} requests on {report['workers']} workers in "
+              f"{report['finished'] - report['started']:.1f}s ({report['rps']:.0f}/s)")
+    print(f"{'endpoint':<40}{'count':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for endpoint, summary in report["endpoints"].items():
+        percentiles = "".join(f"{summary[key]:>9.1f}" if summary[key] is not None else f"{'-':>9}"
+                              for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"{endpoint:<40}{summary['count']:>9}{percentiles}{summary['errors']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Coordinate tests or load over several worker processes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Run jobs for a coordinator")
+    worker.add_argument("--connect", default=None, help="Coordinator address (default: [distributed] listen)")
+    for name in ("tests", "load"):
+        command = commands.add_parser(name, help=f"Coordinate a {name} run")
+        command.add_argument("--listen", default=None, help="host:port or unix:/path (default: [distributed] listen)")
+        command.add_argument("--workers", type=int, default=None, help="Workers to wait for (default: --spawn)")
+        command.add_argument("--spawn", type=int, default=0, help="Start this many local workers")
+        command.add_argument("--report", default=None, help="Report path (default: [distributed] report_path)")
+        if name == "load":
+            command.add_argument("scenario", help="Scenario path or name in resources/scenarios/")
+            command.add_argument("--seed", type=int, default=0)
+    argv = list(sys.argv[1:] if argv is None else argv)
+    pytest_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, pytest_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        return run_worker(args.connect or ReadConfig.get_distributed_listen())
+
+    workers = args.workers or args.spawn
+    if not workers:
+        parser.error("give --workers, --spawn or both")
+    coordinator = Coordinator(args.listen, workers).start()
+    print(f"coordinator listening on {coordinator.address}")
+    processes = spawn_workers(coordinator.address, args.spawn) if args.spawn else []
+    try:
+        if args.command == "tests":
+            report = coordinator.run_tests(pytest_args)
+        else:
+            report = coordinator.run_load(load_scenario(args.scenario), args.seed)
+    finally:
+        coordinator.stop()
+        for process in processes:
+            process.wait()
+
+    report_path = os.path.join(os.path.abspath(os.curdir), args.report or ReadConfig.get_distributed_report_path())
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as file:
+        json.dump(report, file, indent=2)
+    print_report(report)
+    failed = report["mode"] == "tests" and (report["not_run"] or any(
+        result["outcome"] in ("failed", "error") for result in report["tests"].values()))
+    return 1 if failed or any(code != 0 for code in report["exit_codes"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
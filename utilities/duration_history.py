@@ -0,0 +1,279 @@
+"""
+Test-duration history and longest-processing-time-first (LPT) scheduling.
+
+Every run records each test's setup, call and teardown time in a local SQLite database. With `--lpt`
+the collected tests are packed into one shard per worker, longest first, keeping tests that share an
+expensive fixture (`[duration_history] expensive_fixtures`) together:
+
+    pytest -n 4 --dist loadgroup --lpt          # pytest-xdist: one `xdist_group` per worker
+    pytest --shard-count 4 --shard-index 0      # CI matrix: run only shard 0
+
+The terminal summary shows the predicted makespan next to the actual one.
+"""
+import os
+import sqlite3
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+import pytest
+
+from utilities.read_config import ReadConfig
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_durations (
+    nodeid TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    setup_s REAL NOT NULL,
+    call_s REAL NOT NULL,
+    teardown_s REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    worker TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_test_durations_nodeid ON test_durations (nodeid, recorded_at);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    workers INTEGER NOT NULL,
+    predicted_makespan_s REAL,
+    actual_makespan_s REAL
+);
+"""
+
+
+class DurationHistory:
+    """
+    SQLite store of per-test phase durations.
+
+    :param path: Database file; created on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record_run(self, run_id, durations, workers, predicted_makespan, actual_makespan):
+        """
+        :param durations: Dict of nodeid -> dict with `setup`, `call`, `teardown`, `outcome` and `worker`.
+        """
+        now = time.time()
+        rows = [
+            (nodeid, run_id, item["setup"], item["call"], item["teardown"], item["outcome"], item["worker"], now)
+            for nodeid, item in durations.items()
+        ]
+        with self._connect() as connection:
+            connection.executemany("INSERT INTO test_durations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (run_id, now, workers, predicted_makespan, actual_makespan),
+            )
+
+    def estimates(self, window=10):
+        """
+        Median total duration (setup + call + teardown) of each test over its last `window` runs.
+
+        :return: Dict of nodeid -> seconds.
+        """
+        query = """
+            SELECT nodeid, setup_s + call_s + teardown_s FROM (
+                SELECT nodeid, setup_s, call_s, teardown_s,
+                       ROW_NUMBER() OVER (PARTITION BY nodeid ORDER BY recorded_at DESC) AS recency
+                FROM test_durations
+            ) WHERE recency <= ?
+        """
+        samples = defaultdict(list)
+        with self._connect() as connection:
+            for nodeid, total in connection.execute(query, (window,)):
+                samples[nodeid].append(total)
+        return {nodeid: statistics.median(values) for nodeid, values in samples.items()}
+
+
+def plan_shards(durations, shard_count, groups=None):
+    """
+    Longest-processing-time-first assignment of tests to `shard_count` shards.
+
+    Tests listed together in `groups` are scheduled as one unit, unless the unit alone would be longer
+    than an ideal shard; such groups are split into chunks that each fit.
+
+    :param durations: Dict of nodeid -> estimated seconds, in collection order.
+    :param shard_count: Number of workers/shards.
+    :param groups: Iterable of nodeid lists that should stay on one shard.
+    :return: List of shards, each a dict with `nodeids` (longest first) and `predicted_s`.
+    """
+    shard_count = max(1, shard_count)
+    ideal = sum(durations.values()) / shard_count
+    units = []
+    grouped = set()
+    for group in groups or ():
+        chunk, chunk_total = [], 0.0
+        for nodeid in sorted(group, key=lambda item: -durations[item]):
+            if chunk and chunk_total + durations[nodeid] > ideal:
+                units.append((chunk_total, chunk))
+                chunk, chunk_total = [], 0.0
+            chunk.append(nodeid)
+            chunk_total += durations[nodeid]
+            grouped.add(nodeid)
+        if chunk:
+            units.append((chunk_total, chunk))
+    units.extend((seconds, [nodeid]) for nodeid, seconds in durations.items() if nodeid not in grouped)
+
+    shards = [{"nodeids": [], "predicted_s": 0.0} for _ in range(shard_count)]
+    for seconds, nodeids in sorted(units, key=lambda unit: -unit[0]):
+        shard = min(shards, key=lambda item: item["predicted_s"])
+        shard["nodeids"].extend(nodeids)
+        shard["predicted_s"] += seconds
+    for shard in shards:
+        shard["nodeids"].sort(key=lambda nodeid: -durations[nodeid])
+    return shards
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("duration-history", "test-duration history and LPT scheduling")
+    group.addoption("--lpt", action="store_true", default=False,
+                    help="Order tests longest-first and pack them into one xdist_group per worker "
+                         "(run with -n N --dist loadgroup).")
+    group.addoption("--shard-count", type=int, default=None, help="Split the suite into this many LPT shards.")
+    group.addoption("--shard-index", type=int, default=None, help="Run only this shard (0-based).")
+
+
+def pytest_configure(config):
+    if not config.pluginmanager.hasplugin("xdist"):
+        config.addinivalue_line("markers", "xdist_group(name): keep tests on one pytest-xdist worker")
+    config.pluginmanager.register(DurationRecorder(config), "duration-recorder")
+
+
+def _worker_count(config):
+    if config.getoption("shard_count"):
+        return config.getoption("shard_count")
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput:
+        return workerinput["workercount"]
+    try:
+        return int(getattr(config.option, "numprocesses", 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _expensive_fixture_groups(items):
+    expensive = ReadConfig.get_duration_history_expensive_fixtures()
+    groups = defaultdict(list)
+    for item in items:
+        shared = tuple(sorted(expensive.intersection(getattr(item, "fixturenames", ()))))
+        if shared:
+            groups[(item.nodeid.split("::", 1)[0], shared)].append(item.nodeid)
+    return list(groups.values())
+
+
+class DurationRecorder:
+    """Records phase durations (on the xdist controller, or the only process) and applies the LPT plan."""
+
+    def __init__(self, config):
+        self.config = config
+        self.is_worker = hasattr(config, "workerinput")
+        self.run_id = uuid.uuid4().hex
+        self.durations = {}
+        self.shards = None
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        # tryfirst: xdist's loadgroup support reads the xdist_group marks in its own hook right after this one
+        shard_index = config.getoption("shard_index")
+        if not (config.getoption("lpt") or shard_index is not None):
+            return
+        if shard_index is not None and not config.getoption("shard_count"):
+            raise pytest.UsageError("--shard-index requires --shard-count")
+        workers = _worker_count(config)
+        if workers < 1:
+            return
+
+        history = DurationHistory(ReadConfig.get_duration_history_database_path())
+        known = history.estimates(ReadConfig.get_duration_history_window())
+        default = statistics.median(known.values()) if known else ReadConfig.get_duration_history_default_seconds()
+        durations = {item.nodeid: known.get(item.nodeid, default) for item in items}
+        self.shards = plan_shards(durations, workers, _expensive_fixture_groups(items))
+
+        shard_of = {nodeid: index for index, shard in enumerate(self.shards) for nodeid in shard["nodeids"]}
+        order = {nodeid: position for shard in self.shards for position, nodeid in enumerate(shard["nodeids"])}
+        items.sort(key=lambda item: (shard_of[item.nodeid], order[item.nodeid]))
+
+        if shard_index is not None:
+            selected = [item for item in items if shard_of[item.nodeid] == shard_index]
+            deselected = [item for item in items if shard_of[item.nodeid] != shard_index]
+            if deselected:
+                config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+        else:
+            for item in items:
+                item.add_marker(pytest.mark.xdist_group(name=f"lpt-{shard_of[item.nodeid]}"))
+
+    def pytest_runtest_logreport(self, report):
+        if self.is_worker:
+            return  # xdist workers forward their reports to the controller, which does the recording
+        entry = self.durations.setdefault(
+            report.nodeid,
+            {"setup": 0.0, "call": 0.0, "teardown": 0.0, "outcome": "passed", "worker": None},
+        )
+        entry[report.when] = report.duration
+        node = getattr(report, "node", None)
+        if node is not None:
+            entry["worker"] = node.gateway.id
+        if report.failed:
+            entry["outcome"] = "failed"
+        elif report.skipped and entry["outcome"] == "passed":
+            entry["outcome"] = "skipped"
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        # Under xdist only the workers collect, so the controller learns the plan from their output
+        shards = getattr(node, "workeroutput", {}).get("lpt_shards")
+        if shards and self.shards is None:
+            self.shards = shards
+
+    def _makespans(self):
+        per_worker = defaultdict(float)
+        for item in self.durations.values():
+            per_worker[item["worker"] or "local"] += item["setup"] + item["call"] + item["teardown"]
+        shard_index = self.config.getoption("shard_index")
+        if not self.shards:
+            predicted = None
+        elif shard_index is not None:
+            predicted = self.shards[shard_index]["predicted_s"]
+        else:
+            predicted = max(shard["predicted_s"] for shard in self.shards)
+        return per_worker, predicted
+
+    def pytest_sessionfinish(self, session):
+        if self.is_worker:
+            if self.shards is not None:
+                self.config.workeroutput["lpt_shards"] = self.shards
+            return
+        if not self.durations:
+            return
+        per_worker, predicted = self._makespans()
+        history = DurationHistory(ReadConfig.get_duration_history_database_path())
+        history.record_run(self.run_id, self.durations, len(per_worker), predicted, max(per_worker.values()))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.is_worker or not self.shards or not self.durations:
+            return
+        per_worker, predicted = self._makespans()
+        shard_index = self.config.getoption("shard_index")
+        terminalreporter.section("LPT scheduling")
+        for index, shard in enumerate(self.shards):
+            if shard_index is None or index == shard_index:
+                terminalreporter.write_line(
+                    f"shard {index}: {len(shard['nodeids'])} tests, predicted {shard['predicted_s']:.2f}s"
+                )
+        for worker, seconds in sorted(per_worker.items()):
+            terminalreporter.write_line(f"worker {worker}: actual {seconds:.2f}s")
+        terminalreporter.write_line(
+            f"makespan: predicted {predicted:.2f}s, actual {max(per_worker.values()):.2f}s, "
+            f"ideal {sum(per_worker.values()) / len(per_worker):.2f}s"
+        )
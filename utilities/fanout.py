@@ -0,0 +1,197 @@
+"""
+Multi-environment fan-out: runs the same collected tests against several environment profiles at once.
+
+Each environment (a `[environment:<name>]` section in config.ini) runs in its own pytest process with
+`API_ENV=<name>`, so it gets its own connection pool, token cache and test data. The tests are collected
+once and every process runs exactly that list. Results are merged into one matrix report with per-test
+outcomes and per-endpoint latency side by side.
+
+Usage (after enabling the commented-out `[environment:staging]` template in config.ini):
+    python -m utilities.fanout --envs local,staging -- test_cases -m sanity
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+from utilities.read_config import ReadConfig
+from utilities.result_sink import aggregate_results
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("fanout", "multi-environment fan-out")
+    group.addoption(
+        "--nodeids-from", action="store", default=None, metavar="FILE",
+        help="Run only the node ids listed in FILE (one per line).",
+    )
+    group.addoption(
+        "--nodeids-to", action="store", default=None, metavar="FILE",
+        help="Write the collected node ids to FILE (one per line).",
+    )
+
+
+def pytest_collection_finish(session):
+    path = session.config.getoption("nodeids_to")
+    if path:
+        with open(path, "w") as file:
+            file.write("\n".join(item.nodeid for item in session.items))
+
+
+def pytest_collection_modifyitems(config, items):
+    path = config.getoption("nodeids_from")
+    if not path:
+        return
+    with open(path) as file:
+        wanted = {line.strip() for line in file if line.strip()}
+    selected = [item for item in items if item.nodeid in wanted]
+    deselected = [item for item in items if item.nodeid not in wanted]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+    items[:] = selected
+
+
+def collect_nodeids(pytest_args, environment, nodeids_file):
+    """Collects the test node ids once, using the first environment for module-level setup."""
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", *pytest_args, "--collect-only", "-p", "no:cacheprovider",
+         "-p", "utilities.fanout", "--nodeids-to", nodeids_file],
+        env={**os.environ, "API_ENV": environment},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0 or not os.path.exists(nodeids_file):
+        raise RuntimeError(f"Collection failed for environment '{environment}':\n{result.stdout}\n{result.stderr}")
+    with open(nodeids_file) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def _read_junit(path):
+    outcomes = {}
+    if not os.path.exists(path):
+        return outcomes
+    for case in ElementTree.parse(path).getroot().iter("testcase"):
+        module = case.get("classname", "")
+        outcome = "passed"
+        for child in case:
+            if child.tag in ("failure", "error", "skipped"):
+                outcome = {"failure": "failed", "error": "error", "skipped": "skipped"}[child.tag]
+        outcomes[f"{module}::{case.get('name')}"] = {"outcome": outcome, "time_s": float(case.get("time", 0))}
+    return outcomes
+
+
+_PROFILE_OVERRIDES = ("API_BASE_URL", "API_DB_PATH")
+
+
+def run_fanout(environments, pytest_args=(), output_dir="../logs/fanout"):
+    """
+    :param environments: Environment profile names from config.ini.
+    :param pytest_args: Arguments selecting the tests (paths, -m, -k ...).
+    :param output_dir: Directory for per-environment JUnit XML, result files, logs and the matrix report.
+    :return: Matrix report dict.
+    """
+    known = ReadConfig.get_environment_names()
+    unknown = [name for name in environments if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown environment profile(s): {', '.join(unknown)}; config.ini defines "
+                         f"{', '.join(known) or 'none'} (enable a profile by uncommenting its section)")
+    # These win over the profile, so every environment would silently hit the same backend
+    overrides = [name for name in _PROFILE_OVERRIDES if os.environ.get(name)]
+    if overrides:
+        raise ValueError(f"{' and '.join(overrides)} would override every environment profile; unset before a fan-out")
+
+    output_dir = os.path.join(os.path.abspath(os.curdir), output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    nodeids_file = os.path.join(output_dir, "nodeids.txt")
+    if os.path.exists(nodeids_file):
+        os.remove(nodeids_file)
+    nodeids = collect_nodeids(pytest_args, environments[0], nodeids_file)
+
+    processes = {}
+    started = time.time()
+    for name in environments:
+        log = open(os.path.join(output_dir, f"{name}.log"), "w")
+        results_file = os.path.join(output_dir, f"{name}.results.jsonl")
+        if os.path.exists(results_file):
+            os.remove(results_file)
+        command = [
+            sys.executable, "-m", "pytest", *pytest_args,
+            "-p", "utilities.fanout", "--nodeids-from", nodeids_file,
+            "--junitxml", os.path.join(output_dir, f"{name}.xml"),
+            "--result-sink", results_file,
+            "-p", "no:cacheprovider",
+        ]
+        process = subprocess.Popen(command, env={**os.environ, "API_ENV": name}, stdout=log, stderr=subprocess.STDOUT)
+        processes[name] = (process, log, results_file)
+
+    exit_codes = {}
+    for name, (process, log, _) in processes.items():
+        exit_codes[name] = process.wait()
+        log.close()
+
+    report = {
+        "tests_collected": len(nodeids),
+        "started": started,
+        "finished": time.time(),
+        "environments": environments,
+        "exit_codes": exit_codes,
+        "tests": {},
+        "endpoints": {},
+    }
+    for name, (_, _, results_file) in processes.items():
+        for test, result in _read_junit(os.path.join(output_dir, f"{name}.xml")).items():
+            report["tests"].setdefault(test, {})[name] = result
+        if os.path.exists(results_file):
+            for endpoint, summary in aggregate_results(results_file).items():
+                report["endpoints"].setdefault(endpoint, {})[name] = summary["latency"]
+
+    with open(os.path.join(output_dir, "matrix_report.json"), "w") as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+def print_matrix(report):
+    environments = report["environments"]
+    width = max(12, *(len(name) + 2 for name in environments))
+    print(f"{'test':<70}" + "".join(f"{name:>{width}}" for name in environments))
+    for test, results in sorted(report["tests"].items()):
+        cells = [results.get(name, {}).get("outcome", "-") for name in environments]
+        marker = "" if len(set(cells)) == 1 else "  <- differs"
+        print(f"{test[-70:]:<70}" + "".join(f"{cell:>{width}}" for cell in cells) + marker)
+
+    baseline = environments[0]
+    print()
+    print(f"{'endpoint p95 ms':<40}" + "".join(f"{name:>{width}}" for name in environments) + f"  (vs {baseline})")
+    for endpoint, latencies in sorted(report["endpoints"].items()):
+        p95 = [latencies.get(name, {}).get("p95_ms") for name in environments]
+        cells = "".join(f"{value:>{width}.2f}" if value is not None else f"{'-':>{width}}" for value in p95)
+        deltas = [
+            f"{(value / p95[0] - 1) * 100:+.0f}%" for value in p95[1:] if value is not None and p95[0]
+        ]
+        print(f"{endpoint:<40}{cells}  {' '.join(deltas)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the same tests against several environments concurrently.")
+    parser.add_argument("--envs", default=None, help="Comma-separated profile names (default: all profiles)")
+    parser.add_argument("--output-dir", default="../logs/fanout", help="Where reports are written")
+    argv = list(sys.argv[1:] if argv is None else argv)
+    pytest_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, pytest_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    environments = args.envs.split(",") if args.envs else ReadConfig.get_environment_names()
+    try:
+        report = run_fanout(environments, pytest_args, args.output_dir)
+    except ValueError as error:
+        parser.error(str(error))
+    print_matrix(report)
+    return 0 if all(code == 0 for code in report["exit_codes"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import pytest
 
 from utilities.get_token import get_auth_token
-from utilities.helpers import generate_random_name, generate_random_email, generate_random_password
+from utilities.payload_template import load_template
 from utilities.read_config import ReadConfig
 from utilities.request_handler import send_request
 
@@ -9,23 +9,17 @@ from utilities.request_handler import send_request
 
 @pytest.fixture
 def create_user():
-    name = generate_random_name()
-    email = generate_random_email()
-    password = generate_random_password()
-    payload = {
-        "name": name,
-        "email": email,
-        "password": password
-    }
-    response = send_request("POST", ReadConfig.get_register_user_endpoint(), payload=payload)
+    template = load_template("user_template.json")
+    values = template.resolve()
+    response = send_request("POST", ReadConfig.get_register_user_endpoint(), data=template.render(**values))
     assert response.status_code == 200
     data = response.json()
 
     yield {
         "id": data["id"],
-        "name": name,
-        "email": email,
-        "password": password
+        "name": values["random_name"],
+        "email": values["random_email"],
+        "password": values["random_password"]
     }
 
     # Cleanup (teardown)
@@ -0,0 +1,433 @@
+"""
+Coverage-guided payload fuzzer for the write endpoints.
+
+Mutants of `user_payload.json` and `product_payload.json` (type swaps, boundary numbers, numeric
+strings, Unicode edge cases, oversized strings, missing/unknown fields, deep nesting, non-object
+bodies) are sent concurrently through `send_request_async`. Every response is reduced to a
+*response class*: target, status code and an error signature (the error fields and their messages
+with digits masked, or the key set of a success body plus, for a mutant, the operator and field of
+its latest mutation, or the exception type when no response came back). A mutant that produces a class not seen before joins the corpus with high energy, and the
+operators that found it get picked more often. So the fuzzer concentrates on inputs that reach new
+server behaviour instead of re-sending variations of known rejections.
+
+Findings are deduplicated by response class and written to `[fuzzing] report_path`. 5xx responses
+and dropped connections are crashes. 2xx responses to mutated payloads are accepted inputs that
+deserve a look. Entities created along the way are deleted at the end.
+
+Run it against a local stand-in (`--stub` starts `utilities.stub_server` in-process) or a disposable
+backend, never a shared one:
+
+    python -m utilities.fuzzer --stub --requests 20000 --concurrency 128
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+from requests.exceptions import RequestException
+
+from utilities.get_token import get_auth_token
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request_async
+
+_payloads_dir = os.path.join(os.path.dirname(__file__), "..", "resources", "payloads")
+
+BOUNDARY_NUMBERS = [
+    0, -1, 1, 2 ** 31 - 1, 2 ** 31, -2 ** 31 - 1, 2 ** 53 + 1, 2 ** 63, 2 ** 64, 10 ** 30, -10 ** 30,
+    1e308, -1e308, 5e-324, -0.0, 0.1, 1.005, 99999999999999.99,
+]
+NUMERIC_STRINGS = ["-1", "0", "1e309", "NaN", "Infinity", "0x10", "1,000", " 12 ", "١٢٣", "1" * 400]
+UNICODE_STRINGS = [
+    "", " ", "\u0000", "\ud800", "‮evil", "​", "\U0001F600" * 3, "é" * 8, "﻿", "￿",
+    "Ω≈ç√∫", "ＡＢＣ", "' OR 1=1 --", "<script>alert(1)</script>", "%s%n%x", "../../etc/passwd", "\r\nX-Injected: 1",
+]
+OVERSIZED_LENGTHS = [256, 4096, 65536, 1024 * 1024]
+MAX_NESTING = 256
+UNKNOWN_FIELDS = [("isAdmin", True), ("_id", 1), ("user", 1), ("__proto__", {"isAdmin": True}), ("extra", "x")]
+
+
+def nesting_depth(value):
+    """Deepest list/dict nesting of a JSON value (iterative, so it is safe on deep mutants)."""
+    deepest = 0
+    stack = [(value, 0)]
+    while stack:
+        item, depth = stack.pop()
+        deepest = max(deepest, depth)
+        if isinstance(item, dict):
+            stack.extend((child, depth + 1) for child in item.values())
+        elif isinstance(item, list):
+            stack.extend((child, depth + 1) for child in item)
+    return deepest
+
+
+def _other_type_values(value):
+    candidates = [1, 1.5, "1", True, None, [], {}, [value], {"value": value}]
+    return [candidate for candidate in candidates if type(candidate) is not type(value)]
+
+
+def _pick_field(rng, payload):
+    return rng.choice(list(payload)) if payload else None
+
+
+def mutate_type_swap(rng, payload):
+    field = _pick_field(rng, payload)
+    if field is None:
+        return None
+    payload[field] = rng.choice(_other_type_values(payload[field]))
+    return f"type_swap:{field}"
+
+
+def mutate_boundary_number(rng, payload):
+    field = _pick_field(rng, payload)
+    if field is None:
+        return None
+    payload[field] = rng.choice(BOUNDARY_NUMBERS)
+    return f"boundary_number:{field}"
+
+
+def mutate_numeric_string(rng, payload):
+    field = _pick_field(rng, payload)
+    if field is None:
+        return None
+    payload[field] = rng.choice(NUMERIC_STRINGS)
+    return f"numeric_string:{field}"
+
+
+def mutate_unicode(rng, payload):
+    field = _pick_field(rng, payload)
+    if field is None:
+        return None
+    special = rng.choice(UNICODE_STRINGS)
+    value = payload[field]
+    payload[field] = f"{value}{special}" if isinstance(value, str) and rng.random() < 0.5 else special
+    return f"unicode:{field}"
+
+
+def mutate_oversized(rng, payload):
+    field = _pick_field(rng, payload)
+    if field is None:
+        return None
+    length = rng.choice(OVERSIZED_LENGTHS)
+    payload[field] = (rng.choice(["A", "é", "\U0001F600"]) * length)[:length]
+    return f"oversized:{field}:{length}"
+
+
+def mutate_drop_field(rng, payload):
+    field = _pick_field(rng, payload)
+    if field is None:
+        return None
+    del payload[field]
+    return f"drop_field:{field}"
+
+
+def mutate_unknown_field(rng, payload):
+    field, value = rng.choice(UNKNOWN_FIELDS)
+    payload[field] = value
+    return f"unknown_field:{field}"
+
+
+def mutate_nesting(rng, payload):
+    field = _pick_field(rng, payload)
+    if field is None:
+        return None
+    value = payload[field]
+    # Mutants are mutated again, so keep the total depth bounded (deepcopy and json recurse)
+    depth = min(rng.choice([8, 64, MAX_NESTING]), MAX_NESTING - nesting_depth(value))
+    if depth <= 0:
+        return None
+    for _ in range(depth):
+        value = [value]
+    payload[field] = value
+    return f"nesting:{field}:{depth}"
+
+
+MUTATORS = {
+    "type_swap": mutate_type_swap,
+    "boundary_number": mutate_boundary_number,
+    "numeric_string": mutate_numeric_string,
+    "unicode": mutate_unicode,
+    "oversized": mutate_oversized,
+    "drop_field": mutate_drop_field,
+    "unknown_field": mutate_unknown_field,
+    "nesting": mutate_nesting,
+}
+# Whole-body replacements; they end a mutation chain because later operators need an object
+BODY_REPLACEMENTS = [None, [], "payload", 0, [{}]]
+
+
+def _mask(text):
+    return re.sub(r"\d+", "#", str(text))[:120]
+
+
+def response_class(target, result, mutations=()):
+    """
+    :param result: Response, or the `RequestException` raised instead of one.
+    :param mutations: Labels of the mutations that produced the payload, oldest first; empty for a seed.
+    :return: Hashable (target, status, signature) key that findings are deduplicated on.
+    """
+    if isinstance(result, Exception):
+        return target, None, type(result).__name__
+    try:
+        body = result.json()
+    except ValueError:
+        return target, result.status_code, "non-json body"
+    if isinstance(body, dict):
+        if result.status_code < 400:
+            signature = "keys:" + ",".join(sorted(body))
+            if mutations and result.status_code < 300:
+                # A success body looks the same for seed and mutant; the latest mutation tells them apart.
+                # Only one label, so that chains of mutations do not turn every accepted mutant into a new class
+                signature += "; accepted:" + _operator_and_field(mutations[-1])
+        else:
+            signature = "; ".join(f"{key}: {_mask(value)}" for key, value in sorted(body.items()))
+    else:
+        signature = f"{type(body).__name__}: {_mask(body)}" if result.status_code >= 400 else type(body).__name__
+    return target, result.status_code, signature
+
+
+def _operator_and_field(label):
+    # "oversized:name:4096" -> "oversized:name": sizes and depths would split one finding into many
+    return ":".join(label.split(":")[:2])
+
+
+class _CorpusEntry:
+    __slots__ = ("target", "payload", "mutations", "energy")
+
+    def __init__(self, target, payload, mutations, energy):
+        self.target = target
+        self.payload = payload
+        self.mutations = mutations
+        self.energy = energy
+
+
+class Fuzzer:
+    """
+    :param targets: Dict of name -> dict with `method`, `endpoint`, `payload` (seed dict) and `headers`.
+    :param concurrency: Requests in flight.
+    :param seed: Random seed; the same seed and server replay the same mutants.
+    :param timeout: Per-request timeout in seconds.
+    """
+
+    def __init__(self, targets, concurrency=64, seed=0, timeout=5):
+        self.targets = targets
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.corpus = [_CorpusEntry(name, target["payload"], [], 10.0) for name, target in targets.items()]
+        self.operator_weights = {name: 1.0 for name in MUTATORS}
+        self.findings = {}
+        self._unsent_seeds = list(self.corpus)
+        self.created = []
+        self.sent = 0
+        self.elapsed_s = 0.0
+
+    def _next_mutant(self):
+        if self._unsent_seeds:
+            seed = self._unsent_seeds.pop(0)
+            return seed, copy.deepcopy(seed.payload), [], []
+        parent = self.rng.choices(self.corpus, weights=[entry.energy for entry in self.corpus])[0]
+        if self.rng.random() < 0.03:
+            return parent, copy.deepcopy(self.rng.choice(BODY_REPLACEMENTS)), ["body:replace"], []
+        payload = copy.deepcopy(parent.payload) if isinstance(parent.payload, dict) else {}
+        names = list(self.operator_weights)
+        operators = self.rng.choices(names, weights=[self.operator_weights[name] for name in names],
+                                     k=self.rng.choice([1, 1, 2, 3]))
+        mutations = [MUTATORS[name](self.rng, payload) for name in operators]
+        if nesting_depth(payload) > MAX_NESTING:
+            # Wrapping mutations (type swaps into [value] or {"value": value}) add up over generations
+            payload, mutations = copy.deepcopy(self.targets[parent.target]["payload"]), []
+            mutations.append(MUTATORS["type_swap"](self.rng, payload))
+        return parent, payload, [mutation for mutation in mutations if mutation], operators
+
+    async def _execute(self, parent, payload, mutations, operators):
+        target = self.targets[parent.target]
+        try:
+            result = await send_request_async(
+                target["method"], target["endpoint"], headers=target["headers"], payload=payload, timeout=self.timeout
+            )
+        except RequestException as error:
+            result = error
+        return parent, payload, mutations, operators, result
+
+    def _learn(self, parent, payload, mutations, operators, result):
+        lineage = parent.mutations + mutations
+        key = response_class(parent.target, result, lineage)
+        if not isinstance(result, Exception) and result.status_code < 300:
+            self._remember_created(parent.target, result)
+        finding = self.findings.get(key)
+        if finding:
+            finding["count"] += 1
+            parent.energy = max(0.1, parent.energy * 0.98)
+            return
+        target, status, signature = key
+        self.findings[key] = {
+            "target": target, "status": status, "signature": signature, "count": 1, "first_request": self.sent,
+            "severity": _severity(status, lineage), "mutations": lineage,
+            "example": json.dumps(payload, ensure_ascii=True)[:500],
+        }
+        parent.energy += 2.0
+        self.corpus.append(_CorpusEntry(parent.target, payload, lineage, 10.0))
+        for name in operators:
+            self.operator_weights[name] += 5.0
+
+    def _remember_created(self, target, response):
+        try:
+            body = response.json()
+        except ValueError:
+            return
+        if isinstance(body, dict) and target in ("register", "create_product"):
+            entity_id = body.get("_id", body.get("id"))
+            if entity_id is not None:
+                self.created.append((target, entity_id))
+
+    async def run_async(self, requests_total, duration_s=None):
+        started = time.perf_counter()
+        deadline = started + duration_s if duration_s else None
+        in_flight = set()
+        while in_flight or self.sent < requests_total:
+            while (self.sent < requests_total and len(in_flight) < self.concurrency
+                   and (deadline is None or time.perf_counter() < deadline)):
+                in_flight.add(asyncio.ensure_future(self._execute(*self._next_mutant())))
+                self.sent += 1
+            if not in_flight:
+                break
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                self._learn(*task.result())
+        self.elapsed_s = time.perf_counter() - started
+        return self.report()
+
+    def run(self, requests_total, duration_s=None):
+        return asyncio.run(self.run_async(requests_total, duration_s))
+
+    def report(self):
+        findings = sorted(self.findings.values(), key=lambda item: (_SEVERITY_ORDER[item["severity"]], item["target"]))
+        return {
+            "requests": self.sent,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "requests_per_second": round(self.sent / self.elapsed_s, 1) if self.elapsed_s else None,
+            "corpus_size": len(self.corpus),
+            "operator_weights": self.operator_weights,
+            "findings": findings,
+        }
+
+
+_SEVERITY_ORDER = {"crash": 0, "accepted": 1, "rejected": 2, "baseline": 3}
+
+
+def _severity(status, mutations):
+    if status is None or status >= 500:
+        return "crash"
+    if not mutations:
+        return "baseline"
+    return "accepted" if status < 300 else "rejected"
+
+
+def _load_payload(name):
+    with open(os.path.join(_payloads_dir, name)) as file:
+        return json.load(file)
+
+
+def default_targets():
+    """Register, profile update (as a throwaway user) and product creation (as admin)."""
+    json_headers = {"Content-Type": "application/json"}
+    admin_headers = {**json_headers, "Authorization": f"Bearer {get_auth_token()}"}
+    user_payload = _load_payload("user_payload.json")
+    targets = {
+        "register": {"method": "POST", "endpoint": ReadConfig.get_register_user_endpoint(),
+                     "payload": user_payload, "headers": json_headers},
+        "create_product": {"method": "POST", "endpoint": f"{ReadConfig.get_products_endpoint()}/create/",
+                           "payload": _load_payload("product_payload.json"), "headers": admin_headers},
+    }
+    fuzz_user = {**user_payload, "email": f"fuzz-{uuid.uuid4().hex[:12]}@example.com"}
+    response = asyncio.run(send_request_async("POST", ReadConfig.get_register_user_endpoint(), payload=fuzz_user))
+    if response is not None and response.status_code == 200:
+        body = response.json()
+        targets["update_profile"] = {
+            "method": "PUT", "endpoint": ReadConfig.get_edit_user_endpoint(), "payload": user_payload,
+            "headers": {**json_headers, "Authorization": f"Bearer {body['token']}"},
+        }
+        targets["update_profile"]["owner_id"] = body.get("_id", body.get("id"))
+    return targets
+
+
+async def cleanup(created, concurrency=32):
+    """Deletes the users and products a fuzzing run created."""
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {get_auth_token()}"}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def delete(target, entity_id):
+        if target in ("register", "update_profile"):
+            endpoint = f"{ReadConfig.get_delete_user_endpoint()}{entity_id}/"
+        else:
+            endpoint = f"{ReadConfig.get_products_endpoint()}/delete/{entity_id}/"
+        async with semaphore:
+            try:
+                await send_request_async("DELETE", endpoint, headers=headers)
+            except RequestException:
+                pass
+
+    await asyncio.gather(*(delete(target, entity_id) for target, entity_id in created))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Coverage-guided fuzzing of request payloads.")
+    parser.add_argument("--requests", type=int, default=None, help="Mutants to send (default: [fuzzing] requests)")
+    parser.add_argument("--duration", type=float, default=None, help="Stop generating after this many seconds")
+    parser.add_argument("--concurrency", type=int, default=None, help="Requests in flight")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    parser.add_argument("--targets", default=None, help="Comma-separated subset of register,update_profile,create_product")
+    parser.add_argument("--stub", action="store_true", help="Fuzz an in-process stub server instead of base_url")
+    parser.add_argument("--keep-data", action="store_true", help="Do not delete created users and products")
+    args = parser.parse_args(argv)
+
+    stub = None
+    if args.stub:
+        from utilities.stub_server import start_stub_server
+        stub = start_stub_server(
+            admin_username=ReadConfig.get_admin_username(), admin_password=ReadConfig.get_admin_password()
+        )
+        os.environ["API_BASE_URL"] = stub.base_url
+
+    targets = default_targets()
+    if args.targets:
+        targets = {name: target for name, target in targets.items() if name in args.targets.split(",")}
+    fuzzer = Fuzzer(
+        targets,
+        concurrency=args.concurrency or ReadConfig.get_fuzzing_concurrency(),
+        seed=ReadConfig.get_fuzzing_seed() if args.seed is None else args.seed,
+        timeout=ReadConfig.get_fuzzing_timeout_seconds(),
+    )
+    report = fuzzer.run(args.requests or ReadConfig.get_fuzzing_requests(), args.duration)
+    created = list(fuzzer.created)
+    owner_id = targets.get("update_profile", {}).get("owner_id")
+    if owner_id is not None:
+        created.append(("update_profile", owner_id))
+    if not args.keep_data:
+        asyncio.run(cleanup(created))
+    if stub:
+        stub.stop()
+
+    report_path = ReadConfig.get_fuzzing_report_path()
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"{report['requests']} requests in {report['elapsed_s']}s ({report['requests_per_second']}/s), "
+          f"{len(report['findings'])} response classes, corpus {report['corpus_size']}")
+    for finding in report["findings"]:
+        status = finding["status"] if finding["status"] is not None else "---"
+        print(f"  [{finding['severity']:<8}] {finding['target']:<15}{status:>4}  x{finding['count']:<6} "
+              f"{finding['signature'][:80]}")
+    print(f"Report written to {report_path}")
+    return 1 if any(finding["severity"] == "crash" for finding in report["findings"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,39 @@
+import threading
+import time
 from venv import logger
 from utilities.read_config import ReadConfig
 from utilities.request_handler import send_request
 
+# (base_url, username) -> (token, expires_at); one login per environment and account
+_token_cache = {}
+_token_cache_lock = threading.Lock()
+
 
 def get_auth_token():
+    cache_key = (ReadConfig.get_base_url(), ReadConfig.get_admin_username())
+    with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
     login_payload = {
         "username": ReadConfig.get_admin_username(),
         "password": ReadConfig.get_admin_password()
     }
     response = send_request(
         method="POST",
-        endpoint="users/login/",
+        endpoint=ReadConfig.get_login_endpoint(),
         headers={"Content-Type": "application/json"},
         payload=login_payload,
         logger=logger
     )
     token = response.json().get("token")
+    if token:
+        with _token_cache_lock:
+            _token_cache[cache_key] = (token, time.monotonic() + ReadConfig.get_token_cache_seconds())
     return token
+
+
+def clear_token_cache():
+    with _token_cache_lock:
+        _token_cache.clear()
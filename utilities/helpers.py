@@ -3,6 +3,8 @@ import string
 import requests
 from requests import RequestException
 
+from utilities.read_config import ReadConfig
+
 
 def generate_random_name():
     def random_string(length):
@@ -38,7 +40,7 @@ def get_user_token(username=None, password=None):
     if not username or not password:
         raise ValueError("Username and password must be provided.")
 
-    url = "http://127.0.0.1:8000/api/users/login/"
+    url = f"{ReadConfig.get_base_url()}{ReadConfig.get_login_endpoint()}"
     credentials = {
         "username": username,
         "password": password
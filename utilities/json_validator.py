@@ -1,7 +1,16 @@
+import functools
+
 import requests
 import pytest
 from jsonschema import validate, ValidationError
 
+from utilities.compression import format_size, get_payload_budgets, response_sizes
+from utilities.metrics import normalize_endpoint, request_metrics
+from utilities.read_config import ReadConfig
+from utilities.result_record import ResultRecord, response_endpoint
+from utilities.slo import get_slo_engine
+from utilities.stream_validator import StreamValidationError, UnsupportedSchemaError, streaming_validator
+
 # class ResponseValidator:
 
 #     @staticmethod
@@ -66,24 +75,91 @@ from jsonschema import validate, ValidationError
 #             assert False
 
 
+def _reports_outcome(check):
+    """Publishes the pass/fail outcome of a validation method to `request_metrics`."""
+    @functools.wraps(check)
+    def wrapper(self, *args, **kwargs):
+        try:
+            result = check(self, *args, **kwargs)
+        except AssertionError:
+            request_metrics.record_validation(response_endpoint(self.response), check.__name__, False)
+            raise
+        request_metrics.record_validation(response_endpoint(self.response), check.__name__, True)
+        return result
+    return wrapper
+
+
 class ResponseValidator:
     def __init__(self, response, logger=None):
         self.response = response
-        self.data = response.json()
+        self._data = None
         self.logger = logger
 
+    @property
+    def data(self):
+        """The parsed body, parsed on first use; schema-only checks of large bodies never need it."""
+        if self._data is None and self.response is not None:
+            self._data = self.response.json()
+        return self._data
+
+    def release(self, header_names=None, body_bytes=None):
+        """
+        Drops the response and the parsed data once all checks have run, keeping only a compact record.
+
+        :return: `ResultRecord` of the response (see `ResultRecord.from_response` for the parameters).
+        """
+        record = ResultRecord.from_response(self.response, header_names, body_bytes)
+        self.response = None
+        self._data = None
+        return record
+
+    @_reports_outcome
     def validate_response_headers(self, expected_content_type="application/json"):
         actual_content_type = self.response.headers.get("Content-Type")
         assert actual_content_type and expected_content_type in actual_content_type, (
             f"Expected Content-Type: {expected_content_type}, but got: {actual_content_type}"
         )
 
+    @_reports_outcome
     def validate_response_time(self, max_response_time_ms=200):
+        """
+        With an SLO configured for the endpoint (`[slo_endpoints]`), fails only when the run so far violates
+        it with statistical significance; otherwise checks this single response against `max_response_time_ms`.
+        """
+        slo_engine = get_slo_engine()
+        endpoint_key = normalize_endpoint(response_endpoint(self.response))
+        if slo_engine and slo_engine.budget_for(endpoint_key):
+            violated, message = slo_engine.check(endpoint_key)
+            assert not violated, message
+            return
         response_time_ms = self.response.elapsed.total_seconds() * 1000
         assert response_time_ms <= max_response_time_ms, (
             f"Expected <= {max_response_time_ms} ms, but got {response_time_ms:.2f} ms."
         )
 
+    @_reports_outcome
+    def validate_payload_size(self, max_body_bytes=None, max_wire_bytes=None):
+        """
+        Checks the body size, decoded and as received, against the endpoint's `[payload_budgets]` entry,
+        or against the given limits for endpoints without one.
+        """
+        prefix, budget = get_payload_budgets().budget_for(normalize_endpoint(response_endpoint(self.response)))
+        if budget is None:
+            budget = {"body_bytes": max_body_bytes, "wire_bytes": max_wire_bytes}
+        wire_bytes, body_bytes = response_sizes(self.response)
+        source = f"budget '{prefix}'" if prefix else "limit"
+        if budget["body_bytes"] is not None:
+            assert body_bytes <= budget["body_bytes"], (
+                f"Body of {format_size(body_bytes)} exceeds the {source} of {format_size(budget['body_bytes'])}."
+            )
+        if budget["wire_bytes"] is not None and wire_bytes is not None:
+            assert wire_bytes <= budget["wire_bytes"], (
+                f"{format_size(wire_bytes)} on the wire "
+                f"({self.response.headers.get('Content-Encoding') or 'uncompressed'}) exceeds the {source} "
+                f"of {format_size(budget['wire_bytes'])}."
+            )
+
+    @_reports_outcome
     def validate_data_type(self, field_validations):
         for field, field_type in field_validations.items():
             assert field in self.data, f"Missing field: {field}"
@@ -91,15 +167,45 @@ class ResponseValidator:
                 f"Expected '{field}' to be type {field_type.__name__}, got {type(self.data[field]).__name__}"
             )
 
+    @_reports_outcome
     def validate_field_value(self, field_validations):
         for field, expected_value in field_validations.items():
             assert self.data[field] == expected_value, (
                 f"Expected '{field}' = {expected_value}, got {self.data[field]}"
             )
 
+    @_reports_outcome
     def validate_json_schema(self, schema):
+        """
+        Bodies of `[validation] streaming_min_bytes` or more that nothing has parsed yet are checked in one
+        pass over the raw bytes (see `utilities/stream_validator.py`) when the schema allows it.
+        """
+        if self._data is None and len(self.response.content) >= ReadConfig.get_streaming_validation_min_bytes():
+            try:
+                validator = streaming_validator(schema)
+            except UnsupportedSchemaError:
+                validator = None
+            if validator is not None:
+                try:
+                    validator.validate(memoryview(self.response.content))
+                except StreamValidationError as e:
+                    raise AssertionError(f"JSON Schema validation error: {e}")
+                return
         try:
             validate(instance=self.data, schema=schema)
         except ValidationError as e:
             raise AssertionError(f"JSON Schema validation error: {e.message}")
 
+    @_reports_outcome
+    def validate_json_schema_streaming(self, schema, fields=()):
+        """
+        Validates the raw body against `schema` without building the object tree.
+
+        :param fields: Dotted paths to extract on the way, e.g. `page` or `products.*._id`.
+        :return: Dict of field -> value for the fields present in the body.
+        """
+        try:
+            return streaming_validator(schema).validate(memoryview(self.response.content), fields)
+        except StreamValidationError as e:
+            raise AssertionError(f"JSON Schema validation error: {e}")
+
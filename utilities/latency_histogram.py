@@ -0,0 +1,110 @@
+import math
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of latencies with bounded memory and mergeable state.
+
+    Values are stored in microseconds. Below `2 ** sub_bucket_bits` every value has its own bucket;
+    above that, each power of two is split into `2 ** (sub_bucket_bits - 1)` buckets, so the relative
+    error of any reported percentile is below `2 ** -(sub_bucket_bits - 1)` (under 1.6% by default).
+    Memory depends on the value range, never on the number of samples.
+
+    :param sub_bucket_bits: Precision; 7 gives at most a few thousand buckets for 1 us .. 1 h.
+    """
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}
+        self.total = 0
+        self.sum_us = 0
+        self.min_us = None
+        self.max_us = None
+
+    def _index(self, value_us):
+        exponent = max(0, value_us.bit_length() - self.sub_bucket_bits)
+        return (exponent << self.sub_bucket_bits) + (value_us >> exponent)
+
+    def _bucket_value(self, index):
+        exponent = index >> self.sub_bucket_bits
+        mantissa = index & ((1 << self.sub_bucket_bits) - 1)
+        if exponent == 0:
+            return mantissa
+        # Middle of the bucket keeps the error symmetric
+        return (mantissa << exponent) + (1 << (exponent - 1))
+
+    def record(self, latency_ms, count=1):
+        value_us = max(0, int(round(latency_ms * 1000)))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.sum_us += value_us * count
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = value_us if self.max_us is None else max(self.max_us, value_us)
+
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different precision.")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        if other.total:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+            self.max_us = other.max_us if self.max_us is None else max(self.max_us, other.max_us)
+        return self
+
+    def percentile(self, percent):
+        """
+        :param percent: Percentile between 0 and 100.
+        :return: Latency in milliseconds, or None when the histogram is empty.
+        """
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(percent / 100 * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                value_us = min(max(self._bucket_value(index), self.min_us), self.max_us)
+                return value_us / 1000
+        return self.max_us / 1000
+
+    def count_above(self, latency_ms):
+        """Number of recorded values in buckets above `latency_ms` (bucket resolution)."""
+        threshold = self._index(max(0, int(round(latency_ms * 1000))))
+        return sum(count for index, count in self.counts.items() if index > threshold)
+
+    def mean(self):
+        return self.sum_us / self.total / 1000 if self.total else None
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "min_ms": self.min_us / 1000 if self.total else None,
+            "mean_ms": self.mean(),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_us / 1000 if self.total else None,
+        }
+
+    def to_dict(self):
+        return {
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "total": self.total,
+            "sum_us": self.sum_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["sub_bucket_bits"])
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.total = data["total"]
+        histogram.sum_us = data["sum_us"]
+        histogram.min_us = data["min_us"]
+        histogram.max_us = data["max_us"]
+        return histogram
@@ -15,15 +15,24 @@ def setup_logger(name="test_logger", log_file_path="../logs/test_framework.log",
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    file_handler = logging.FileHandler(log_file)
-    console_handler = logging.StreamHandler()
-
     formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+
+    # Calling setup_logger again (every test module does, and soak runs repeat it) must not stack handlers
+    has_file_handler = any(
+        isinstance(handler, logging.FileHandler) and handler.baseFilename == os.path.abspath(log_file)
+        for handler in logger.handlers
+    )
+    has_console_handler = any(type(handler) is logging.StreamHandler for handler in logger.handlers)
+
+    if not has_file_handler:
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    if not has_console_handler:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        logger.addHandler(console_handler)
 
     return logger
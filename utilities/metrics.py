@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import namedtuple
+
+RequestSample = namedtuple(
+    "RequestSample",
+    ["method", "endpoint", "status", "latency_ms", "timestamp", "queue_ms", "wire_bytes", "body_bytes", "timed_out"],
+    defaults=(0.0, None, None, False),
+)
+
+ValidationSample = namedtuple("ValidationSample", ["endpoint", "check", "passed", "timestamp"])
+
+
+def normalize_endpoint(endpoint):
+    """
+    Collapse numeric path segments so that `products/1` and `products/2` are reported as one endpoint.
+
+    :param endpoint: Endpoint path relative to the base URL, optionally with a query string.
+    :return: Endpoint key such as `products/{id}` or `users/delete/{id}/`.
+    """
+    path = endpoint.split("?", 1)[0].lstrip("/")
+    return "/".join("{id}" if segment.isdigit() else segment for segment in path.split("/"))
+
+
+class RequestMetrics:
+    """
+    Fan-out point for per-request measurements taken in `send_request` and for `ResponseValidator` outcomes.
+
+    Listeners are plain callables receiving a `RequestSample` (or a `ValidationSample` for validation
+    listeners). They run on the calling thread, so they should do as little work as possible.
+    """
+
+    def __init__(self):
+        self._listeners = ()
+        self._validation_listeners = ()
+        self._start_listeners = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners = self._listeners + (listener,)
+        return listener
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners = tuple(item for item in self._listeners if item is not listener)
+
+    def subscribe_validation(self, listener):
+        with self._lock:
+            if listener not in self._validation_listeners:
+                self._validation_listeners = self._validation_listeners + (listener,)
+        return listener
+
+    def unsubscribe_validation(self, listener):
+        with self._lock:
+            self._validation_listeners = tuple(item for item in self._validation_listeners if item is not listener)
+
+    def subscribe_start(self, listener):
+        with self._lock:
+            if listener not in self._start_listeners:
+                self._start_listeners = self._start_listeners + (listener,)
+        return listener
+
+    def unsubscribe_start(self, listener):
+        with self._lock:
+            self._start_listeners = tuple(item for item in self._start_listeners if item is not listener)
+
+    def record_start(self, method, endpoint):
+        """Called when a request goes out on the network; start listeners receive `(method, endpoint)`."""
+        for listener in self._start_listeners:
+            listener(method, endpoint)
+
+    def record(self, method, endpoint, status, latency_ms, queue_ms=0.0, wire_bytes=None, body_bytes=None,
+               timed_out=False):
+        """
+        :param latency_ms: Time spent on the network call itself.
+        :param queue_ms: Time spent waiting for the client-side rate limiter before the call.
+        :param wire_bytes: Response body size as received (compressed), when the transport knows it.
+        :param body_bytes: Response body size after decoding.
+        :param timed_out: The call gave up waiting for the response (read timeout); `status` is None then.
+        """
+        listeners = self._listeners
+        if not listeners:
+            return
+        sample = RequestSample(
+            method.upper(), normalize_endpoint(endpoint), status, latency_ms, time.time(), queue_ms,
+            wire_bytes, body_bytes, timed_out,
+        )
+        for listener in listeners:
+            listener(sample)
+
+    def record_validation(self, endpoint, check, passed):
+        """
+        :param endpoint: Endpoint path of the validated response.
+        :param check: Name of the validation, e.g. `validate_json_schema`.
+        :param passed: Whether the check passed.
+        """
+        listeners = self._validation_listeners
+        if not listeners:
+            return
+        sample = ValidationSample(normalize_endpoint(endpoint), check, passed, time.time())
+        for listener in listeners:
+            listener(sample)
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,214 @@
+"""
+Payload templates, compiled once and rendered straight to JSON bytes.
+
+A template is a JSON document, normally a file under `resources/payloads/`, whose strings may hold
+`{{placeholders}}`:
+
+- a string that is only a placeholder, `"{{count_in_stock}}"`, is replaced by the value itself,
+  of any JSON type;
+- placeholders inside a longer string, `"Product {{sequence}}"`, are interpolated as text.
+
+Compiling serializes every constant part of the document once. Rendering then joins those
+pre-encoded fragments with the encoded placeholder values, so a constant body is never re-encoded.
+Values captured earlier, such as an ID taken from a response, are fixed with `bind`, which folds
+them into the constant fragments. Any other placeholder takes `render`'s keyword argument of the
+same name, or else a value from its generator: `GENERATORS` (random name, email, password, `uuid`
+and `sequence`) plus any passed to the template, called once per render.
+
+Send the bytes with `send_request(..., data=template.render())`.
+"""
+import itertools
+import json
+import os
+import re
+import threading
+import uuid
+from json.encoder import encode_basestring_ascii
+
+from utilities.helpers import generate_random_email, generate_random_name, generate_random_password
+
+_resources_dir = os.path.join(os.path.dirname(__file__), "..", "resources")
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+_VALUE, _TEXT = "value", "text"
+# Compact separators: what `requests` would send, minus the spaces
+_dumps = json.JSONEncoder(separators=(",", ":"), allow_nan=False).encode
+
+GENERATORS = {
+    "random_name": generate_random_name,
+    "random_email": generate_random_email,
+    "random_password": generate_random_password,
+    "uuid": lambda: uuid.uuid4().hex,
+    "sequence": itertools.count(1).__next__,
+}
+
+
+def _encode_value(value):
+    if isinstance(value, str):
+        return encode_basestring_ascii(value).encode("ascii")
+    if value is None:
+        return b"null"
+    if value is True or value is False:
+        return b"true" if value else b"false"
+    if type(value) is int:
+        return str(value).encode("ascii")
+    return _dumps(value).encode("ascii")
+
+
+def _encode_text(value):
+    # The inside of a JSON string, without the quotes
+    return encode_basestring_ascii(str(value))[1:-1].encode("ascii")
+
+
+def _compile(document, parts):
+    """Appends the document's encoded fragments (bytes) and placeholders ((kind, name)) to `parts`."""
+    if isinstance(document, dict):
+        parts.append(b"{")
+        for index, (key, value) in enumerate(document.items()):
+            parts.append((b"," if index else b"") + _encode_value(str(key)) + b":")
+            _compile(value, parts)
+        parts.append(b"}")
+    elif isinstance(document, list):
+        parts.append(b"[")
+        for index, value in enumerate(document):
+            if index:
+                parts.append(b",")
+            _compile(value, parts)
+        parts.append(b"]")
+    elif isinstance(document, str) and "{{" in document:
+        whole = _PLACEHOLDER.fullmatch(document)
+        if whole:
+            parts.append((_VALUE, whole.group(1)))
+            return
+        parts.append(b'"')
+        position = 0
+        for match in _PLACEHOLDER.finditer(document):
+            parts.append(_encode_text(document[position:match.start()]))
+            parts.append((_TEXT, match.group(1)))
+            position = match.end()
+        parts.append(_encode_text(document[position:]) + b'"')
+    else:
+        parts.append(_encode_value(document))
+
+
+def _merge(parts):
+    """:return: (fragments, slots): `len(fragments) == len(slots) + 1`, constants merged around each slot."""
+    fragments, slots, pending = [], [], []
+    for part in parts:
+        if isinstance(part, bytes):
+            pending.append(part)
+        else:
+            fragments.append(b"".join(pending))
+            slots.append(part)
+            pending = []
+    fragments.append(b"".join(pending))
+    return fragments, slots
+
+
+class PayloadTemplate:
+    """
+    :param document: JSON-compatible document with `{{placeholders}}` in its strings.
+    :param generators: Extra name -> callable generators; they win over `GENERATORS`.
+    """
+
+    def __init__(self, document, generators=None, _parts=None):
+        self.document = document
+        self.generators = {**GENERATORS, **(generators or {})}
+        if _parts is None:
+            _parts = []
+            _compile(document, _parts)
+        self._parts = _parts
+        fragments, self._slots = _merge(_parts)
+        self.placeholders = tuple(dict.fromkeys(name for _, name in self._slots))
+        # Render fills the odd positions of a copy of this frame; the even ones are the constant fragments
+        self._frame = [None] * (2 * len(fragments) - 1)
+        self._frame[::2] = fragments
+        self._constant = fragments[0] if not self._slots else None
+
+    def bind(self, **values):
+        """:return: New template with these placeholders fixed, their values encoded once into the constants."""
+        unknown = set(values) - set(self.placeholders)
+        if unknown:
+            raise ValueError(f"Template has no placeholder {', '.join(sorted(unknown))}.")
+        parts = []
+        for part in self._parts:
+            if isinstance(part, tuple) and part[1] in values:
+                kind, name = part
+                part = _encode_value(values[name]) if kind == _VALUE else _encode_text(values[name])
+            parts.append(part)
+        return PayloadTemplate(self.document, self.generators, parts)
+
+    def resolve(self, **values):
+        """:return: Dict with a value for every placeholder: the given one, else a freshly generated one."""
+        resolved = {}
+        for name in self.placeholders:
+            if name in values:
+                resolved[name] = values[name]
+            elif name in self.generators:
+                resolved[name] = self.generators[name]()
+            else:
+                raise ValueError(f"Placeholder '{name}' has no value; pass it to render() or bind().")
+        return resolved
+
+    def render(self, **values):
+        """:return: The JSON body as bytes; placeholders missing from `values` are generated."""
+        if self._constant is not None:
+            return self._constant
+        chunks = self._frame[:]
+        generated = {}
+        for index, (kind, name) in enumerate(self._slots):
+            if name in values:
+                value = values[name]
+            elif name in generated:
+                value = generated[name]  # the same placeholder twice gets the same generated value
+            else:
+                generator = self.generators.get(name)
+                if generator is None:
+                    raise ValueError(f"Placeholder '{name}' has no value; pass it to render() or bind().")
+                value = generated[name] = generator()
+            chunks[2 * index + 1] = _encode_value(value) if kind == _VALUE else _encode_text(value)
+        return b"".join(chunks)
+
+    def render_json(self, **values):
+        """:return: The rendered document as Python objects, for assertions against a response."""
+        return json.loads(self.render(**values))
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def load_template(template):
+    """
+    Compiles a template file once per process.
+
+    :param template: Path, or file name under `resources/payloads/`.
+    """
+    compiled = _templates.get(template)
+    if compiled is None:
+        path = template if os.path.exists(template) else os.path.join(_resources_dir, "payloads", template)
+        with open(path) as file:
+            compiled = PayloadTemplate(json.load(file))
+        with _templates_lock:
+            compiled = _templates.setdefault(template, compiled)
+    return compiled
+
+
+def compile_request_specs(specs):
+    """
+    Prepares scenario request specs for a load loop: each `payload` is compiled once into a `template`
+    (placeholders allowed, e.g. `"{{random_email}}"` for a unique sign-up per request) and the JSON
+    Content-Type is set up front. Send with `data=spec["template"].render()`.
+
+    :param specs: Request specs of a scenario (`method`, `endpoint`, optional `payload` and `headers`).
+    :return: New spec dicts; specs without a payload get `template` None.
+    """
+    compiled = []
+    for spec in specs:
+        spec = dict(spec)
+        payload = spec.pop("payload", None)
+        spec["template"] = None if payload is None else PayloadTemplate(payload)
+        if payload is not None and not any(name.lower() == "content-type" for name in spec.get("headers") or {}):
+            spec["headers"] = {"Content-Type": "application/json", **(spec.get("headers") or {})}
+        compiled.append(spec)
+    return compiled
@@ -0,0 +1,216 @@
+"""
+Opt-in per-test profiling: `pytest --profile-api`.
+
+A background thread samples the running test's stack every `[profiling] sample_interval_ms` (a
+statistical profiler, so the overhead stays low and does not depend on how many calls are made).
+Every sample is attributed to a framework layer - transport, decode, validation, logging, fixtures,
+framework, test - by the innermost frame that belongs to a known layer; anything sampled during
+setup or teardown counts as fixtures.
+
+The framework's worker threads are sampled too - `send_requests_concurrently`'s pool, asyncio's
+`run_in_executor` threads and other thread pools - whenever they are running framework or library
+code; idle pool threads are skipped. Their samples are marked with the pool name in the collapsed
+stacks and add to the layer totals, so with concurrency the totals are thread time and can exceed
+the test's wall time.
+
+For each test a collapsed-stack file (`<test>.folded`, the input format of flamegraph.pl and
+speedscope) is written to `[profiling] output_dir`, together with `all.folded` for the whole run.
+The terminal summary ranks layers and the hottest framework functions across the run.
+"""
+import os
+import re
+import sys
+import threading
+from collections import Counter
+
+import pytest
+
+from utilities.read_config import ReadConfig
+
+_LAYERS = [
+    ("validation", re.compile(r"[\\/](jsonschema|referencing)[\\/]|utilities[\\/](json_validator|stream_validator)\.py")),
+    ("decode", re.compile(r"[\\/]json[\\/]|[\\/](simplejson|charset_normalizer|chardet)[\\/]")),
+    ("logging", re.compile(r"[\\/]logging[\\/]")),
+    ("transport", re.compile(
+        r"[\\/](requests|urllib3|httpx|httpcore|h2|hpack|anyio)[\\/]|[\\/]http[\\/]client\.py|"
+        r"[\\/](socket|ssl|selectors)\.py|utilities[\\/](transport|request_handler|rate_limiter)\.py"
+    )),
+    ("framework", re.compile(r"[\\/]utilities[\\/]")),
+    ("test", re.compile(r"[\\/]test_cases[\\/]|[\\/]conftest\.py")),
+]
+# Pools that run requests on behalf of the test: send_requests_concurrently, asyncio's default executor,
+# any other ThreadPoolExecutor
+_WORKER_THREAD = re.compile(r"^(send_requests|asyncio|ThreadPoolExecutor-\d+)_\d+$")
+_HIDDEN = re.compile(r"[\\/](_pytest|pluggy)[\\/]|[\\/]threading\.py|utilities[\\/]profiling\.py")
+
+
+def classify(filename):
+    for layer, pattern in _LAYERS:
+        if pattern.search(filename):
+            return layer
+    return None
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack, and those of busy framework worker threads, at a fixed interval.
+
+    :param interval_s: Seconds between samples.
+    """
+
+    def __init__(self, interval_s):
+        self.interval_s = interval_s
+        self.phase = "call"
+        self.samples = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        self._thread_id = thread_id
+        self.samples = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self._thread_id:
+                    pool = None
+                else:
+                    worker = _WORKER_THREAD.match(names.get(thread_id, ""))
+                    if worker is None:
+                        continue
+                    pool = worker.group(1)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if not _HIDDEN.search(code.co_filename):
+                        stack.append(code)
+                    frame = frame.f_back
+                # A pool thread waiting for work has no frame of a known layer
+                if not stack or pool is not None and not any(classify(code.co_filename) for code in stack):
+                    continue
+                stack.reverse()
+                self.samples[(self.phase, pool, tuple(stack))] += 1
+
+
+def attribute(phase, stack):
+    """Layer of one sample: fixtures for setup/teardown, otherwise the innermost classified frame."""
+    if phase != "call":
+        return "fixtures"
+    for code in reversed(stack):
+        layer = classify(code.co_filename)
+        if layer:
+            return layer
+    return "other"
+
+
+class ApiProfiler:
+    """pytest plugin object registered by `--profile-api`."""
+
+    def __init__(self, output_dir, interval_s):
+        self.output_dir = output_dir
+        self.sampler = StackSampler(interval_s)
+        self.layers = Counter()
+        self.inclusive = Counter()
+        self.exclusive = Counter()
+        self.collapsed = Counter()
+        self.per_test_layers = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.sampler.start(threading.get_ident())
+        yield
+        self._collect(item.nodeid, self.sampler.stop())
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        self.sampler.phase = "setup"
+        yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        self.sampler.phase = "call"
+        yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self, item, nextitem):
+        self.sampler.phase = "teardown"
+        yield
+
+    def _collect(self, nodeid, samples):
+        test_layers = Counter()
+        lines = []
+        for (phase, pool, stack), count in samples.items():
+            layer = attribute(phase, stack)
+            test_layers[layer] += count
+            thread = [f"[{pool}]"] if pool else []
+            folded = ";".join([phase, layer] + thread + [_frame_label(code) for code in stack])
+            lines.append(f"{folded} {count}")
+            self.collapsed[folded] += count
+            self.exclusive[_frame_label(stack[-1])] += count
+            for code in set(stack):
+                if classify(code.co_filename) != "test" and "utilities" in code.co_filename:
+                    self.inclusive[_frame_label(code)] += count
+        self.layers.update(test_layers)
+        self.per_test_layers[nodeid] = test_layers
+
+        file_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", nodeid).strip("_")[:180]
+        with open(os.path.join(self.output_dir, f"{file_name}.folded"), "w") as file:
+            file.write("\n".join(lines) + ("\n" if lines else ""))
+
+    def pytest_sessionfinish(self, session):
+        with open(os.path.join(self.output_dir, "all.folded"), "w") as file:
+            for folded, count in self.collapsed.items():
+                file.write(f"{folded} {count}\n")
+
+    def pytest_terminal_summary(self, terminalreporter):
+        total = sum(self.layers.values())
+        if not total:
+            return
+        terminalreporter.section("API profile")
+        interval_ms = self.sampler.interval_s * 1000
+        for layer, count in self.layers.most_common():
+            terminalreporter.write_line(f"{layer:<12}{count * interval_ms:>10.0f} ms  {count / total:>6.1%}")
+        terminalreporter.write_line("")
+        terminalreporter.write_line("Hottest framework functions (inclusive):")
+        for label, count in self.inclusive.most_common(10):
+            terminalreporter.write_line(f"  {count * interval_ms:>8.0f} ms  {label}")
+        terminalreporter.write_line("Hottest functions (self):")
+        for label, count in self.exclusive.most_common(10):
+            terminalreporter.write_line(f"  {count * interval_ms:>8.0f} ms  {label}")
+        terminalreporter.write_line(f"Collapsed stacks written to {self.output_dir}")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("profile-api", "per-test sampling profiler")
+    group.addoption("--profile-api", action="store_true", default=False,
+                    help="Sample every test's stack (and busy request worker threads), attribute time to "
+                         "framework layers and write flame-graph files.")
+    group.addoption("--profile-interval-ms", type=float, default=None,
+                    help="Sampling interval (default: [profiling] sample_interval_ms).")
+
+
+def pytest_configure(config):
+    if not config.getoption("profile_api"):
+        return
+    interval_ms = config.getoption("profile_interval_ms") or ReadConfig.get_profiling_sample_interval_ms()
+    output_dir = ReadConfig.get_profiling_output_dir()
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput:
+        output_dir = os.path.join(output_dir, workerinput["workerid"])
+    config.pluginmanager.register(ApiProfiler(output_dir, interval_ms / 1000), "api-profiler")
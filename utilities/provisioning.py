@@ -0,0 +1,255 @@
+"""
+Idempotent bulk provisioning of users and products from a manifest.
+
+A manifest (see `resources/manifests/bulk_data.json`) says how many entities to create and which payload
+file under `resources/payloads/` to base them on. Every entity gets a deterministic natural key - the
+user's email, the product's name - derived from `key_prefix` and its index, so a re-run recognises what
+already exists instead of creating duplicates:
+
+1. keys already present on the server (admin `users` list, paged `products` list) are adopted;
+2. keys recorded in the checkpoint file (append-only, one JSON line per created entity) but no longer on
+   the server - e.g. after a database reset or snapshot restore - are dropped from it;
+3. the rest are created concurrently with at most `max_workers` requests in flight.
+
+The checkpoint is only trusted as is when the server cannot be listed. The result is an ID index:
+`{"users": {email: id}, "products": {name: id}}`.
+
+Usage:
+    python -m utilities.provisioning resources/manifests/bulk_data.json --workers 32
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utilities.get_token import get_auth_token
+from utilities.read_config import ReadConfig
+from utilities.request_handler import send_request
+
+_resources_dir = os.path.join(os.path.dirname(__file__), "..", "resources")
+
+
+def load_manifest(manifest):
+    """
+    :param manifest: Path, or file name under `resources/manifests/`.
+    """
+    path = manifest if os.path.exists(manifest) else os.path.join(_resources_dir, "manifests", manifest)
+    with open(path) as file:
+        return json.load(file)
+
+
+def _load_payload(name):
+    with open(os.path.join(_resources_dir, "payloads", name)) as file:
+        return json.load(file)
+
+
+def user_key(prefix, index):
+    return f"{prefix}-user-{index:06d}@example.com"
+
+
+def product_key(prefix, index):
+    return f"{prefix} product {index:06d}"
+
+
+class Checkpoint:
+    """Append-only JSON-lines record of created entities; safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def load(self):
+        index = {"users": {}, "products": {}}
+        if not os.path.exists(self.path):
+            return index
+        with open(self.path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn line from an interrupted run; that entity is re-checked on the server
+                index[record["kind"]][record["key"]] = record["id"]
+        return index
+
+    def append(self, kind, key, entity_id):
+        line = json.dumps({"kind": kind, "key": key, "id": entity_id}) + "\n"
+        with self._lock, open(self.path, "a") as file:
+            file.write(line)
+
+
+class BulkProvisioner:
+    """
+    :param manifest: Manifest dict (see `load_manifest`).
+    :param checkpoint_path: Checkpoint file; defaults to `[provisioning] checkpoint_path` for the current environment.
+    :param max_workers: Maximum requests in flight.
+    :param logger: Optional logger for progress and failures.
+    """
+
+    def __init__(self, manifest, checkpoint_path=None, max_workers=None, logger=None):
+        self.manifest = manifest
+        self.prefix = manifest.get("key_prefix", "bulk")
+        self.max_workers = max_workers or ReadConfig.get_provisioning_max_workers()
+        self.checkpoint = Checkpoint(checkpoint_path or ReadConfig.get_provisioning_checkpoint_path())
+        self.logger = logger
+        self.failures = []
+        self._admin_headers = None
+        # Parsed once; every entity is a shallow copy with its key fields on top
+        self._payloads = {
+            kind: _load_payload(spec["payload"]) for kind, spec in manifest.items()
+            if kind in ("users", "products") and spec.get("count")
+        }
+
+    def _headers(self):
+        if self._admin_headers is None:
+            self._admin_headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {get_auth_token()}",
+            }
+        return self._admin_headers
+
+    def existing_users(self):
+        """:return: `{email: id}` of the users on the server, or None when they cannot be listed."""
+        response = send_request("GET", ReadConfig.get_users_endpoint(), headers=self._headers(), logger=self.logger)
+        if response is None or response.status_code != 200:
+            return None
+        return {user["email"]: user.get("_id", user.get("id")) for user in response.json()}
+
+    def existing_products(self):
+        """:return: `{name: id}` of the products on the server, or None when they cannot be listed."""
+        products = {}
+        page, pages = 1, 1
+        while page <= pages:
+            response = send_request(
+                "GET", f"{ReadConfig.get_products_endpoint()}?page={page}", headers=self._headers(), logger=self.logger
+            )
+            if response is None or response.status_code != 200:
+                return None
+            data = response.json()
+            products.update({product["name"]: product["_id"] for product in data.get("products", [])})
+            pages = data.get("pages", 1)
+            page += 1
+        return products
+
+    def _create_user(self, key):
+        spec = self.manifest["users"]
+        payload = {**self._payloads["users"], "email": key, "name": f"Bulk User {key.split('@')[0]}"}
+        if spec.get("password"):
+            payload["password"] = spec["password"]
+        response = send_request("POST", ReadConfig.get_register_user_endpoint(), payload=payload, logger=self.logger)
+        if response is not None and response.status_code == 200:
+            return response.json()["id"]
+        return None
+
+    def _create_product(self, key):
+        payload = {**self._payloads["products"], "name": key}
+        response = send_request(
+            "POST", f"{ReadConfig.get_products_endpoint()}/create/", headers=self._headers(),
+            payload=payload, logger=self.logger,
+        )
+        if response is not None and response.status_code == 200:
+            return response.json()["_id"]
+        return None
+
+    def _provision(self, kind, keys, create, index):
+        """Creates the missing keys with bounded parallelism; never holds more than 2 * max_workers futures."""
+        pending = {}
+        keys = iter(keys)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                for key in keys:
+                    pending[executor.submit(create, key)] = key
+                    if len(pending) >= 2 * self.max_workers:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    try:
+                        entity_id = future.result()
+                    except Exception as error:
+                        entity_id = None
+                        if self.logger:
+                            self.logger.error(f"Provisioning {kind} '{key}' failed: {error}")
+                    if entity_id is None:
+                        self.failures.append((kind, key))
+                        continue
+                    index[kind][key] = entity_id
+                    self.checkpoint.append(kind, key, entity_id)
+
+    def _reconcile(self, kind, wanted, existing, index):
+        """Makes `index[kind]` agree with the server: adopts what exists, drops checkpoint IDs that are gone."""
+        stale = 0
+        for key in wanted:
+            entity_id = existing.get(key)
+            if entity_id is None:
+                stale += index[kind].pop(key, None) is not None
+            elif index[kind].get(key) != entity_id:
+                index[kind][key] = entity_id
+                self.checkpoint.append(kind, key, entity_id)
+        if stale and self.logger:
+            self.logger.warning(f"{stale} {kind} in the checkpoint no longer exist on the server; recreating them")
+
+    def run(self):
+        """
+        :return: ID index `{"users": {email: id}, "products": {name: id}}` covering the whole manifest.
+        """
+        index = self.checkpoint.load()
+        self.failures = []
+        plans = [
+            ("users", user_key, self.existing_users, self._create_user),
+            ("products", product_key, self.existing_products, self._create_product),
+        ]
+        for kind, make_key, fetch_existing, create in plans:
+            count = self.manifest.get(kind, {}).get("count", 0)
+            wanted = [make_key(self.prefix, number) for number in range(1, count + 1)]
+            if wanted:
+                existing = fetch_existing()
+                if existing is not None:
+                    self._reconcile(kind, wanted, existing, index)
+                elif self.logger:
+                    self.logger.warning(f"Could not list {kind}; trusting the checkpoint as is")
+            missing = [key for key in wanted if key not in index[kind]]
+            if self.logger:
+                self.logger.info(f"Provisioning {kind}: {count - len(missing)} present, {len(missing)} to create")
+            self._provision(kind, missing, create, index)
+            failed = {key for failed_kind, key in self.failures if failed_kind == kind}
+            if failed:
+                # A concurrent run may have created them first (e.g. "User already exists"); adopt those
+                existing = fetch_existing() or {}
+                for key in failed & set(existing):
+                    index[kind][key] = existing[key]
+                    self.checkpoint.append(kind, key, existing[key])
+                self.failures = [(k, key) for k, key in self.failures if k != kind or key not in index[kind]]
+            index[kind] = {key: index[kind][key] for key in wanted if key in index[kind]}
+        return index
+
+
+def provision(manifest=None, max_workers=None, logger=None):
+    """Convenience wrapper: load the manifest (default `[provisioning] manifest`) and run it."""
+    manifest = load_manifest(manifest or ReadConfig.get_provisioning_manifest())
+    return BulkProvisioner(manifest, max_workers=max_workers, logger=logger).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create bulk users and products idempotently.")
+    parser.add_argument("manifest", nargs="?", default=None, help="Manifest path or name in resources/manifests/")
+    parser.add_argument("--workers", type=int, default=None, help="Maximum requests in flight")
+    parser.add_argument("--index", default=None, help="Write the resulting ID index to this JSON file")
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(args.manifest or ReadConfig.get_provisioning_manifest())
+    provisioner = BulkProvisioner(manifest, max_workers=args.workers)
+    index = provisioner.run()
+    if args.index:
+        with open(args.index, "w") as file:
+            json.dump(index, file)
+    print(f"users: {len(index['users'])}, products: {len(index['products'])}, failures: {len(provisioner.failures)}")
+    return 1 if provisioner.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
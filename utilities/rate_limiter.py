@@ -0,0 +1,210 @@
+"""
+Client-side token-bucket rate limiting for the request layer.
+
+Parallel and load runs against shared staging can trip the backend's throttling, which then looks
+like a product bug. `send_request` asks the limiter for a slot before every call; the time spent
+waiting is reported as queueing delay, separately from server latency.
+
+Buckets are reservation based: taking a token never blocks while holding the lock, it only returns
+how long the caller has to wait. That makes the same bucket usable from threads (`acquire`) and
+asyncio tasks (`acquire_async`). With `[rate_limit] shared_state_dir` set, the buckets keep their
+state in small lock-protected files so that several worker processes share one budget.
+"""
+import asyncio
+import os
+import re
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from utilities.metrics import normalize_endpoint
+from utilities.read_config import ReadConfig
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class TokenBucket:
+    """
+    In-process token bucket shared by all threads and asyncio tasks.
+
+    :param rate: Tokens added per second.
+    :param burst: Bucket capacity, i.e. how many requests may go out back to back.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes one token and returns the number of seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens, delay = _take_token(self._tokens, self._updated, now, self.rate, self.burst)
+            self._updated = now
+            return delay
+
+
+class FileTokenBucket:
+    """
+    Token bucket whose state lives in a file guarded by an OS file lock, shared across processes.
+
+    :param path: State file; created on first use.
+    :param rate: Tokens added per second.
+    :param burst: Bucket capacity.
+    """
+
+    _STATE = struct.Struct("<dd")
+
+    def __init__(self, path, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.path = path
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._thread_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def reserve(self):
+        # time.time() instead of monotonic: the clock has to be comparable between processes
+        with self._thread_lock, _locked_file(self.path) as file:
+            now = time.time()
+            state = file.read(self._STATE.size)
+            if len(state) == self._STATE.size:
+                tokens, updated = self._STATE.unpack(state)
+            else:
+                tokens, updated = self.burst, now
+            tokens, delay = _take_token(tokens, updated, now, self.rate, self.burst)
+            file.seek(0)
+            file.write(self._STATE.pack(tokens, now))
+            file.flush()
+            return delay
+
+
+def _take_token(tokens, updated, now, rate, burst):
+    tokens = min(burst, tokens + (now - updated) * rate) - 1
+    # A negative balance is a queue of reservations; the caller waits until it is paid back
+    delay = -tokens / rate if tokens < 0 else 0.0
+    return tokens, delay
+
+
+@contextmanager
+def _locked_file(path):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+b") as file:
+        if fcntl:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            file.seek(0)
+            yield file
+        finally:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RateLimiter:
+    """
+    Global plus per-endpoint limits. A request waits for the slower of the two buckets.
+
+    :param global_rate: Requests per second across all endpoints (None for no global limit).
+    :param global_burst: Global bucket capacity.
+    :param endpoint_rates: Dict of endpoint prefix -> (rate, burst), matched against normalized endpoints.
+    :param shared_state_dir: Directory for file-backed buckets shared across processes (None keeps them in memory).
+    """
+
+    def __init__(self, global_rate=None, global_burst=None, endpoint_rates=None, shared_state_dir=None):
+        self.shared_state_dir = shared_state_dir
+        self._global = self._make_bucket("global", global_rate, global_burst) if global_rate else None
+        # Longest prefix first so `users/login/` wins over `users`
+        self._endpoints = [
+            (prefix, self._make_bucket(prefix, rate, burst))
+            for prefix, (rate, burst) in sorted((endpoint_rates or {}).items(), key=lambda item: -len(item[0]))
+        ]
+        self._stats_lock = threading.Lock()
+        self._queue_stats = {}
+
+    def _make_bucket(self, name, rate, burst):
+        if self.shared_state_dir:
+            file_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "root"
+            return FileTokenBucket(os.path.join(self.shared_state_dir, f"{file_name}.bucket"), rate, burst)
+        return TokenBucket(rate, burst)
+
+    def _bucket_for(self, endpoint_key):
+        for prefix, bucket in self._endpoints:
+            if endpoint_key.startswith(prefix):
+                return bucket
+        return None
+
+    def reserve(self, endpoint):
+        endpoint_key = normalize_endpoint(endpoint)
+        delay = self._global.reserve() if self._global else 0.0
+        bucket = self._bucket_for(endpoint_key)
+        if bucket:
+            delay = max(delay, bucket.reserve())
+        self._record_delay(endpoint_key, delay)
+        return delay
+
+    def acquire(self, endpoint):
+        """Blocks the calling thread until a slot is available and returns the queueing delay in seconds."""
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, endpoint):
+        """Asyncio variant of `acquire`; only the awaiting task waits."""
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def _record_delay(self, endpoint_key, delay):
+        with self._stats_lock:
+            stats = self._queue_stats.setdefault(endpoint_key, {"requests": 0, "queued": 0, "total_s": 0.0, "max_s": 0.0})
+            stats["requests"] += 1
+            if delay > 0:
+                stats["queued"] += 1
+                stats["total_s"] += delay
+                stats["max_s"] = max(stats["max_s"], delay)
+
+    def queue_stats(self):
+        """Per-endpoint queueing-delay summary: requests, how many waited, total and max wait in seconds."""
+        with self._stats_lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._queue_stats.items()}
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide limiter built from `[rate_limit]`, or None when rate limiting is disabled.
+    """
+    global _rate_limiter
+    if not ReadConfig.get_rate_limit_enabled():
+        return None
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    global_rate=ReadConfig.get_rate_limit_global_rate(),
+                    global_burst=ReadConfig.get_rate_limit_global_burst(),
+                    endpoint_rates=ReadConfig.get_rate_limit_endpoint_rates(),
+                    shared_state_dir=ReadConfig.get_rate_limit_shared_state_dir(),
+                )
+    return _rate_limiter
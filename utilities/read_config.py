@@ -6,22 +6,48 @@ config_path = os.path.join(os.path.dirname(__file__), '..', 'configurations', 'c
 config = configparser.RawConfigParser()
 config.read(config_path)
 
+
+def _environment_option(option, default_section):
+    """Reads an option from the profile selected by API_ENV, falling back to its default section."""
+    environment = os.environ.get('API_ENV')
+    if environment:
+        section = f'environment:{environment}'
+        if not config.has_section(section):
+            raise ValueError(f"Unknown environment profile '{environment}' in {config_path}")
+        if config.has_option(section, option):
+            return config.get(section=section, option=option)
+    return config.get(section=default_section, option=option)
+
+
 class ReadConfig:
     @staticmethod
     def get_base_url():
-        url = config.get(section='common', option='base_url')
+        # API_BASE_URL points a run at another backend (e.g. the in-process stub server) without editing config.ini
+        url = os.environ.get('API_BASE_URL') or _environment_option('base_url', 'common')
         return url
 
+    @staticmethod
+    def get_environment_name():
+        return os.environ.get('API_ENV') or 'default'
+
+    @staticmethod
+    def get_environment_names():
+        return [section.split(':', 1)[1] for section in config.sections() if section.startswith('environment:')]
+
     @staticmethod
     def get_admin_username():
-        admin_username = config.get(section='admin', option='admin_username')
+        admin_username = _environment_option('admin_username', 'admin')
         return admin_username
 
     @staticmethod
     def get_admin_password():
-        admin_password = config.get(section='admin', option='admin_password')
+        admin_password = _environment_option('admin_password', 'admin')
         return admin_password
 
+    @staticmethod
+    def get_token_cache_seconds():
+        return config.getfloat(section='admin', option='token_cache_seconds')
+
     @staticmethod
     def get_tes_user_name():
         test_user_name = config.get(section='test_user_account', option='test_user_name')
@@ -71,6 +97,10 @@ class ReadConfig:
     def get_products_endpoint():
         return config.get(section='end_points', option='products_endpoint')
 
+    @staticmethod
+    def get_end_points():
+        return dict(config.items('end_points'))
+
     @staticmethod
     def get_logs_users_path():
         return config.get(section='logger', option='logs_user_path')
@@ -82,3 +112,387 @@ class ReadConfig:
     @staticmethod
     def get_logs_product_path():
         return config.get(section='logger', option='logs_product_path')
+
+    @staticmethod
+    def get_logs_access_matrix_path():
+        return config.get(section='logger', option='logs_access_matrix_path')
+
+    @staticmethod
+    def get_soak_duration_minutes():
+        return config.getfloat(section='soak', option='duration_minutes')
+
+    @staticmethod
+    def get_soak_sample_interval_seconds():
+        return config.getfloat(section='soak', option='sample_interval_seconds')
+
+    @staticmethod
+    def get_soak_warmup_fraction():
+        return config.getfloat(section='soak', option='warmup_fraction')
+
+    @staticmethod
+    def get_soak_growth_limits():
+        return {
+            "rss_mb": config.getfloat(section='soak', option='max_rss_growth_mb'),
+            "open_fds": config.getfloat(section='soak', option='max_fd_growth'),
+            "sockets": config.getfloat(section='soak', option='max_socket_growth'),
+            "log_handlers": config.getfloat(section='soak', option='max_handler_growth'),
+            "sessions": config.getfloat(section='soak', option='max_session_growth'),
+            "responses": config.getfloat(section='soak', option='max_response_growth'),
+            "validators": config.getfloat(section='soak', option='max_validator_growth'),
+            "latency_percent": config.getfloat(section='soak', option='max_latency_growth_percent'),
+        }
+
+    @staticmethod
+    def get_soak_report_path():
+        return config.get(section='soak', option='report_path')
+
+    @staticmethod
+    def get_rate_limit_enabled():
+        return config.getboolean(section='rate_limit', option='enabled')
+
+    @staticmethod
+    def get_rate_limit_global_rate():
+        rate = config.get(section='rate_limit', option='global_rate')
+        return float(rate) if rate else None
+
+    @staticmethod
+    def get_rate_limit_global_burst():
+        burst = config.get(section='rate_limit', option='global_burst')
+        return float(burst) if burst else None
+
+    @staticmethod
+    def get_rate_limit_shared_state_dir():
+        return config.get(section='rate_limit', option='shared_state_dir') or None
+
+    @staticmethod
+    def get_rate_limit_endpoint_rates():
+        # Each option is `endpoint prefix = rate[/burst]`
+        endpoint_rates = {}
+        for endpoint, value in config.items(section='rate_limit_endpoints'):
+            rate, _, burst = value.partition('/')
+            endpoint_rates[endpoint] = (float(rate), float(burst) if burst else None)
+        return endpoint_rates
+
+    @staticmethod
+    def get_slo_enabled():
+        return config.getboolean(section='slo', option='enabled')
+
+    @staticmethod
+    def get_slo_confidence():
+        return config.getfloat(section='slo', option='confidence')
+
+    @staticmethod
+    def get_slo_effect_ratio():
+        return config.getfloat(section='slo', option='effect_ratio')
+
+    @staticmethod
+    def get_slo_endpoint_budgets():
+        # Each option is `endpoint prefix = budget`, parsed by utilities.slo.parse_budget
+        return dict(config.items(section='slo_endpoints'))
+
+    @staticmethod
+    def get_single_flight_enabled():
+        return config.getboolean(section='single_flight', option='enabled')
+
+    @staticmethod
+    def get_single_flight_window_ms():
+        return config.getfloat(section='single_flight', option='window_ms')
+
+    @staticmethod
+    def get_single_flight_shared_state_dir():
+        return config.get(section='single_flight', option='shared_state_dir') or None
+
+    @staticmethod
+    def get_transport_protocol():
+        return config.get(section='transport', option='protocol')
+
+    @staticmethod
+    def get_transport_http2_prior_knowledge():
+        return config.getboolean(section='transport', option='http2_prior_knowledge')
+
+    @staticmethod
+    def get_transport_pool_maxsize():
+        return config.getint(section='transport', option='pool_maxsize')
+
+    @staticmethod
+    def get_timeouts_adaptive():
+        return config.getboolean(section='timeouts', option='adaptive')
+
+    @staticmethod
+    def get_timeouts_default_seconds():
+        return config.getfloat(section='timeouts', option='default_seconds')
+
+    @staticmethod
+    def get_timeouts_percentile():
+        return config.getfloat(section='timeouts', option='percentile')
+
+    @staticmethod
+    def get_timeouts_safety_factor():
+        return config.getfloat(section='timeouts', option='safety_factor')
+
+    @staticmethod
+    def get_timeouts_min_samples():
+        return config.getint(section='timeouts', option='min_samples')
+
+    @staticmethod
+    def get_timeouts_read_floor_seconds():
+        return config.getfloat(section='timeouts', option='read_floor_seconds')
+
+    @staticmethod
+    def get_timeouts_read_cap_seconds():
+        return config.getfloat(section='timeouts', option='read_cap_seconds')
+
+    @staticmethod
+    def get_timeouts_connect_floor_seconds():
+        return config.getfloat(section='timeouts', option='connect_floor_seconds')
+
+    @staticmethod
+    def get_timeouts_connect_cap_seconds():
+        return config.getfloat(section='timeouts', option='connect_cap_seconds')
+
+    @staticmethod
+    def get_timeouts_warn_ratio():
+        return config.getfloat(section='timeouts', option='warn_ratio')
+
+    @staticmethod
+    def get_timeouts_history_runs():
+        return config.getint(section='timeouts', option='history_runs')
+
+    @staticmethod
+    def get_timeouts_database_path():
+        path = config.get(section='timeouts', option='database_path')
+        return os.path.join(os.path.abspath(os.curdir), path)
+
+    @staticmethod
+    def get_compression_encodings():
+        value = config.get(section='compression', option='encodings')
+        return [encoding.strip() for encoding in value.split(',') if encoding.strip()]
+
+    @staticmethod
+    def get_compression_bandwidth_summary():
+        return config.getboolean(section='compression', option='bandwidth_summary')
+
+    @staticmethod
+    def get_payload_budgets():
+        # Each option is `endpoint prefix = budget`, parsed by utilities.compression.parse_size_budget
+        return dict(config.items(section='payload_budgets'))
+
+    @staticmethod
+    def get_duration_history_database_path():
+        path = config.get(section='duration_history', option='database_path')
+        return os.path.join(os.path.abspath(os.curdir), path)
+
+    @staticmethod
+    def get_duration_history_window():
+        return config.getint(section='duration_history', option='history_window')
+
+    @staticmethod
+    def get_duration_history_default_seconds():
+        return config.getfloat(section='duration_history', option='default_duration_seconds')
+
+    @staticmethod
+    def get_duration_history_expensive_fixtures():
+        fixtures = config.get(section='duration_history', option='expensive_fixtures')
+        return {name.strip() for name in fixtures.split(',') if name.strip()}
+
+    @staticmethod
+    def get_result_sink_path():
+        path = config.get(section='results', option='sink_path')
+        return os.path.join(os.path.abspath(os.curdir), path) if path else None
+
+    @staticmethod
+    def get_result_sink_buffer_bytes():
+        return config.getint(section='results', option='buffer_bytes')
+
+    @staticmethod
+    def get_result_sink_flush_interval_seconds():
+        return config.getfloat(section='results', option='flush_interval_seconds')
+
+    @staticmethod
+    def get_result_record_headers():
+        value = config.get(section='results', option='record_headers')
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    @staticmethod
+    def get_result_record_body_bytes():
+        return config.getint(section='results', option='record_body_bytes')
+
+    @staticmethod
+    def get_streaming_validation_min_bytes():
+        return config.getint(section='validation', option='streaming_min_bytes')
+
+    @staticmethod
+    def get_dashboard_host():
+        return config.get(section='dashboard', option='host')
+
+    @staticmethod
+    def get_dashboard_port():
+        return config.getint(section='dashboard', option='port')
+
+    @staticmethod
+    def get_dashboard_refresh_seconds():
+        return config.getfloat(section='dashboard', option='refresh_seconds')
+
+    @staticmethod
+    def get_dashboard_window_seconds():
+        return config.getint(section='dashboard', option='window_seconds')
+
+    @staticmethod
+    def get_profiling_output_dir():
+        path = config.get(section='profiling', option='output_dir')
+        return os.path.join(os.path.abspath(os.curdir), path)
+
+    @staticmethod
+    def get_profiling_sample_interval_ms():
+        return config.getfloat(section='profiling', option='sample_interval_ms')
+
+    @staticmethod
+    def get_database_path():
+        path = os.environ.get('API_DB_PATH') or _environment_option('database_path', 'database')
+        return os.path.join(os.path.abspath(os.curdir), path) if path else None
+
+    @staticmethod
+    def get_database_snapshot_dir():
+        return os.path.join(os.path.abspath(os.curdir), config.get(section='database', option='snapshot_dir'))
+
+    @staticmethod
+    def get_database_restore_method():
+        return config.get(section='database', option='restore_method')
+
+    @staticmethod
+    def get_database_users_to_keep():
+        return config.getint(section='database', option='users_to_keep')
+
+    @staticmethod
+    def get_fuzzing_requests():
+        return config.getint(section='fuzzing', option='requests')
+
+    @staticmethod
+    def get_fuzzing_concurrency():
+        return config.getint(section='fuzzing', option='concurrency')
+
+    @staticmethod
+    def get_fuzzing_seed():
+        return config.getint(section='fuzzing', option='seed')
+
+    @staticmethod
+    def get_fuzzing_timeout_seconds():
+        return config.getfloat(section='fuzzing', option='timeout_seconds')
+
+    @staticmethod
+    def get_fuzzing_report_path():
+        return os.path.join(os.path.abspath(os.curdir), config.get(section='fuzzing', option='report_path'))
+
+    @staticmethod
+    def get_distributed_listen():
+        return config.get(section='distributed', option='listen')
+
+    @staticmethod
+    def get_distributed_auth_token():
+        return os.environ.get('API_DISTRIBUTED_TOKEN') or config.get(section='distributed', option='auth_token')
+
+    @staticmethod
+    def get_distributed_flush_seconds():
+        return config.getfloat(section='distributed', option='flush_seconds')
+
+    @staticmethod
+    def get_distributed_connect_timeout_seconds():
+        return config.getfloat(section='distributed', option='connect_timeout_seconds')
+
+    @staticmethod
+    def get_distributed_report_path():
+        return config.get(section='distributed', option='report_path')
+
+    @staticmethod
+    def get_capacity_mode():
+        return config.get(section='capacity', option='mode')
+
+    @staticmethod
+    def get_capacity_start_rps():
+        return config.getfloat(section='capacity', option='start_rps')
+
+    @staticmethod
+    def get_capacity_step_rps():
+        return config.getfloat(section='capacity', option='step_rps')
+
+    @staticmethod
+    def get_capacity_max_rps():
+        return config.getfloat(section='capacity', option='max_rps')
+
+    @staticmethod
+    def get_capacity_resolution_rps():
+        return config.getfloat(section='capacity', option='resolution_rps')
+
+    @staticmethod
+    def get_capacity_step_seconds():
+        return config.getfloat(section='capacity', option='step_seconds')
+
+    @staticmethod
+    def get_capacity_warmup_seconds():
+        return config.getfloat(section='capacity', option='warmup_seconds')
+
+    @staticmethod
+    def get_capacity_max_concurrency():
+        return config.getint(section='capacity', option='max_concurrency')
+
+    @staticmethod
+    def get_capacity_p99_limit_ms():
+        return config.getfloat(section='capacity', option='p99_limit_ms')
+
+    @staticmethod
+    def get_capacity_max_error_percent():
+        return config.getfloat(section='capacity', option='max_error_percent')
+
+    @staticmethod
+    def get_capacity_min_throughput_ratio():
+        return config.getfloat(section='capacity', option='min_throughput_ratio')
+
+    @staticmethod
+    def get_capacity_regression_percent():
+        return config.getfloat(section='capacity', option='regression_percent')
+
+    @staticmethod
+    def get_capacity_database_path():
+        path = config.get(section='capacity', option='database_path')
+        return os.path.join(os.path.abspath(os.curdir), path)
+
+    @staticmethod
+    def get_contention_workloads():
+        value = config.get(section='contention', option='workloads')
+        return [workload.strip() for workload in value.split(',') if workload.strip()]
+
+    @staticmethod
+    def get_contention_concurrency_levels():
+        value = config.get(section='contention', option='concurrency_levels')
+        return [int(level) for level in value.split(',') if level.strip()]
+
+    @staticmethod
+    def get_contention_writes_per_writer():
+        return config.getint(section='contention', option='writes_per_writer')
+
+    @staticmethod
+    def get_contention_report_path():
+        return config.get(section='contention', option='report_path')
+
+    @staticmethod
+    def get_access_matrix():
+        return config.get(section='access_matrix', option='matrix')
+
+    @staticmethod
+    def get_access_matrix_max_workers():
+        return config.getint(section='access_matrix', option='max_workers')
+
+    @staticmethod
+    def get_provisioning_manifest():
+        return config.get(section='provisioning', option='manifest')
+
+    @staticmethod
+    def get_provisioning_checkpoint_path():
+        # One checkpoint per environment: IDs from one backend mean nothing on another
+        path = config.get(section='provisioning', option='checkpoint_path')
+        root, extension = os.path.splitext(os.path.join(os.path.abspath(os.curdir), path))
+        return f"{root}.{ReadConfig.get_environment_name()}{extension}"
+
+    @staticmethod
+    def get_provisioning_max_workers():
+        return config.getint(section='provisioning', option='max_workers')
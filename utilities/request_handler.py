@@ -1,27 +1,63 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
-import requests
-from requests.exceptions import RequestException, HTTPError, Timeout, ConnectionError
+from requests.exceptions import RequestException, HTTPError, Timeout, ConnectionError, ReadTimeout
 
+from utilities.adaptive_timeout import resolve_timeout
 from utilities.logger import setup_logger
+from utilities.metrics import request_metrics
+from utilities.rate_limiter import get_rate_limiter
 from utilities.read_config import ReadConfig
+from utilities.result_record import ResultRecord
+from utilities.single_flight import get_single_flight
+from utilities.transport import get_transport
+
+
+def _json_headers(headers, data):
+    if data is None or any(name.lower() == "content-type" for name in (headers or {})):
+        return headers
+    return {**(headers or {}), "Content-Type": "application/json"}
 
 
-def send_request(method, endpoint, headers=None, payload=None, timeout=10, logger=None):
+def send_request(method, endpoint, headers=None, payload=None, timeout=None, logger=None, coalesce=True, data=None):
 
     """ Sends an HTTP request and returns the response.
     :param method: HTTP method (GET, POST, PUT, DELETE, etc.)
     :param endpoint: API endpoint
     :param headers: HTTP headers
     :param payload: JSON payload
-    :param timeout: Request timeout
+    :param timeout: Request timeout in seconds or a (connect, read) pair; None uses the endpoint's adaptive timeout
+    :param coalesce: Share identical in-flight GETs (`[single_flight]`); load generators pass False
+    :param data: Pre-encoded JSON body, e.g. `PayloadTemplate.render()`; sent as application/json unless headers say otherwise
     :return: Response object
     :raises: HTTPError, Timeout, ConnectionError, RequestException
     """
-    base_url = ReadConfig.get_base_url()
-    url = f"{base_url}{endpoint}"
+    url = f"{ReadConfig.get_base_url()}{endpoint}"
+    timeout = resolve_timeout(endpoint, timeout)
+    headers = _json_headers(headers, data)
+    single_flight = get_single_flight() if coalesce else None
+    if single_flight:
+        flight_key = single_flight.key(method, url, headers, payload if data is None else data)
+        if flight_key:
+            return single_flight.do(
+                flight_key, endpoint, lambda: _send_request(method, endpoint, url, headers, payload, timeout, logger, data)
+            )
+        single_flight.invalidate()
+    return _send_request(method, endpoint, url, headers, payload, timeout, logger, data)
+
+
+def _send_request(method, endpoint, url, headers, payload, timeout, logger, data):
     response = None
+    timed_out = False
+    rate_limiter = get_rate_limiter()
+    queue_delay = rate_limiter.acquire(endpoint) if rate_limiter else 0.0
+    request_metrics.record_start(method, endpoint)
+    started = time.perf_counter()
     try:
-        response = requests.request(method, url, headers=headers, json=payload, timeout=timeout)
+        response = get_transport().request(method, url, headers=headers, json=payload, data=data, timeout=timeout)
         response.raise_for_status()
         return response
     except HTTPError as http_err:
@@ -29,6 +65,7 @@ def send_request(method, endpoint, headers=None, payload=None, timeout=10, logge
             logger.error(f"HTTP error occurred: {http_err}")
         return response
     except Timeout as timeout_err:
+        timed_out = isinstance(timeout_err, ReadTimeout)
         if logger:
             logger.error(f"Request timed out: {timeout_err}")
         raise
@@ -40,3 +77,118 @@ def send_request(method, endpoint, headers=None, payload=None, timeout=10, logge
         if logger:
             logger.error(f"An error occurred with the request: {req_err}")
         raise
+    finally:
+        status = response.status_code if response is not None else None
+        request_metrics.record(
+            method, endpoint, status, (time.perf_counter() - started) * 1000, queue_ms=queue_delay * 1000,
+            wire_bytes=getattr(response, "wire_bytes", None),
+            body_bytes=len(response.content) if response is not None else None, timed_out=timed_out,
+        )
+
+
+async def send_request_async(method, endpoint, headers=None, payload=None, timeout=None, logger=None, coalesce=True,
+                             data=None):
+    """ Asyncio variant of `send_request` with the same arguments, return value and errors.
+    With the `http2` transport all concurrent calls share one multiplexed connection.
+    """
+    url = f"{ReadConfig.get_base_url()}{endpoint}"
+    timeout = resolve_timeout(endpoint, timeout)
+    headers = _json_headers(headers, data)
+    single_flight = get_single_flight() if coalesce else None
+    if single_flight:
+        flight_key = single_flight.key(method, url, headers, payload if data is None else data)
+        if flight_key:
+            return await single_flight.do_async(
+                flight_key, endpoint, lambda: _send_request_async(method, endpoint, url, headers, payload, timeout, logger, data)
+            )
+        single_flight.invalidate()
+    return await _send_request_async(method, endpoint, url, headers, payload, timeout, logger, data)
+
+
+async def _send_request_async(method, endpoint, url, headers, payload, timeout, logger, data):
+    response = None
+    timed_out = False
+    rate_limiter = get_rate_limiter()
+    queue_delay = await rate_limiter.acquire_async(endpoint) if rate_limiter else 0.0
+    request_metrics.record_start(method, endpoint)
+    started = time.perf_counter()
+    try:
+        response = await get_transport().request_async(method, url, headers=headers, json=payload, data=data, timeout=timeout)
+        response.raise_for_status()
+        return response
+    except HTTPError as http_err:
+        if logger:
+            logger.error(f"HTTP error occurred: {http_err}")
+        return response
+    except Timeout as timeout_err:
+        timed_out = isinstance(timeout_err, ReadTimeout)
+        if logger:
+            logger.error(f"Request timed out: {timeout_err}")
+        raise
+    except ConnectionError as conn_err:
+        if logger:
+            logger.error(f"Connection error occurred: {conn_err}")
+        raise
+    except RequestException as req_err:
+        if logger:
+            logger.error(f"An error occurred with the request: {req_err}")
+        raise
+    finally:
+        status = response.status_code if response is not None else None
+        request_metrics.record(
+            method, endpoint, status, (time.perf_counter() - started) * 1000, queue_ms=queue_delay * 1000,
+            wire_bytes=getattr(response, "wire_bytes", None),
+            body_bytes=len(response.content) if response is not None else None, timed_out=timed_out,
+        )
+
+
+def send_requests_concurrently(request_specs, max_workers=10, compact=False):
+    """ Sends many requests at once and returns their responses in input order.
+    :param request_specs: Iterable of dicts with `send_request` keyword arguments (method, endpoint, ...)
+    :param max_workers: Maximum number of requests in flight
+    :param compact: Return a `ResultRecord` per response instead of the response itself
+    :return: List of responses; a failed call yields its exception instead of a response
+    """
+    def call(spec):
+        try:
+            response = send_request(**spec)
+            return ResultRecord.from_response(response) if compact and response is not None else response
+        except RequestException as error:
+            return error
+
+    return list(_executor(max_workers).map(call, request_specs))
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(max_workers):
+    # One long-lived pool per size: a new pool per call would start new threads, and with them new sessions
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = _executors[max_workers] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="send_requests"
+            )
+        return executor
+
+
+async def send_requests_async(request_specs, max_concurrency=100, compact=False):
+    """ Asyncio counterpart of `send_requests_concurrently`.
+    :param request_specs: Iterable of dicts with `send_request` keyword arguments
+    :param max_concurrency: Maximum number of requests in flight
+    :param compact: Return a `ResultRecord` per response instead of the response itself
+    :return: List of responses or exceptions, in input order
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def call(spec):
+        async with semaphore:
+            try:
+                response = await send_request_async(**spec)
+                return ResultRecord.from_response(response) if compact and response is not None else response
+            except RequestException as error:
+                return error
+
+    return await asyncio.gather(*(call(spec) for spec in request_specs))
@@ -0,0 +1,176 @@
+"""
+Compact stand-ins for `requests.Response` in load and benchmark runs.
+
+A live `Response` keeps the whole body, a headers dict, the prepared request, a cookie jar and an
+`elapsed` timedelta - several kilobytes each. Once a response has been validated, runs only need a
+few facts about it, so they convert it with `ResultRecord.from_response` (or keep many of them in a
+`ResultTable`) and drop the response:
+
+- `ResultRecord`: one `__slots__` object per request - status, latency, body size, a 64-bit body
+  hash, the headers named in `[results] record_headers` and, optionally, the first
+  `[results] record_body_bytes` of the body;
+- `ResultTable`: the same fields stored column-wise in `array`s with interned methods, endpoints
+  and header tuples, for runs with millions of requests (tens of bytes per request).
+"""
+import hashlib
+import sys
+from array import array
+from urllib.parse import urlsplit
+
+from utilities.metrics import normalize_endpoint
+from utilities.read_config import ReadConfig
+
+
+def response_endpoint(response):
+    """Endpoint path of a response relative to the configured base URL, e.g. `products/1`."""
+    request = getattr(response, "request", None)
+    url = request.url if request is not None else response.url
+    path = urlsplit(url or "").path
+    base_path = urlsplit(ReadConfig.get_base_url()).path
+    return path[len(base_path):] if path.startswith(base_path) else path.lstrip("/")
+
+
+def body_hash(content):
+    """64-bit BLAKE2b digest of a body, as an int (fits an unsigned `array('Q')` slot)."""
+    return int.from_bytes(hashlib.blake2b(content or b"", digest_size=8).digest(), "little")
+
+
+class ResultRecord:
+    """
+    What is left of one response after validation.
+
+    :param method: HTTP method.
+    :param endpoint: Normalized endpoint, e.g. `products/{id}`.
+    :param status: Status code (0 when no response was received).
+    :param latency_ms: Time to response headers, in milliseconds.
+    :param body_size: Body length in bytes.
+    :param body_hash: `body_hash()` of the full body.
+    :param headers: Tuple of (name, value) pairs for the recorded headers.
+    :param body: Truncated body bytes, or None when bodies are not kept.
+    """
+
+    __slots__ = ("method", "endpoint", "status", "latency_ms", "body_size", "body_hash", "headers", "body")
+
+    def __init__(self, method, endpoint, status, latency_ms, body_size, body_hash, headers=(), body=None):
+        self.method = method
+        self.endpoint = endpoint
+        self.status = status
+        self.latency_ms = latency_ms
+        self.body_size = body_size
+        self.body_hash = body_hash
+        self.headers = headers
+        self.body = body
+
+    @classmethod
+    def from_response(cls, response, header_names=None, body_bytes=None):
+        """
+        :param response: A `requests.Response`; it is not referenced by the record.
+        :param header_names: Headers to keep (default `[results] record_headers`).
+        :param body_bytes: Body prefix to keep; 0 keeps none (default `[results] record_body_bytes`).
+        """
+        if header_names is None:
+            header_names = ReadConfig.get_result_record_headers()
+        if body_bytes is None:
+            body_bytes = ReadConfig.get_result_record_body_bytes()
+        content = response.content or b""
+        request = getattr(response, "request", None)
+        return cls(
+            sys.intern(request.method if request is not None else "GET"),
+            sys.intern(normalize_endpoint(response_endpoint(response))),
+            response.status_code,
+            response.elapsed.total_seconds() * 1000,
+            len(content),
+            body_hash(content),
+            tuple(
+                (sys.intern(name), response.headers[name]) for name in header_names if name in response.headers
+            ),
+            content[:body_bytes] if body_bytes else None,
+        )
+
+    def header(self, name, default=None):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def __repr__(self):
+        return (f"ResultRecord({self.method} {self.endpoint} -> {self.status}, {self.latency_ms:.2f} ms, "
+                f"{self.body_size} B, hash={self.body_hash:016x})")
+
+
+class _Interner:
+    """Maps repeated values (methods, endpoints, header tuples) to small ints and back."""
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def id(self, value):
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+class ResultTable:
+    """
+    Column-oriented, append-only store of `ResultRecord` fields.
+
+    Indexing or iterating yields `ResultRecord` objects built on demand, so code written against
+    records works unchanged. Truncated bodies, when kept, are the only per-request Python objects.
+    """
+
+    def __init__(self):
+        self._methods = _Interner()
+        self._endpoints = _Interner()
+        self._header_sets = _Interner()
+        self.method_ids = array("B")
+        self.endpoint_ids = array("I")
+        self.statuses = array("H")
+        self.latencies_ms = array("f")
+        self.body_sizes = array("I")
+        self.body_hashes = array("Q")
+        self.header_ids = array("I")
+        self.bodies = None
+
+    def append(self, record):
+        self.method_ids.append(self._methods.id(record.method))
+        self.endpoint_ids.append(self._endpoints.id(record.endpoint))
+        self.statuses.append(record.status)
+        self.latencies_ms.append(record.latency_ms)
+        self.body_sizes.append(record.body_size)
+        self.body_hashes.append(record.body_hash)
+        self.header_ids.append(self._header_sets.id(record.headers))
+        if record.body is not None and self.bodies is None:
+            self.bodies = [None] * (len(self.statuses) - 1)
+        if self.bodies is not None:
+            self.bodies.append(record.body)
+
+    def append_response(self, response, header_names=None, body_bytes=None):
+        self.append(ResultRecord.from_response(response, header_names, body_bytes))
+
+    def __len__(self):
+        return len(self.statuses)
+
+    def __getitem__(self, index):
+        return ResultRecord(
+            self._methods.values[self.method_ids[index]],
+            self._endpoints.values[self.endpoint_ids[index]],
+            self.statuses[index],
+            self.latencies_ms[index],
+            self.body_sizes[index],
+            self.body_hashes[index],
+            self._header_sets.values[self.header_ids[index]],
+            self.bodies[index] if self.bodies is not None else None,
+        )
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def nbytes(self):
+        """Bytes held by the column arrays (excludes interned values and kept bodies)."""
+        columns = (self.method_ids, self.endpoint_ids, self.statuses, self.latencies_ms,
+                   self.body_sizes, self.body_hashes, self.header_ids)
+        return sum(column.itemsize * len(column) for column in columns)
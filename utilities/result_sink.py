@@ -0,0 +1,202 @@
+"""
+Streaming result sink for very large runs, plus a bounded-memory offline aggregator.
+
+The sink appends one compact JSON line per request (and per validation outcome) to an append-only
+file through a fixed-size buffer that is flushed when full and at least every `flush_interval_s`.
+Nothing is kept in memory after a flush, so load and soak runs can emit millions of records.
+
+Record keys:
+    request:    {"k": "r", "t": ts, "m": method, "e": endpoint, "s": status, "l": latency_ms, "q": queue_ms}
+    validation: {"k": "v", "t": ts, "e": endpoint, "c": check, "p": passed}
+
+The aggregator reads the file line by line and keeps one `LatencyHistogram` per endpoint:
+
+    python -m utilities.result_sink logs/results.jsonl
+
+or with `pytest --result-sink logs/results.jsonl` during a normal run.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+
+import pytest
+
+from utilities.latency_histogram import LatencyHistogram
+from utilities.metrics import request_metrics
+from utilities.read_config import ReadConfig
+
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+class ResultSink:
+    """
+    Buffered JSON-lines writer; subscribe it with `attach()` to receive every request and validation.
+
+    :param path: File to append to; created with its directory if missing.
+    :param buffer_size: Bytes buffered before a flush.
+    :param flush_interval_s: Maximum age of buffered records before a background flush.
+    """
+
+    def __init__(self, path, buffer_size=64 * 1024, flush_interval_s=1.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval_s = flush_interval_s
+        self.records_written = 0
+        self._file = open(path, "ab")
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="result-sink-flusher", daemon=True)
+        self._flusher.start()
+
+    def write(self, record):
+        line = _dumps(record).encode("utf-8") + b"\n"
+        with self._lock:
+            self._buffer += line
+            self.records_written += 1
+            if len(self._buffer) >= self.buffer_size:
+                self._flush_locked()
+
+    def write_request(self, sample):
+        self.write({
+            "k": "r", "t": round(sample.timestamp, 3), "m": sample.method, "e": sample.endpoint,
+            "s": sample.status, "l": round(sample.latency_ms, 3), "q": round(sample.queue_ms, 3),
+        })
+
+    def write_validation(self, sample):
+        self.write({"k": "v", "t": round(sample.timestamp, 3), "e": sample.endpoint, "c": sample.check, "p": sample.passed})
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._buffer.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval_s):
+            self.flush()
+
+    def attach(self):
+        request_metrics.subscribe(self.write_request)
+        request_metrics.subscribe_validation(self.write_validation)
+        return self
+
+    def close(self):
+        request_metrics.unsubscribe(self.write_request)
+        request_metrics.unsubscribe_validation(self.write_validation)
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._flush_locked()
+            self._file.close()
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def aggregate_results(paths):
+    """
+    Summarises result files in a single pass with memory bounded by the number of endpoints.
+
+    :param paths: One path or a list of paths (e.g. the per-worker files of an xdist run).
+    :return: Dict of endpoint -> summary with request counts, status classes, error rate,
+             latency percentiles and validation pass/fail counts, plus an `all` entry.
+    """
+    histograms = defaultdict(LatencyHistogram)
+    statuses = defaultdict(lambda: defaultdict(int))
+    validations = defaultdict(lambda: {"passed": 0, "failed": 0})
+
+    for path in [paths] if isinstance(paths, str) else paths:
+        with open(path, "rb") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a torn last line from an interrupted run
+                endpoint = record["e"]
+                if record["k"] == "r":
+                    histograms[endpoint].record(record["l"])
+                    histograms["all"].record(record["l"])
+                    status_class = f"{record['s'] // 100}xx" if record["s"] else "no_response"
+                    statuses[endpoint][status_class] += 1
+                    statuses["all"][status_class] += 1
+                elif record["k"] == "v":
+                    outcome = "passed" if record["p"] else "failed"
+                    validations[endpoint][outcome] += 1
+                    validations["all"][outcome] += 1
+
+    summary = {}
+    for endpoint in sorted(set(histograms) | set(validations)):
+        counts = statuses[endpoint]
+        requests_total = sum(counts.values())
+        errors = counts.get("5xx", 0) + counts.get("no_response", 0)
+        summary[endpoint] = {
+            "requests": requests_total,
+            "statuses": dict(counts),
+            "error_rate": errors / requests_total if requests_total else 0.0,
+            "latency": histograms[endpoint].summary(),
+            "validations": validations[endpoint],
+        }
+    return summary
+
+
+def pytest_addoption(parser):
+    parser.getgroup("result-sink", "streaming result sink").addoption(
+        "--result-sink", action="store", default=None, metavar="PATH",
+        help="Append every request and validation outcome to this JSON-lines file.",
+    )
+
+
+def pytest_configure(config):
+    path = config.getoption("result_sink") or ReadConfig.get_result_sink_path()
+    if not path:
+        return
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput:
+        # Each xdist worker writes its own file next to the requested one
+        root, extension = os.path.splitext(path)
+        path = f"{root}.{workerinput['workerid']}{extension}"
+    config._result_sink = ResultSink(
+        path, ReadConfig.get_result_sink_buffer_bytes(), ReadConfig.get_result_sink_flush_interval_seconds()
+    ).attach()
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_unconfigure(config):
+    sink = getattr(config, "_result_sink", None)
+    if sink:
+        sink.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a streaming result file.")
+    parser.add_argument("paths", nargs="+", help="JSON-lines files written by ResultSink")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = aggregate_results(args.paths)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+    print(f"{'endpoint':<32}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'val fail':>10}")
+    for endpoint, item in summary.items():
+        latency = item["latency"]
+        print(f"{endpoint:<32}{item['requests']:>10}{item['error_rate']:>8.2%}"
+              f"{latency['p50_ms'] or 0:>10.2f}{latency['p95_ms'] or 0:>10.2f}{latency['p99_ms'] or 0:>10.2f}"
+              f"{item['validations']['failed']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
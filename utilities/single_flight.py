@@ -0,0 +1,435 @@
+"""
+Single-flight coalescing of identical idempotent requests.
+
+When several callers issue the same GET at the same moment (`products/1`, the `products` list ...),
+only the first one - the leader - goes to the network; the others wait for it and get the very same
+response object, whose `json()` is parsed once and shared. Treat coalesced bodies as read-only.
+
+Requests are identical when method, URL, every request header (names case-folded, values
+stripped) and body hash match, so GETs with different Accept, Accept-Encoding or custom headers
+never share a response. With `[single_flight] window_ms` above zero, a finished response is also handed to
+identical requests arriving within that window. Any non-idempotent request made through
+`send_request` (POST, PUT, DELETE ...) ends all windows, so a test never reads its own stale state.
+
+Coalescing covers threads and asyncio tasks of one process. With `[single_flight] shared_state_dir`
+set, pytest-xdist workers and other processes coalesce too: the leader holds an OS lock on a small
+per-request file while its call is in flight and writes the response there for the waiters, as a
+JSON header (status, headers, encoding ...) followed by the raw body; waiters rebuild a
+`requests.Response` from it. The file goes away when the flight is over: at once without a reuse window, otherwise once the window
+has passed.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import weakref
+from collections import defaultdict
+from datetime import timedelta
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utilities.metrics import normalize_endpoint
+from utilities.read_config import ReadConfig
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process coalescing is not available
+    fcntl = None
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_OUTCOMES = ("network", "in_flight", "window", "shared")
+
+
+def share_parsed_body(response):
+    """Makes `response.json()` parse once and return the same object to every caller."""
+    parse = response.json
+    parsed = []
+    lock = threading.Lock()
+
+    def json_once(**kwargs):
+        if kwargs:
+            return parse(**kwargs)
+        with lock:
+            if not parsed:
+                parsed.append(parse())
+            return parsed[0]
+
+    response.json = json_once
+    return response
+
+
+class _Flight:
+    __slots__ = ("event", "future", "response", "error", "finished_at")
+
+    def __init__(self, event=None, future=None):
+        self.event = event
+        self.future = future
+        self.response = None
+        self.error = None
+        self.finished_at = None
+
+
+def _dump_response(response):
+    """:return: JSON header and body bytes of `response`; only plain data crosses processes."""
+    header = {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "url": response.url,
+        "encoding": response.encoding,
+        "headers": list(response.headers.items()),
+        "elapsed_s": response.elapsed.total_seconds() if response.elapsed is not None else None,
+        "http_version": getattr(response, "http_version", None),
+        "wire_bytes": getattr(response, "wire_bytes", None),
+        "request": [response.request.method, response.request.url] if response.request is not None else None,
+    }
+    return json.dumps(header).encode("utf-8"), response.content
+
+
+def _load_response(header, body):
+    header = json.loads(header)
+    response = requests.Response()
+    response.status_code = header["status_code"]
+    response._content = body
+    response.headers = CaseInsensitiveDict(header["headers"])
+    response.url = header["url"]
+    response.reason = header["reason"]
+    response.encoding = header["encoding"]
+    if header["elapsed_s"] is not None:
+        response.elapsed = timedelta(seconds=header["elapsed_s"])
+    response.http_version = header["http_version"]
+    response.wire_bytes = header["wire_bytes"]
+    if header["request"]:
+        request = requests.PreparedRequest()
+        request.prepare_method(header["request"][0])
+        request.prepare_url(header["request"][1], None)
+        response.request = request
+    return response
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SharedFlights:
+    """
+    Cross-process flights: one lock file per request key, holding the last response.
+
+    :param directory: Directory shared by the processes.
+    :param window_s: How long a finished response may be reused.
+    """
+
+    # Finish time and length of the JSON response header that follows; the body takes the rest of the file
+    _HEADER = struct.Struct("<dI")
+
+    def __init__(self, directory, window_s):
+        self.directory = directory
+        self.window_s = window_s
+        self.epoch_path = os.path.join(directory, "epoch")
+        self._exits = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def enter(self, key):
+        """
+        Locks the key's file, waiting while another process has the same request in flight.
+
+        :return: (file, response) - the response is None when the caller has to make the call itself.
+        """
+        arrived = time.time()
+        file = open(os.path.join(self.directory, f"{key}.flight"), "a+b")
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            waited = False
+        except BlockingIOError:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            waited = True
+        file.seek(0)
+        header = file.read(self._HEADER.size)
+        if len(header) < self._HEADER.size:
+            return file, None
+        finished_at, header_size = self._HEADER.unpack(header)
+        fresh_since = max(arrived if waited else arrived - self.window_s, self._epoch())
+        if finished_at < fresh_since:
+            return file, None
+        try:
+            return file, share_parsed_body(_load_response(file.read(header_size), file.read()))
+        except (ValueError, KeyError, TypeError):
+            return file, None  # torn or foreign file: make the call instead
+
+    def store(self, file, response):
+        file.seek(0)
+        file.truncate()
+        if response is None:
+            return
+        header, body = _dump_response(response)
+        file.write(self._HEADER.pack(time.time(), len(header)) + header + body)
+        file.flush()
+
+    def exit(self, file):
+        # Still holding the lock: waiters that opened the file before the unlink read the response from it
+        if not self.window_s:
+            _remove(file.name)
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        file.close()
+        self._exits += 1
+        if self.window_s and self._exits % 64 == 0:
+            self.sweep()
+
+    def sweep(self):
+        """Removes the files of flights whose reuse window is over; files locked by a flight in progress stay."""
+        expired_before = time.time() - self.window_s
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if not name.endswith(".flight") or os.stat(path).st_mtime >= expired_before:
+                    continue
+                with open(path, "rb") as file:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    _remove(path)
+            except (BlockingIOError, FileNotFoundError):
+                continue
+
+    def _epoch(self):
+        try:
+            return os.stat(self.epoch_path).st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def invalidate(self):
+        with open(self.epoch_path, "a"):
+            os.utime(self.epoch_path)
+
+
+class SingleFlight:
+    """
+    :param window_ms: Reuse a finished response for identical requests arriving this soon after it (0 = in flight only).
+    :param shared_state_dir: Directory for cross-process coalescing; None keeps it inside the process.
+    """
+
+    def __init__(self, window_ms=0, shared_state_dir=None):
+        self.window_s = window_ms / 1000
+        self.shared = SharedFlights(shared_state_dir, self.window_s) if shared_state_dir and fcntl else None
+        self._flights = {}
+        self._async_flights = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = defaultdict(lambda: dict.fromkeys(_OUTCOMES, 0))
+
+    @staticmethod
+    def key(method, url, headers=None, payload=None):
+        """:return: Hex key of an idempotent request, or None for requests that must not be coalesced."""
+        method = method.upper()
+        if method not in IDEMPOTENT_METHODS:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{method}\0{url}\0".encode("utf-8"))
+        normalized = sorted((str(name).strip().lower(), str(value).strip()) for name, value in (headers or {}).items())
+        for name, value in normalized:
+            digest.update(f"{name}:{value}\0".encode("utf-8"))
+        if isinstance(payload, (bytes, bytearray)):
+            digest.update(payload)
+        elif payload is not None:
+            digest.update(json.dumps(payload, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _count(self, endpoint, outcome):
+        with self._lock:
+            self._stats[normalize_endpoint(endpoint)][outcome] += 1
+
+    def _reusable(self, flight, now):
+        return flight is not None and (flight.finished_at is None or now - flight.finished_at <= self.window_s)
+
+    def _finish(self, flights, key, flight):
+        flight.finished_at = time.monotonic()
+        if flight.error is not None or not self.window_s:
+            if flights.get(key) is flight:
+                del flights[key]
+        self._created += 1
+        if self._created % 256 == 0:
+            expired = [item for item, entry in flights.items()
+                       if entry.finished_at is not None and flight.finished_at - entry.finished_at > self.window_s]
+            for item in expired:
+                del flights[item]
+
+    def invalidate(self):
+        """Ends every reuse window; called for each non-idempotent request."""
+        if not self.window_s:
+            return
+        with self._lock:
+            for flights in [self._flights, *self._async_flights.values()]:
+                for key in [key for key, flight in flights.items() if flight.finished_at is not None]:
+                    del flights[key]
+        if self.shared:
+            self.shared.invalidate()
+
+    def _call_shared(self, call):
+        def run(key):
+            file, response = self.shared.enter(key)
+            try:
+                if response is not None:
+                    return response, "shared"
+                response = call()
+                self.shared.store(file, response)
+                return response, "network"
+            finally:
+                self.shared.exit(file)
+        return run
+
+    def do(self, key, endpoint, call):
+        """
+        :param key: `key(...)` of the request.
+        :param endpoint: Endpoint for the statistics.
+        :param call: Makes the request; only the leader calls it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if not self._reusable(flight, time.monotonic()):
+                flight = self._flights[key] = _Flight(event=threading.Event())
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            outcome = "window" if flight.event.is_set() else "in_flight"
+            flight.event.wait()
+            self._count(endpoint, outcome)
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+        try:
+            if self.shared:
+                response, outcome = self._call_shared(call)(key)
+            else:
+                response, outcome = call(), "network"
+            flight.response = share_parsed_body(response) if response is not None else None
+            self._count(endpoint, outcome)
+            return flight.response
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                self._finish(self._flights, key, flight)
+            flight.event.set()
+
+    async def do_async(self, key, endpoint, call):
+        """Asyncio counterpart of `do`; `call` returns an awaitable."""
+        loop = asyncio.get_running_loop()
+        # invalidate() prunes these dicts from other threads, so every access holds the lock
+        with self._lock:
+            flights = self._async_flights.setdefault(loop, {})
+            flight = flights.get(key)
+            leader = not self._reusable(flight, time.monotonic())
+            if leader:
+                flight = flights[key] = _Flight(future=loop.create_future())
+        if not leader:
+            outcome = "window" if flight.future.done() else "in_flight"
+            response = await asyncio.shield(flight.future)
+            self._count(endpoint, outcome)
+            return response
+        try:
+            if self.shared:
+                file, response = await loop.run_in_executor(None, self.shared.enter, key)
+                try:
+                    outcome = "shared"
+                    if response is None:
+                        response, outcome = await call(), "network"
+                        await loop.run_in_executor(None, self.shared.store, file, response)
+                finally:
+                    await loop.run_in_executor(None, self.shared.exit, file)
+            else:
+                response, outcome = await call(), "network"
+            response = share_parsed_body(response) if response is not None else None
+            flight.future.set_result(response)
+            self._count(endpoint, outcome)
+            return response
+        except BaseException as error:
+            flight.error = error
+            if isinstance(error, asyncio.CancelledError):
+                flight.future.cancel()
+            else:
+                flight.future.set_exception(error)
+                flight.future.exception()  # retrieved here, so no "never retrieved" warning without followers
+            raise
+        finally:
+            with self._lock:
+                self._finish(flights, key, flight)
+
+    def stats(self):
+        """Dict of endpoint -> counts of `network` calls and requests coalesced `in_flight`, by `window` or `shared`."""
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._stats.items()}
+
+    def merge_stats(self, stats):
+        with self._lock:
+            for endpoint, counts in stats.items():
+                for outcome, count in counts.items():
+                    self._stats[endpoint][outcome] += count
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Returns the process-wide coalescer built from `[single_flight]`, or None when it is disabled."""
+    global _single_flight
+    if not ReadConfig.get_single_flight_enabled():
+        return None
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(
+                    window_ms=ReadConfig.get_single_flight_window_ms(),
+                    shared_state_dir=ReadConfig.get_single_flight_shared_state_dir(),
+                )
+    return _single_flight
+
+
+def format_stats(stats):
+    lines = []
+    totals = dict.fromkeys(_OUTCOMES, 0)
+    for endpoint, counts in sorted(stats.items()):
+        coalesced = counts["in_flight"] + counts["window"] + counts["shared"]
+        if not coalesced:
+            continue
+        for outcome in _OUTCOMES:
+            totals[outcome] += counts[outcome]
+        lines.append(f"{endpoint:<40}{counts['network']:>9}{counts['in_flight']:>11}"
+                     f"{counts['window']:>9}{counts['shared']:>9}")
+    if not lines:
+        return []
+    saved = totals["in_flight"] + totals["window"] + totals["shared"]
+    header = f"{'endpoint':<40}{'network':>9}{'in flight':>11}{'window':>9}{'shared':>9}"
+    summary = f"{saved} of {saved + totals['network']} idempotent requests coalesced"
+    return [header, *lines, summary]
+
+
+def pytest_sessionfinish(session):
+    workeroutput = getattr(session.config, "workeroutput", None)
+    if workeroutput is not None and _single_flight is not None:
+        workeroutput["single_flight_stats"] = _single_flight.stats()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    stats = getattr(node, "workeroutput", {}).get("single_flight_stats")
+    single_flight = get_single_flight()
+    if stats and single_flight:
+        single_flight.merge_stats(stats)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if hasattr(config, "workerinput") or _single_flight is None:
+        return
+    lines = format_stats(_single_flight.stats())
+    if lines:
+        terminalreporter.section("Request coalescing")
+        for line in lines:
+            terminalreporter.write_line(line)
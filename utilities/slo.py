@@ -0,0 +1,300 @@
+"""
+Latency and error-budget SLOs checked with a sequential statistical test.
+
+Budgets are declared per endpoint prefix in `[slo_endpoints]`, e.g. `products = p95 < 200, errors < 1%`.
+Every request made during the run (by any test) is fed to the engine through `request_metrics`, and
+`ResponseValidator.validate_response_time` asserts the endpoint's SLO instead of a single sample.
+
+Each budget is a bound on a proportion: `p95 < 200` means at most 5% of requests take longer than
+200 ms, `errors < 1%` means at most 1% end in a 5xx or no response. Each proportion is tracked by a
+sequential likelihood-ratio test of H0 "the budgeted rate" against H1 "`[slo] effect_ratio` times the
+budget". The SLO is reported violated once the likelihood ratio exceeds `1 / alpha`
+(alpha = 1 - `[slo] confidence`). By Ville's inequality that happens with probability at most alpha
+when the budget is met, however often the check is repeated during the run, so a slow outlier or two
+never fails a test. Rates between the budget and H1 form an indifference zone that is detected
+slowly or not at all.
+
+The terminal summary lists each budget with the estimated quantile, a distribution-free confidence
+interval for it, and a Wilson interval for the error rate.
+"""
+import math
+import re
+import threading
+from statistics import NormalDist
+
+import pytest
+
+from utilities.latency_histogram import LatencyHistogram
+from utilities.metrics import request_metrics
+from utilities.read_config import ReadConfig
+
+_BUDGET_TERM = re.compile(r"^(?:p(?P<quantile>\d+(?:\.\d+)?)\s*<\s*(?P<latency>\d+(?:\.\d+)?)\s*(?:ms)?"
+                          r"|errors\s*<\s*(?P<errors>\d+(?:\.\d+)?)\s*%)$")
+
+
+def parse_budget(value):
+    """
+    :param value: Budget such as `p95 < 200 ms, errors < 1%`; either term may be omitted.
+    :return: Dict with `quantile` (0..1), `latency_ms` and `error_rate`; missing terms are None.
+    """
+    budget = {"quantile": None, "latency_ms": None, "error_rate": None}
+    for term in filter(None, (part.strip() for part in value.split(","))):
+        match = _BUDGET_TERM.match(term)
+        if not match:
+            raise ValueError(f"Invalid SLO term '{term}'; expected 'p95 < 200 ms' or 'errors < 1%'.")
+        if match.group("quantile"):
+            budget["quantile"] = float(match.group("quantile")) / 100
+            budget["latency_ms"] = float(match.group("latency"))
+        else:
+            budget["error_rate"] = float(match.group("errors")) / 100
+    return budget
+
+
+def wilson_interval(successes, trials, confidence):
+    """Wilson score interval for a binomial proportion; (0, 1) without trials."""
+    if not trials:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    share = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (share + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(share * (1 - share) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def quantile_interval(histogram, quantile, confidence):
+    """
+    Distribution-free confidence interval for a quantile from the order statistics around rank n*q.
+
+    :return: (low_ms, high_ms), or (None, None) for an empty histogram.
+    """
+    n = histogram.total
+    if not n:
+        return None, None
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    spread = z * math.sqrt(n * quantile * (1 - quantile))
+    low_rank = max(1, math.floor(n * quantile - spread))
+    high_rank = min(n, math.ceil(n * quantile + spread) + 1)
+    return histogram.percentile(100 * low_rank / n), histogram.percentile(100 * high_rank / n)
+
+
+class SequentialTest:
+    """
+    Sequential likelihood-ratio test that a Bernoulli rate exceeds `budget_rate`.
+
+    :param budget_rate: Rate allowed by the SLO (H0).
+    :param effect_ratio: H1 rate as a multiple of the budget (capped below 1).
+    :param alpha: Chance of reporting a violation while the budget is met.
+    """
+
+    def __init__(self, budget_rate, effect_ratio, alpha):
+        self.budget_rate = budget_rate
+        violation_rate = min(budget_rate * effect_ratio, (1 + budget_rate) / 2)
+        self._hit = math.log(violation_rate / budget_rate)
+        self._miss = math.log((1 - violation_rate) / (1 - budget_rate))
+        self.threshold = math.log(1 / alpha)
+        self.trials = 0
+        self.hits = 0
+
+    def log_likelihood_ratio(self):
+        # A sum of per-sample terms, so order does not matter and counts from several processes add up
+        return self.hits * self._hit + (self.trials - self.hits) * self._miss
+
+    def violated(self):
+        return self.log_likelihood_ratio() >= self.threshold
+
+
+class _BudgetState:
+    def __init__(self, budget, effect_ratio, alpha):
+        self.budget = budget
+        self.histogram = LatencyHistogram()
+        self.latency_test = None
+        self.error_test = None
+        if budget["latency_ms"] is not None:
+            self.latency_test = SequentialTest(1 - budget["quantile"], effect_ratio, alpha)
+        if budget["error_rate"] is not None:
+            self.error_test = SequentialTest(budget["error_rate"], effect_ratio, alpha)
+        # Once violated, stays violated for the rest of the run
+        self.violations = []
+
+
+class SloEngine:
+    """
+    Collects every request sample and evaluates the configured budgets.
+
+    :param budgets: Dict of endpoint prefix -> budget dict (see `parse_budget`).
+    :param confidence: 1 - alpha of the sequential tests and of the reported intervals.
+    :param effect_ratio: How many times the budgeted rate the tests are designed to detect.
+    """
+
+    def __init__(self, budgets, confidence=0.95, effect_ratio=2.0):
+        self.confidence = confidence
+        self.effect_ratio = effect_ratio
+        # Longest prefix first so `users/login/` wins over `users`
+        self._states = {
+            prefix: _BudgetState(budget, effect_ratio, 1 - confidence)
+            for prefix, budget in sorted(budgets.items(), key=lambda item: -len(item[0]))
+        }
+        self._lock = threading.Lock()
+
+    def budget_for(self, endpoint_key):
+        """:return: The matching endpoint prefix, or None when no SLO covers the endpoint."""
+        for prefix in self._states:
+            if endpoint_key.startswith(prefix):
+                return prefix
+        return None
+
+    def record(self, sample):
+        prefix = self.budget_for(sample.endpoint)
+        if prefix is None:
+            return
+        state = self._states[prefix]
+        with self._lock:
+            state.histogram.record(sample.latency_ms)
+            if state.latency_test:
+                state.latency_test.trials += 1
+                state.latency_test.hits += sample.latency_ms > state.budget["latency_ms"]
+            if state.error_test:
+                state.error_test.trials += 1
+                state.error_test.hits += not sample.status or sample.status >= 500
+            self._update_violations(state)
+
+    def _update_violations(self, state):
+        if state.latency_test and state.latency_test.violated() and "latency" not in state.violations:
+            state.violations.append("latency")
+        if state.error_test and state.error_test.violated() and "errors" not in state.violations:
+            state.violations.append("errors")
+
+    def check(self, endpoint_key):
+        """
+        :return: (violated, message) for the SLO covering `endpoint_key`.
+        """
+        prefix = self.budget_for(endpoint_key)
+        if prefix is None:
+            return False, f"No SLO for '{endpoint_key}'"
+        status = self.status()[prefix]
+        return bool(status["violations"]), self.describe(prefix, status)
+
+    def status(self):
+        """Dict of endpoint prefix -> budget, sample counts, estimates, intervals and violations."""
+        result = {}
+        with self._lock:
+            for prefix, state in self._states.items():
+                budget = state.budget
+                entry = {"budget": dict(budget), "samples": state.histogram.total, "violations": list(state.violations)}
+                if state.latency_test:
+                    quantile = budget["quantile"]
+                    entry["latency_ms"] = state.histogram.percentile(quantile * 100)
+                    entry["latency_interval_ms"] = quantile_interval(state.histogram, quantile, self.confidence)
+                    entry["slow"] = state.latency_test.hits
+                if state.error_test:
+                    errors, trials = state.error_test.hits, state.error_test.trials
+                    entry["errors"] = errors
+                    entry["error_rate"] = errors / trials if trials else None
+                    entry["error_rate_interval"] = wilson_interval(errors, trials, self.confidence)
+                result[prefix] = entry
+        return result
+
+    def describe(self, prefix, status):
+        budget = status["budget"]
+        parts = [f"SLO '{prefix}' ({status['samples']} samples)"]
+        if budget["latency_ms"] is not None:
+            low, high = status["latency_interval_ms"]
+            estimate = status["latency_ms"]
+            parts.append(
+                f"p{budget['quantile'] * 100:g} < {budget['latency_ms']:g} ms: "
+                + (f"estimate {estimate:.1f} ms, {self.confidence:.0%} CI [{low:.1f}, {high:.1f}] ms, "
+                   f"{status['slow']} slow" if estimate is not None else "no samples")
+            )
+        if budget["error_rate"] is not None:
+            low, high = status["error_rate_interval"]
+            parts.append(
+                f"errors < {budget['error_rate']:.2%}: {status['errors']} errors, "
+                f"{self.confidence:.0%} CI [{low:.2%}, {high:.2%}]"
+            )
+        verdict = f"VIOLATED ({', '.join(status['violations'])})" if status["violations"] else "within budget"
+        return "; ".join(parts) + f" -> {verdict}"
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                prefix: {
+                    "histogram": state.histogram.to_dict(),
+                    "latency": [state.latency_test.trials, state.latency_test.hits] if state.latency_test else None,
+                    "errors": [state.error_test.trials, state.error_test.hits] if state.error_test else None,
+                }
+                for prefix, state in self._states.items()
+            }
+
+    def merge(self, data):
+        """Adds the samples of another engine's `to_dict()` (e.g. from an xdist worker)."""
+        with self._lock:
+            for prefix, item in data.items():
+                state = self._states.get(prefix)
+                if state is None:
+                    continue
+                state.histogram.merge(LatencyHistogram.from_dict(item["histogram"]))
+                for test, counts in ((state.latency_test, item["latency"]), (state.error_test, item["errors"])):
+                    if test and counts:
+                        test.trials += counts[0]
+                        test.hits += counts[1]
+                self._update_violations(state)
+        return self
+
+
+_slo_engine = None
+_slo_engine_lock = threading.Lock()
+
+
+def get_slo_engine():
+    """
+    Returns the process-wide engine built from `[slo]`, subscribed to `request_metrics`,
+    or None when SLOs are disabled or none are configured.
+    """
+    global _slo_engine
+    if not ReadConfig.get_slo_enabled():
+        return None
+    if _slo_engine is None:
+        with _slo_engine_lock:
+            if _slo_engine is None:
+                budgets = {
+                    prefix: parse_budget(value) for prefix, value in ReadConfig.get_slo_endpoint_budgets().items()
+                }
+                if not budgets:
+                    return None
+                engine = SloEngine(budgets, ReadConfig.get_slo_confidence(), ReadConfig.get_slo_effect_ratio())
+                request_metrics.subscribe(engine.record)
+                _slo_engine = engine
+    return _slo_engine
+
+
+def pytest_configure(config):
+    # Subscribe before the first request so the whole run is counted
+    config._slo_engine = get_slo_engine()
+
+
+def pytest_sessionfinish(session):
+    engine = getattr(session.config, "_slo_engine", None)
+    workeroutput = getattr(session.config, "workeroutput", None)
+    if engine and workeroutput is not None:
+        workeroutput["slo_state"] = engine.to_dict()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    engine = getattr(node.config, "_slo_engine", None)
+    state = getattr(node, "workeroutput", {}).get("slo_state")
+    if engine and state:
+        engine.merge(state)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    engine = getattr(config, "_slo_engine", None)
+    if not engine or hasattr(config, "workerinput"):
+        return
+    status = {prefix: item for prefix, item in engine.status().items() if item["samples"]}
+    if not status:
+        return
+    terminalreporter.section("SLOs")
+    for prefix, item in status.items():
+        terminalreporter.write_line(engine.describe(prefix, item))
@@ -0,0 +1,311 @@
+"""
+Soak-test mode: loops the existing test modules for hours and fails on sustained resource growth.
+
+The tests run in-process (repeated `pytest.main` sessions) so that leaks in the framework itself -
+logger handlers, sessions, responses and validators - show up next to leaks of the API under test.
+
+Usage:
+    python -m utilities.soak --minutes 240 test_cases/test_001_products_api.py -- -k "not rate_limiting"
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import pytest
+import requests
+
+from utilities.json_validator import ResponseValidator
+from utilities.metrics import request_metrics
+from utilities.read_config import ReadConfig
+from utilities.result_sink import ResultSink
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _read_rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is the peak, not the current size, but still catches steady growth
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _read_fd_counts():
+    fd_dir = "/proc/self/fd"
+    if not os.path.isdir(fd_dir):
+        return None, None
+    open_fds = 0
+    sockets = 0
+    for fd in os.listdir(fd_dir):
+        try:
+            target = os.readlink(os.path.join(fd_dir, fd))
+        except OSError:
+            continue
+        open_fds += 1
+        if target.startswith("socket:"):
+            sockets += 1
+    return open_fds, sockets
+
+
+def _count_log_handlers():
+    loggers = [logging.getLogger()] + [
+        item for item in logging.Logger.manager.loggerDict.values() if isinstance(item, logging.Logger)
+    ]
+    # pytest attaches and removes its own capture handlers every session; only count ours
+    return sum(
+        1 for item in loggers for handler in item.handlers if not type(handler).__module__.startswith("_pytest")
+    )
+
+
+def _count_framework_objects():
+    tracked = {"sessions": requests.Session, "responses": requests.Response, "validators": ResponseValidator}
+    counts = dict.fromkeys(tracked, 0)
+    for obj in gc.get_objects():
+        for key, cls in tracked.items():
+            if isinstance(obj, cls):
+                counts[key] += 1
+    return counts
+
+
+class _LatencyWindow:
+    """Collects request latencies between two samples; subscribed to `request_metrics`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = []
+        self._errors = 0
+
+    def __call__(self, sample):
+        with self._lock:
+            self._latencies.append(sample.latency_ms)
+            if sample.status is None or sample.status >= 500:
+                self._errors += 1
+
+    def drain(self):
+        with self._lock:
+            latencies, errors = self._latencies, self._errors
+            self._latencies, self._errors = [], 0
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "server_errors": errors,
+            "latency_p50_ms": _percentile(latencies, 0.50),
+            "latency_p95_ms": _percentile(latencies, 0.95),
+        }
+
+
+class SoakSampler:
+    """
+    Background thread taking one resource sample every `interval_seconds`.
+
+    :param interval_seconds: Time between samples.
+    :param top_allocations: Number of `tracemalloc` allocation sites (largest growth first) kept per sample.
+    """
+
+    def __init__(self, interval_seconds, top_allocations=10):
+        self.interval_seconds = interval_seconds
+        self.top_allocations = top_allocations
+        self.samples = []
+        self._latency = _LatencyWindow()
+        self._stop = threading.Event()
+        self._thread = None
+        self._baseline = None
+        self._started = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._baseline = tracemalloc.take_snapshot()
+        self._started = time.monotonic()
+        request_metrics.subscribe(self._latency)
+        self._thread = threading.Thread(target=self._run, name="soak-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        request_metrics.unsubscribe(self._latency)
+        self.sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.sample()
+
+    def sample(self):
+        open_fds, sockets = _read_fd_counts()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        top = snapshot.compare_to(self._baseline, "lineno")[:self.top_allocations]
+        sample = {
+            "timestamp": time.time(),
+            "elapsed_s": round(time.monotonic() - self._started, 3),
+            "rss_mb": _read_rss_mb(),
+            "open_fds": open_fds,
+            "sockets": sockets,
+            "traced_mb": traced_current / (1024 * 1024),
+            "traced_peak_mb": traced_peak / (1024 * 1024),
+            "log_handlers": _count_log_handlers(),
+            **_count_framework_objects(),
+            **self._latency.drain(),
+            "top_allocations": [
+                {"site": str(stat.traceback), "size_diff_kb": round(stat.size_diff / 1024, 1), "count_diff": stat.count_diff}
+                for stat in top
+            ],
+        }
+        self.samples.append(sample)
+        return sample
+
+
+def detect_sustained_growth(values, limit, warmup_fraction=0.2, relative=False):
+    """
+    Flags a series as leaking when it keeps growing after warm-up.
+
+    The post-warm-up part is split into thirds; growth is sustained when the thirds' means are
+    strictly increasing and the last third exceeds the first by more than `limit`.
+
+    :param values: Time-ordered samples (None entries are ignored).
+    :param limit: Allowed growth, absolute or in percent when `relative` is True.
+    :param warmup_fraction: Leading fraction of the samples to ignore.
+    :param relative: Compare growth in percent of the first third.
+    :return: Growth summary dict, or None when there are too few samples to judge.
+    """
+    values = [value for value in values if value is not None]
+    steady = values[int(len(values) * warmup_fraction):]
+    if len(steady) < 6:
+        return None
+    third = len(steady) // 3
+    first = sum(steady[:third]) / third
+    middle = sum(steady[third:2 * third]) / third
+    last = sum(steady[2 * third:]) / len(steady[2 * third:])
+    growth = last - first
+    if relative:
+        growth = growth / first * 100 if first else 0.0
+    return {
+        "first": first,
+        "last": last,
+        "growth": growth,
+        "limit": limit,
+        "sustained": first < middle < last and growth > limit,
+    }
+
+
+def run_soak(test_paths, duration_minutes=None, interval_seconds=None, pytest_args=(), report_path=None):
+    """
+    Repeats the given test modules until the duration has elapsed and writes a time-series report.
+
+    :param test_paths: Test modules or node ids passed to pytest; empty means the whole suite.
+    :param duration_minutes: How long to keep looping (defaults to `[soak] duration_minutes`).
+    :param interval_seconds: Time between resource samples (defaults to `[soak] sample_interval_seconds`).
+    :param pytest_args: Extra pytest arguments, e.g. `-k` filters.
+    :param report_path: Where to write the JSON report (defaults to `[soak] report_path`).
+    :return: Report dict; `report["passed"]` is False when any metric grew in a sustained way.
+    """
+    duration_minutes = duration_minutes or ReadConfig.get_soak_duration_minutes()
+    interval_seconds = interval_seconds or ReadConfig.get_soak_sample_interval_seconds()
+    report_path = report_path or ReadConfig.get_soak_report_path()
+    warmup_fraction = ReadConfig.get_soak_warmup_fraction()
+    limits = ReadConfig.get_soak_growth_limits()
+
+    sampler = SoakSampler(interval_seconds)
+    iterations = []
+    started = time.time()
+    deadline = time.monotonic() + duration_minutes * 60
+    sampler.start()
+    try:
+        while time.monotonic() < deadline:
+            iteration_started = time.monotonic()
+            exit_code = pytest.main([*test_paths, "-q", "-p", "no:cacheprovider", *pytest_args])
+            iterations.append({
+                "iteration": len(iterations) + 1,
+                "exit_code": int(exit_code),
+                "duration_s": round(time.monotonic() - iteration_started, 3),
+            })
+    finally:
+        sampler.stop()
+
+    samples = sampler.samples
+    growth = {
+        "rss_mb": detect_sustained_growth([s["rss_mb"] for s in samples], limits["rss_mb"], warmup_fraction),
+        "open_fds": detect_sustained_growth([s["open_fds"] for s in samples], limits["open_fds"], warmup_fraction),
+        "sockets": detect_sustained_growth([s["sockets"] for s in samples], limits["sockets"], warmup_fraction),
+        "log_handlers": detect_sustained_growth(
+            [s["log_handlers"] for s in samples], limits["log_handlers"], warmup_fraction
+        ),
+        **{name: detect_sustained_growth([s[name] for s in samples], limits[name], warmup_fraction)
+           for name in ("sessions", "responses", "validators")},
+        "latency_p95": detect_sustained_growth(
+            [s["latency_p95_ms"] for s in samples], limits["latency_percent"], warmup_fraction, relative=True
+        ),
+    }
+    leaks = sorted(name for name, result in growth.items() if result and result["sustained"])
+    report = {
+        "started": started,
+        "finished": time.time(),
+        "test_paths": list(test_paths),
+        "iterations": iterations,
+        "failed_iterations": sum(1 for item in iterations if item["exit_code"] != 0),
+        "growth": growth,
+        "leaks": leaks,
+        "passed": not leaks,
+        "samples": samples,
+    }
+
+    report_file = os.path.join(os.path.abspath(os.curdir), report_path)
+    os.makedirs(os.path.dirname(report_file), exist_ok=True)
+    with open(report_file, "w") as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loop test modules and fail on sustained resource growth.")
+    parser.add_argument("tests", nargs="*", help="Test modules or node ids (default: whole suite)")
+    parser.add_argument("--minutes", type=float, default=None, help="Soak duration in minutes")
+    parser.add_argument("--interval", type=float, default=None, help="Seconds between resource samples")
+    parser.add_argument("--report", default=None, help="Path of the JSON time-series report")
+    parser.add_argument("--results", default=None, help="Stream every request result to this JSON-lines file")
+    argv = list(sys.argv[1:] if argv is None else argv)
+    pytest_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, pytest_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    if args.results:
+        with ResultSink(args.results):
+            report = run_soak(args.tests, args.minutes, args.interval, pytest_args, args.report)
+    else:
+        report = run_soak(args.tests, args.minutes, args.interval, pytest_args, args.report)
+    for name, result in report["growth"].items():
+        if result:
+            print(f"{name}: {result['first']:.2f} -> {result['last']:.2f} "
+                  f"(growth {result['growth']:.2f}, limit {result['limit']}) "
+                  f"{'SUSTAINED GROWTH' if result['sustained'] else 'ok'}")
+        else:
+            print(f"{name}: not enough samples")
+    print(f"Iterations: {len(report['iterations'])}, failed: {report['failed_iterations']}")
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,412 @@
+"""
+One-pass JSON Schema validation over the raw response body.
+
+`validate_json_schema` normally costs three passes over a big list response: the body bytes,
+`response.json()` building the whole object tree, then `jsonschema` walking that tree.
+`StreamingValidator` instead tokenizes the body in place (a `memoryview`, no copy) and checks each
+value against the schema as it is read. Only object keys, values a keyword needs (`enum`,
+`pattern`, bounds ...) and the requested `fields` are ever decoded, so no object tree is built.
+
+Supported keywords: type, properties, required, additionalProperties, min/maxProperties, items
+(schema or list), additionalItems, min/maxItems, enum, const, minimum, maximum,
+exclusiveMinimum/Maximum (draft 4 and later forms), multipleOf, min/maxLength, pattern. Annotations
+such as format, title and description are ignored, as `jsonschema.validate` does without a format
+checker. Schemas using anything else ($ref, allOf, anyOf, oneOf, not, uniqueItems ...) raise
+`UnsupportedSchemaError`; `ResponseValidator` then falls back to `jsonschema`.
+"""
+import json
+import re
+from fractions import Fraction
+
+# String body: no raw control characters, only the escapes JSON defines
+_CHARS = rb'[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*'
+_TOKEN = re.compile(
+    rb'[ \t\n\r]*(?:"(' + _CHARS + rb')"'
+    rb'|(-?(?:0|[1-9][0-9]*)((?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?))'
+    rb'|([{}\[\],:])'
+    rb'|(true|false|null))'
+)
+_MEMBER_NAME = re.compile(rb'[ \t\n\r]*"(' + _CHARS + rb')"[ \t\n\r]*:')
+_TRAILING = re.compile(rb'[ \t\n\r]*')
+# Group numbers; _FRACTION is nested in _NUMBER and is empty for integer literals
+_STRING, _NUMBER, _FRACTION, _PUNCT, _LITERAL = 1, 2, 3, 4, 5
+
+_ANNOTATIONS = frozenset({
+    "$schema", "$id", "id", "$comment", "title", "description", "default", "examples", "format",
+    "definitions", "$defs", "readOnly", "writeOnly", "deprecated",
+})
+_SUPPORTED = _ANNOTATIONS | frozenset({
+    "type", "properties", "required", "additionalProperties", "minProperties", "maxProperties",
+    "items", "additionalItems", "minItems", "maxItems", "enum", "const", "minimum", "maximum",
+    "exclusiveMinimum", "exclusiveMaximum", "multipleOf", "minLength", "maxLength", "pattern",
+})
+_LITERAL_TYPES = {b"true": "boolean", b"false": "boolean", b"null": "null"}
+
+
+class UnsupportedSchemaError(ValueError):
+    pass
+
+
+class StreamValidationError(ValueError):
+    def __init__(self, message, path=()):
+        self.message = message
+        self.path = tuple(path)
+        super().__init__(f"{message} (at {format_path(self.path)})" if self.path else message)
+
+
+def format_path(path):
+    return "".join(f"[{part}]" if isinstance(part, int) else f".{part}" for part in path).lstrip(".") or "$"
+
+
+class _Node:
+    """A compiled schema: keyword values precomputed for the hot path."""
+
+    __slots__ = ("any", "types", "properties", "required", "additional", "min_properties", "max_properties",
+                 "items", "tuple_items", "additional_items", "min_items", "max_items", "enum", "bounds",
+                 "multiple_of", "min_length", "max_length", "pattern", "decode_strings", "required_names")
+
+    def __init__(self, schema):
+        if not isinstance(schema, dict):
+            raise UnsupportedSchemaError(f"Schema must be an object, got {schema!r}")
+        unsupported = sorted(set(schema) - _SUPPORTED)
+        if unsupported:
+            raise UnsupportedSchemaError(f"Keywords not supported by the streaming validator: {', '.join(unsupported)}")
+        types = schema.get("type")
+        self.types = frozenset([types] if isinstance(types, str) else types) if types is not None else None
+        self.properties = {
+            name.encode("utf-8"): _compile(value) for name, value in schema.get("properties", {}).items()
+        }
+        self.required = tuple(schema.get("required", ()))
+        self.required_names = frozenset(name.encode("utf-8") for name in self.required)
+        additional = schema.get("additionalProperties", True)
+        self.additional = _ANY if additional is True else (None if additional is False else _compile(additional))
+        self.min_properties = schema.get("minProperties")
+        self.max_properties = schema.get("maxProperties")
+        items = schema.get("items", {})
+        self.tuple_items = [_compile(item) for item in items] if isinstance(items, list) else None
+        self.items = None if isinstance(items, list) else _compile(items)
+        additional_items = schema.get("additionalItems", True)
+        self.additional_items = (_ANY if additional_items is True
+                                 else (None if additional_items is False else _compile(additional_items)))
+        self.min_items = schema.get("minItems")
+        self.max_items = schema.get("maxItems")
+        self.enum = list(schema["enum"]) if "enum" in schema else None
+        if "const" in schema:
+            # Both keywords hold: only enum options equal to the constant remain
+            const = schema["const"]
+            self.enum = [const] if self.enum is None else [value for value in self.enum if _equal(value, const)]
+        self.bounds = _bounds(schema)
+        self.multiple_of = schema.get("multipleOf")
+        self.min_length = schema.get("minLength")
+        self.max_length = schema.get("maxLength")
+        self.pattern = re.compile(schema["pattern"]) if "pattern" in schema else None
+        self.decode_strings = (self.enum is not None or self.pattern is not None
+                               or self.min_length is not None or self.max_length is not None)
+        self.any = not (set(schema) - _ANNOTATIONS)
+
+    def child(self, key):
+        node = self.properties.get(key)
+        return self.additional if node is None else node
+
+    def item(self, index):
+        if self.tuple_items is None:
+            return self.items
+        return self.tuple_items[index] if index < len(self.tuple_items) else self.additional_items
+
+
+def _bounds(schema):
+    """:return: List of (limit, exclusive, is_minimum) numeric bounds."""
+    bounds = []
+    for keyword, exclusive_keyword, is_minimum in (("minimum", "exclusiveMinimum", True),
+                                                   ("maximum", "exclusiveMaximum", False)):
+        exclusive = schema.get(exclusive_keyword)
+        if keyword in schema:
+            bounds.append((schema[keyword], exclusive is True, is_minimum))
+        if exclusive is not None and not isinstance(exclusive, bool):
+            bounds.append((exclusive, True, is_minimum))
+    return bounds
+
+
+_ANY = _Node.__new__(_Node)
+for _slot in _Node.__slots__:
+    setattr(_ANY, _slot, None)
+_ANY.any = True
+_ANY.properties = {}
+_ANY.required = ()
+_ANY.required_names = frozenset()
+_ANY.bounds = []
+_ANY.additional = _ANY
+_ANY.items = _ANY
+_ANY.decode_strings = False
+
+
+def _compile(schema):
+    """Shares one node for every schema that constrains nothing (`{}`)."""
+    if isinstance(schema, dict) and not set(schema) - _ANNOTATIONS:
+        return _ANY
+    return _Node(schema)
+
+
+def _field_trie(fields):
+    """`products.*.name` -> nested dicts keyed by member name, array index or `*`; None marks a field end."""
+    trie = {}
+    for field in fields:
+        level = trie
+        for part in field.split("."):
+            child = level.setdefault(part.encode("utf-8") if part != "*" else part, {})
+            if part.isdigit():
+                level[int(part)] = child
+            level = child
+        level[None] = field
+    return trie
+
+
+def _descend(tries, key):
+    children = []
+    for trie in tries:
+        for step in (key, "*"):
+            child = trie.get(step)
+            if child is not None:
+                children.append(child)
+    return children
+
+
+def _fail(message, frames):
+    path = [frame[3] for frame in frames if frame[3] is not None]
+    raise StreamValidationError(message, [part.decode("utf-8") if isinstance(part, bytes) else part for part in path])
+
+
+def _decode(view, start, end):
+    return json.loads(bytes(view[start:end]))
+
+
+def _invalid(view, pos, expected):
+    position = _TRAILING.match(view, pos).end()
+    found = "end of data" if position >= len(view) else repr(bytes(view[position:position + 1]).decode("latin-1"))
+    return StreamValidationError(f"Invalid JSON at offset {position}: expected {expected}, found {found}")
+
+
+class StreamingValidator:
+    """
+    :param schema: JSON Schema (dict) using the supported keywords.
+    :raises UnsupportedSchemaError: When the schema needs a keyword this validator does not implement.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.root = _compile(schema)
+        # Draft 6 made 1.0 an integer; drafts 3 and 4 only accept integer literals
+        draft = schema.get("$schema", "") if isinstance(schema, dict) else ""
+        self.integral_floats = not ("draft-03" in draft or "draft-04" in draft)
+
+    def validate(self, buffer, fields=()):
+        """
+        Validates a JSON document in one pass without building it.
+
+        :param buffer: Raw body (bytes, bytearray or memoryview).
+        :param fields: Dotted paths to decode on the way, e.g. `page` or `products.0._id`;
+                       `*` matches every array item or member (`products.*._id` gives a list).
+        :return: Dict of field -> decoded value; fields absent from the document are omitted.
+        :raises StreamValidationError: For invalid JSON or the first schema violation.
+        """
+        view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+        extracted = {}
+        wildcard = {field for field in fields if "*" in field.split(".")}
+        # frame: [is_object, node, member count, current member name or item index, required names seen,
+        #         field tries, offset of the opening bracket]
+        frames = []
+        match = _TOKEN.match
+        node, tries = self.root, [_field_trie(fields)] if fields else ()
+        pos = 0
+        while True:
+            # A value for `node` starts at `pos`
+            token = match(view, pos)
+            if token is None:
+                raise _invalid(view, pos, "a value")
+            pos = token.end()
+            kind = token.lastindex
+            if kind == _PUNCT:
+                punct = token.group(_PUNCT)
+                if punct != b"{" and punct != b"[":
+                    raise _invalid(view, token.start(_PUNCT), "a value")
+                is_object = punct == b"{"
+                if node.types is not None and ("object" if is_object else "array") not in node.types:
+                    _fail(f"{'object' if is_object else 'array'} is not of type {_type_names(node.types)}", frames)
+                frames.append([is_object, node, 0, None, set() if is_object and node.required else None,
+                               tries, pos - 1])
+                closing = match(view, pos)
+                if closing is None or closing.group(_PUNCT) != (b"}" if is_object else b"]"):
+                    node, tries, pos = self._next_member(frames, view, pos)
+                    continue
+                pos = closing.end()
+                self._close(frames, view, pos, extracted, wildcard)
+            else:
+                start = token.start(_STRING) - 1 if kind == _STRING else token.start(kind)
+                if not node.any:
+                    self._check_scalar(node, view, token, kind, start, pos, frames)
+                if tries:
+                    _store(tries, view, start, pos, extracted, wildcard)
+            # A value just ended: a comma or closing brackets follow, or the document is complete
+            while True:
+                if not frames:
+                    trailing = _TRAILING.match(view, pos).end()
+                    if trailing != len(view):
+                        raise _invalid(view, trailing, "end of data")
+                    return extracted
+                token = match(view, pos)
+                punct = token.group(_PUNCT) if token is not None and token.lastindex == _PUNCT else None
+                if punct == b",":
+                    node, tries, pos = self._next_member(frames, view, token.end())
+                    break
+                if punct != (b"}" if frames[-1][0] else b"]"):
+                    raise _invalid(view, pos, "',' or '}'" if frames[-1][0] else "',' or ']'")
+                pos = token.end()
+                self._close(frames, view, pos, extracted, wildcard)
+
+    @staticmethod
+    def _next_member(frames, view, pos):
+        """Moves to the next member or item; returns its (node, field tries, offset of the value)."""
+        frame = frames[-1]
+        container = frame[1]
+        frame[2] += 1
+        if not frame[0]:
+            index = frame[3] = frame[2] - 1
+            node = container.item(index)
+            if node is None:
+                _fail(f"Additional items are not allowed (more than {index} items)", frames)
+            return node, _descend(frame[5], index) if frame[5] else (), pos
+        member = _MEMBER_NAME.match(view, pos)
+        if member is None:
+            raise _invalid(view, pos, "a member name and ':'")
+        # Names stay UTF-8 bytes; only escaped ones are decoded (and re-encoded)
+        name = member.group(1)
+        if b"\\" in name:
+            name = json.loads(b'"' + name + b'"').encode("utf-8")
+        node = container.child(name)
+        if node is None:
+            frame[3] = None
+            _fail(f"Additional properties are not allowed ('{name.decode('utf-8')}' was unexpected)", frames)
+        frame[3] = name
+        if frame[4] is not None and name in container.required_names:
+            frame[4].add(name)
+        return node, _descend(frame[5], name) if frame[5] else (), member.end()
+
+    @staticmethod
+    def _close(frames, view, end, extracted, wildcard):
+        """Checks the container that just closed at `end`."""
+        is_object, node, count, _, seen, tries, start = frames.pop()
+        if is_object:
+            if seen is not None and len(seen) < len(node.required):
+                missing = next(name for name in node.required if name.encode("utf-8") not in seen)
+                _fail(f"'{missing}' is a required property", frames)
+            if node.min_properties is not None and count < node.min_properties:
+                _fail(f"Object has fewer than {node.min_properties} properties", frames)
+            if node.max_properties is not None and count > node.max_properties:
+                _fail(f"Object has more than {node.max_properties} properties", frames)
+        else:
+            if node.min_items is not None and count < node.min_items:
+                _fail(f"Array is too short ({count} < {node.min_items} items)", frames)
+            if node.max_items is not None and count > node.max_items:
+                _fail(f"Array is too long ({count} > {node.max_items} items)", frames)
+        if node.enum is not None:
+            value = _decode(view, start, end)
+            if not any(_equal(value, option) for option in node.enum):
+                _fail(f"{value!r} is not one of {node.enum!r}", frames)
+        if tries:
+            _store(tries, view, start, end, extracted, wildcard)
+
+    def _check_scalar(self, node, view, token, kind, start, end, frames):
+        if kind == _STRING:
+            json_type = "string"
+        elif kind == _NUMBER:
+            lexeme = token.group(_NUMBER)
+            json_type = "integer"
+            if token.start(_FRACTION) != token.end(_FRACTION) and not (
+                    self.integral_floats and float(lexeme).is_integer()):
+                json_type = "number"
+        else:
+            json_type = _LITERAL_TYPES[token.group(_LITERAL)]
+        types = node.types
+        if types is not None and json_type not in types and not (json_type == "integer" and "number" in types):
+            value = bytes(view[start:end]).decode("utf-8", "replace")
+            _fail(f"{value} is not of type {_type_names(types)}", frames)
+        if kind == _STRING:
+            if not node.decode_strings:
+                return
+            value = _decode(view, start, end)
+            if node.min_length is not None and len(value) < node.min_length:
+                _fail(f"{value!r} is too short", frames)
+            if node.max_length is not None and len(value) > node.max_length:
+                _fail(f"{value!r} is too long", frames)
+            if node.pattern is not None and not node.pattern.search(value):
+                _fail(f"{value!r} does not match {node.pattern.pattern!r}", frames)
+        elif kind == _NUMBER:
+            if not node.bounds and node.multiple_of is None and node.enum is None:
+                return
+            value = json.loads(lexeme)
+            for limit, exclusive, is_minimum in node.bounds:
+                if is_minimum and (value < limit or exclusive and value == limit):
+                    _fail(f"{value} is less than {'or equal to ' if exclusive else ''}the minimum of {limit}", frames)
+                if not is_minimum and (value > limit or exclusive and value == limit):
+                    _fail(f"{value} is greater than {'or equal to ' if exclusive else ''}the maximum of {limit}",
+                          frames)
+            if node.multiple_of is not None and not _is_multiple(value, node.multiple_of):
+                _fail(f"{value} is not a multiple of {node.multiple_of}", frames)
+        else:
+            value = json.loads(token.group(_LITERAL))
+        if node.enum is not None and not any(_equal(value, option) for option in node.enum):
+            _fail(f"{value!r} is not one of {node.enum!r}", frames)
+
+
+def _is_multiple(value, divisor):
+    # As jsonschema does: a float divisor is checked on the quotient, since 9.99 % 0.01 is not 0
+    if isinstance(divisor, float):
+        try:
+            quotient = value / divisor
+            return int(quotient) == quotient
+        except OverflowError:
+            return (Fraction(value) / Fraction(divisor)).denominator == 1
+    return not value % divisor
+
+
+def _type_names(types):
+    return ", ".join(f"'{name}'" for name in sorted(types))
+
+
+def _equal(value, option):
+    # JSON equality: true is not 1, inside arrays and objects too
+    if isinstance(value, bool) or isinstance(option, bool):
+        return type(value) is type(option) and value == option
+    if isinstance(value, list) and isinstance(option, list):
+        return len(value) == len(option) and all(map(_equal, value, option))
+    if isinstance(value, dict) and isinstance(option, dict):
+        return value.keys() == option.keys() and all(_equal(item, option[key]) for key, item in value.items())
+    return value == option
+
+
+def _store(tries, view, start, end, extracted, wildcard):
+    for trie in tries:
+        field = trie.get(None)
+        if field is None:
+            continue
+        value = _decode(view, start, end)
+        if field in wildcard:
+            extracted.setdefault(field, []).append(value)
+        else:
+            extracted[field] = value
+
+
+_validators = {}
+
+
+def streaming_validator(schema):
+    """Compiled validator for `schema`, cached for the life of the schema object."""
+    cached = _validators.get(id(schema))
+    if cached is None or cached.schema is not schema:
+        cached = _validators[id(schema)] = StreamingValidator(schema)
+    return cached
+
+
+def validate_stream(buffer, schema, fields=()):
+    """Shortcut for `streaming_validator(schema).validate(buffer, fields)`."""
+    return streaming_validator(schema).validate(buffer, fields)
@@ -0,0 +1,449 @@
+"""
+In-process stand-in for the shop backend, for benchmarks, fuzzing and load experiments.
+
+It mimics the endpoints from `[end_points]` closely enough for the framework's own code paths
+(status codes, error bodies, auth) but keeps everything in memory. `start_stub_server` serves it over
+HTTP/1.1 with the standard library; `start_h2_stub_server` serves the same API over HTTP/1.1 and
+cleartext HTTP/2 through `hypercorn` when it is installed.
+"""
+import asyncio
+import copy
+import gzip
+import json
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NOT_AUTHENTICATED = {"detail": "Authentication credentials were not provided."}
+NO_PERMISSION = {"detail": "You do not have permission to perform this action."}
+BAD_CREDENTIALS = {"detail": "No active account found with the given credentials"}
+
+
+class StubApi:
+    """
+    Transport-independent request handling: `handle` maps a request to `(status, json_payload)`.
+
+    :param product_count: Number of seeded products (product 1 matches the values the tests expect).
+    :param latency_ms: Artificial server time added to every request.
+    :param admin_username: Username of the seeded admin account.
+    :param admin_password: Password of the seeded admin account.
+    :param gzip_min_bytes: Gzip bodies of this size or more for clients that accept it (0 = never).
+    """
+
+    ADMIN_TOKEN = "stub-admin-token"
+
+    def __init__(self, product_count=20, latency_ms=0, admin_username="admin@example.com", admin_password="1234",
+                 gzip_min_bytes=0):
+        self.latency_ms = latency_ms
+        self.gzip_min_bytes = gzip_min_bytes
+        self._lock = threading.Lock()
+        self._next_user_id = 2
+        self._next_product_id = product_count + 1
+        self.requests_served = 0
+        self.users = {
+            1: {"_id": 1, "username": admin_username, "email": admin_username, "name": "Admin",
+                "isAdmin": True, "password": admin_password},
+        }
+        self.products = {product_id: self._seed_product(product_id) for product_id in range(1, product_count + 1)}
+        self._routes = [
+            ("POST", re.compile(r"^users/login/?$"), self._login),
+            ("POST", re.compile(r"^users/register/?$"), self._register),
+            ("GET", re.compile(r"^users/?$"), self._list_users),
+            ("PUT", re.compile(r"^users/profile/update/?$"), self._update_profile),
+            ("DELETE", re.compile(r"^users/delete/(?P<user_id>[^/]+)/?$"), self._delete_user),
+            ("GET", re.compile(r"^users/(?P<user_id>[^/]+)/?$"), self._get_user),
+            ("GET", re.compile(r"^products/?$"), self._list_products),
+            ("POST", re.compile(r"^products/create/?$"), self._create_product),
+            ("PUT", re.compile(r"^products/update/(?P<product_id>\d+)/?$"), self._update_product),
+            ("DELETE", re.compile(r"^products/delete/(?P<product_id>\d+)/?$"), self._delete_product),
+            ("GET", re.compile(r"^products/(?P<product_id>\d+)/?$"), self._get_product),
+        ]
+
+    @staticmethod
+    def _seed_product(product_id):
+        if product_id == 1:
+            return {
+                "_id": 1, "reviews": [], "name": "Airpods Wireless Bluetooth Headphones",
+                "image": "/images/airpods_rueLkRx.jpg", "brand": "Apple", "category": "Electronics",
+                "description": "Bluetooth technology lets you connect it with compatible devices wirelessly "
+                               "High-quality AAC audio offers immersive listening experience Built-in microphone "
+                               "allows you to take calls while working",
+                "rating": "3.00", "numReviews": 2, "price": "1998.99", "countInStock": 18,
+                "createdAt": "2024-08-13T19:30:16.537131Z", "user": 1,
+            }
+        return {
+            "_id": product_id, "reviews": [], "name": f"Stub Product {product_id}",
+            "image": f"/images/stub_{product_id}.jpg", "brand": "StubBrand", "category": "Stub",
+            "description": "Seeded by the stub server " * 4, "rating": "4.00", "numReviews": 0,
+            "price": f"{product_id * 10}.99", "countInStock": product_id % 25,
+            "createdAt": "2024-08-13T19:30:16.537131Z", "user": 1,
+        }
+
+    def handle(self, method, path, headers, body):
+        """
+        :param method: HTTP method.
+        :param path: Request path, with or without the `/api/` prefix.
+        :param headers: Dict of request headers (any case).
+        :param body: Raw request body bytes.
+        :return: Tuple of (status code, JSON-serializable payload).
+        """
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.requests_served += 1
+        path = path.split("?", 1)[0]
+        path = re.sub(r"^/?(api/)?", "", path)
+        headers = {key.lower(): value for key, value in headers.items()}
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match and route_method == method.upper():
+                return handler(self._authenticate(headers), body, **match.groupdict())
+        return 404, {"detail": "Not found."}
+
+    def _authenticate(self, headers):
+        authorization = headers.get("authorization", "")
+        if not authorization.startswith("Bearer "):
+            return None
+        token = authorization[len("Bearer "):]
+        if token == self.ADMIN_TOKEN:
+            return self.users[1]
+        user_id = token[len("stub-user-"):] if token.startswith("stub-user-") else ""
+        if user_id.isdigit():
+            with self._lock:
+                return self.users.get(int(user_id))
+        return None
+
+    @staticmethod
+    def _parse(body):
+        if not body:
+            return {}, None
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None, (400, {"detail": "JSON parse error."})
+        if not isinstance(data, dict):
+            return None, (400, {"non_field_errors": [f"Invalid data. Expected a dictionary, but got {type(data).__name__}."]})
+        return data, None
+
+    @staticmethod
+    def _public_user(user):
+        return {**{key: value for key, value in user.items() if key != "password"}, "id": user["_id"]}
+
+    def _token_for(self, user):
+        return self.ADMIN_TOKEN if user["isAdmin"] else f"stub-user-{user['_id']}"
+
+    def _login(self, current_user, body):
+        data, error = self._parse(body)
+        if error:
+            return error
+        errors = {}
+        for field in ("username", "password"):
+            if field not in data:
+                errors[field] = ["This field is required."]
+            elif data[field] == "":
+                errors[field] = ["This field may not be blank."]
+        if errors:
+            return 400, errors
+        with self._lock:
+            user = next((item for item in self.users.values() if item["username"] == data["username"]), None)
+        if not user or user["password"] != data["password"]:
+            return 401, BAD_CREDENTIALS
+        token = self._token_for(user)
+        return 200, {**self._public_user(user), "token": token, "access": token, "refresh": f"refresh-{token}"}
+
+    def _register(self, current_user, body):
+        data, error = self._parse(body)
+        if error:
+            return error
+        email = str(data.get("email", ""))
+        if "@" not in email:
+            return 400, {"email": ["Enter a valid email address."]}
+        with self._lock:
+            if any(user["email"] == email for user in self.users.values()):
+                return 400, {"detail": "User with this email already exists"}
+            user = {"_id": self._next_user_id, "username": email, "email": email, "name": data.get("name", ""),
+                    "isAdmin": False, "password": data.get("password", "")}
+            self.users[user["_id"]] = user
+            self._next_user_id += 1
+        return 200, {**self._public_user(user), "token": self._token_for(user)}
+
+    def _list_users(self, current_user, body):
+        if current_user is None:
+            return 401, NOT_AUTHENTICATED
+        if not current_user["isAdmin"]:
+            return 403, NO_PERMISSION
+        with self._lock:
+            return 200, [self._public_user(user) for user in self.users.values()]
+
+    def _get_user(self, current_user, body, user_id):
+        if current_user is None:
+            return 401, NOT_AUTHENTICATED
+        if not current_user["isAdmin"]:
+            return 403, NO_PERMISSION
+        with self._lock:
+            user = self.users.get(int(user_id)) if user_id.isdigit() else None
+        if not user:
+            return 404, {"detail": "Not found."}
+        return 200, self._public_user(user)
+
+    def _update_profile(self, current_user, body):
+        if current_user is None:
+            return 401, NOT_AUTHENTICATED
+        data, error = self._parse(body)
+        if error:
+            return error
+        if not data.get("name"):
+            return 500, {"detail": "Server error."}
+        with self._lock:
+            current_user["name"] = data["name"]
+            if data.get("email"):
+                current_user["email"] = current_user["username"] = data["email"]
+            if data.get("password"):
+                current_user["password"] = data["password"]
+            return 200, {**self._public_user(current_user), "token": self._token_for(current_user)}
+
+    def _delete_user(self, current_user, body, user_id):
+        if current_user is None:
+            return 401, NOT_AUTHENTICATED
+        if not current_user["isAdmin"]:
+            return 403, NO_PERMISSION
+        with self._lock:
+            if not user_id.isdigit() or self.users.pop(int(user_id), None) is None:
+                return 404, {"detail": "Not found."}
+        return 200, "User was deleted"
+
+    def _list_products(self, current_user, body):
+        with self._lock:
+            products = copy.deepcopy(list(self.products.values()))
+        return 200, {"products": products, "page": 1, "pages": 1}
+
+    def _get_product(self, current_user, body, product_id):
+        with self._lock:
+            product = copy.deepcopy(self.products.get(int(product_id)))
+        if product is None:
+            return 404, {"detail": "Not found."}
+        return 200, product
+
+    def _validate_product_fields(self, data):
+        if "price" in data:
+            try:
+                data["price"] = f"{Decimal(str(data['price'])):.2f}"
+            except InvalidOperation:
+                return 400, {"price": ["A valid number is required."]}
+        if "countInStock" in data and not isinstance(data["countInStock"], int):
+            return 400, {"countInStock": ["A valid integer is required."]}
+        return None
+
+    def _create_product(self, current_user, body):
+        if current_user is None:
+            return 401, NOT_AUTHENTICATED
+        if not current_user["isAdmin"]:
+            return 403, NO_PERMISSION
+        data, error = self._parse(body)
+        if error:
+            return error
+        error = self._validate_product_fields(data)
+        if error:
+            return error
+        with self._lock:
+            product = {
+                "_id": self._next_product_id, "reviews": [], "name": data.get("name", "Sample Name"),
+                "image": data.get("image", "/placeholder.png"), "brand": data.get("brand", "Sample Brand"),
+                "category": data.get("category", "Sample Category"), "description": data.get("description", ""),
+                "rating": None, "numReviews": 0, "price": data.get("price", "0.00"),
+                "countInStock": data.get("countInStock", 0),
+                "createdAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"), "user": current_user["_id"],
+            }
+            self.products[product["_id"]] = product
+            self._next_product_id += 1
+            return 200, copy.deepcopy(product)
+
+    def _update_product(self, current_user, body, product_id):
+        if current_user is None:
+            return 401, NOT_AUTHENTICATED
+        if not current_user["isAdmin"]:
+            return 403, NO_PERMISSION
+        data, error = self._parse(body)
+        if error:
+            return error
+        error = self._validate_product_fields(data)
+        if error:
+            return error
+        with self._lock:
+            product = self.products.get(int(product_id))
+            if product is None:
+                return 404, {"detail": "Not found."}
+            product.update({key: value for key, value in data.items() if key in product and key != "_id"})
+            return 200, copy.deepcopy(product)
+
+    def _delete_product(self, current_user, body, product_id):
+        if current_user is None:
+            return 401, NOT_AUTHENTICATED
+        if not current_user["isAdmin"]:
+            return 403, NO_PERMISSION
+        with self._lock:
+            if self.products.pop(int(product_id), None) is None:
+                return 404, {"detail": "Not found."}
+        return 200, "Product Deleted"
+
+
+def _encode(payload):
+    return json.dumps(payload).encode("utf-8")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, keep-alive clients wait ~40 ms for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, payload = self.server.api.handle(self.command, self.path, dict(self.headers.items()), body)
+        content = _encode(payload)
+        gzip_min_bytes = self.server.api.gzip_min_bytes
+        compress = gzip_min_bytes and len(content) >= gzip_min_bytes and "gzip" in self.headers.get("Accept-Encoding", "")
+        if compress:
+            content = gzip.compress(content, 6)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    # socketserver's default backlog of 5 drops SYNs as soon as a few dozen clients connect at once
+    request_queue_size = 128
+
+
+class StubServer:
+    """A running stand-in server; use as a context manager or call `stop()`."""
+
+    def __init__(self, api, base_url, stop):
+        self.api = api
+        self.base_url = base_url
+        self._stop = stop
+
+    def stop(self):
+        self._stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def start_stub_server(host="127.0.0.1", port=0, api=None, **api_kwargs):
+    """
+    Serves a `StubApi` over HTTP/1.1 (keep-alive) from a background thread.
+
+    :return: `StubServer` whose `base_url` ends with `/api/`, like `[common] base_url`.
+    """
+    api = api or StubApi(**api_kwargs)
+    server = _StubHTTPServer((host, port), _StubHandler)
+    server.daemon_threads = True
+    server.api = api
+    thread = threading.Thread(target=server.serve_forever, name="stub-server", daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return StubServer(api, f"http://{host}:{server.server_address[1]}/api/", stop)
+
+
+def asgi_app(api):
+    """Wraps a `StubApi` as an ASGI application."""
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        status, payload = api.handle(scope["method"], scope["path"], headers, body)
+        content = _encode(payload)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+    return app
+
+
+def start_h2_stub_server(host="127.0.0.1", api=None, **api_kwargs):
+    """
+    Serves a `StubApi` through hypercorn, which accepts HTTP/1.1 and cleartext HTTP/2 (prior knowledge).
+
+    :raises ImportError: When hypercorn is not installed.
+    """
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    api = api or StubApi(**api_kwargs)
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        port = probe.getsockname()[1]
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    config.accesslog = None
+    config.errorlog = None
+
+    loop = asyncio.new_event_loop()
+    shutdown = {}
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        # The event has to be created inside the loop it is awaited on
+        shutdown["event"] = asyncio.Event()
+        loop.call_soon(started.set)
+        loop.run_until_complete(serve(asgi_app(api), config, shutdown_trigger=shutdown["event"].wait))
+
+    thread = threading.Thread(target=run, name="h2-stub-server", daemon=True)
+    thread.start()
+    started.wait()
+    _wait_for_port(host, port)
+
+    def stop():
+        loop.call_soon_threadsafe(shutdown["event"].set)
+        thread.join(timeout=5)
+
+    return StubServer(api, f"http://{host}:{port}/api/", stop)
+
+
+def _wait_for_port(host, port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.02)
+    raise TimeoutError(f"Stub server did not start on {host}:{port}")
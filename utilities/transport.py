@@ -0,0 +1,321 @@
+"""
+HTTP transports behind `send_request`.
+
+`http1` (default) keeps one pooled keep-alive `requests.Session` per live thread. `http2` multiplexes all
+in-flight requests to a host over a single connection with `httpx` (needs `httpx[http2]`); responses
+are converted to `requests.Response` so that validators and tests do not care which transport ran.
+When `httpx`/`h2` are missing, or a cleartext server rejects HTTP/2 prior knowledge, the transport
+falls back to HTTP/1.1; only GET, HEAD and OPTIONS are re-sent after such a rejection.
+
+Both offer the `[compression] encodings` that can be decoded here in `Accept-Encoding` and set
+`response.wire_bytes` to the body size as received, before decoding.
+"""
+import asyncio
+import functools
+import importlib.util
+import logging
+import threading
+import weakref
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from utilities.read_config import ReadConfig
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+_log = logging.getLogger(__name__)
+
+# Methods that may be sent again after a failure that left it unclear whether the server acted on them
+_RETRY_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class _ThreadSession:
+    """Holds a thread's session in its thread-local; dropped, and the session closed, when the thread ends."""
+
+    __slots__ = ("session", "__weakref__")
+
+    def __init__(self, session):
+        self.session = session
+
+
+class RequestsTransport:
+    """
+    HTTP/1.1 keep-alive transport with one pooled session per thread. A session is closed when its
+    thread ends, so executors that come and go (`asyncio.run`, per-call thread pools) do not pile up
+    sessions and sockets.
+
+    :param pool_maxsize: Connections kept per host in each session's pool.
+    """
+
+    name = "http1"
+
+    def __init__(self, pool_maxsize=10, accept_encoding=None):
+        self.pool_maxsize = pool_maxsize
+        self.accept_encoding = accept_encoding
+        self._local = threading.local()
+        self._sessions = set()
+        self._lock = threading.Lock()
+
+    def _session(self):
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_maxsize, pool_maxsize=self.pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            # Tests decide on auth explicitly; cookies must not leak from one call into the next
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            if self.accept_encoding:
+                session.headers["Accept-Encoding"] = self.accept_encoding
+            holder = self._local.holder = _ThreadSession(session)
+            weakref.finalize(holder, self._release, session)
+            with self._lock:
+                self._sessions.add(session)
+        return holder.session
+
+    def _release(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+        session.close()
+
+    def request(self, method, url, headers=None, json=None, data=None, timeout=None):
+        response = self._session().request(method, url, headers=headers, json=json, data=data, timeout=timeout)
+        # The body has been read by now; urllib3 counts the bytes it pulled off the socket, before decoding
+        response.wire_bytes = response.raw.tell() if hasattr(response.raw, "tell") else None
+        return response
+
+    async def request_async(self, method, url, headers=None, json=None, data=None, timeout=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.request, method, url, headers, json, data, timeout)
+        )
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, set()
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
+
+
+class Http2Transport:
+    """
+    HTTP/2 transport built on `httpx`, with HTTP/1.1 fallback per host.
+
+    :param prior_knowledge: Speak HTTP/2 straight away on `http://` URLs (h2c). Over TLS, HTTP/2 is negotiated via ALPN.
+    :param max_connections: Upper bound on open connections; with HTTP/2 one per host is normally enough.
+    :param accept_encoding: `Accept-Encoding` sent with every request unless the caller sets one.
+    """
+
+    name = "http2"
+
+    def __init__(self, prior_knowledge=False, max_connections=10, accept_encoding=None):
+        self.prior_knowledge = prior_knowledge
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._headers = {"Accept-Encoding": accept_encoding} if accept_encoding else None
+        self._client = httpx.Client(http2=True, http1=not prior_knowledge, limits=self._limits, headers=self._headers)
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._http1_hosts = set()
+        self._http2_hosts = set()
+        self._fallback = RequestsTransport(pool_maxsize=max_connections, accept_encoding=accept_encoding)
+
+    def _uses_fallback(self, url):
+        return urlsplit(url).netloc in self._http1_hosts
+
+    def _fall_back(self, method, url, error):
+        """
+        Decides what a dropped connection under prior knowledge means.
+
+        A host that never answered over HTTP/2 is taken to reject the preface and is switched to HTTP/1.1
+        for good; the request is re-sent there only when its method is safe to repeat. On a host that has
+        answered over HTTP/2 the error (GOAWAY, a stream reset mid-response) is a plain failure.
+
+        :return: True when the caller should re-send the request over HTTP/1.1.
+        """
+        host = urlsplit(url).netloc
+        if not self.prior_knowledge or host in self._http2_hosts:
+            raise _to_requests_exception(error) from error
+        if host not in self._http1_hosts:
+            _log.warning(f"HTTP/2 prior knowledge rejected by {host} ({error}); falling back to HTTP/1.1")
+            self._http1_hosts.add(host)
+        if method.upper() not in _RETRY_SAFE_METHODS:
+            raise _to_requests_exception(error) from error
+        return True
+
+    def _answered(self, url, response):
+        if response.http_version == "HTTP/2":
+            self._http2_hosts.add(urlsplit(url).netloc)
+        return _to_requests_response(response)
+
+    def request(self, method, url, headers=None, json=None, data=None, timeout=None):
+        if self._uses_fallback(url):
+            return self._fallback.request(method, url, headers, json, data, timeout)
+        try:
+            response = self._client.request(method, url, headers=headers, json=json, content=data,
+                                         timeout=_to_httpx_timeout(timeout))
+        except _PREFACE_ERRORS as error:
+            self._fall_back(method, url, error)
+            return self._fallback.request(method, url, headers, json, data, timeout)
+        except httpx.HTTPError as error:
+            raise _to_requests_exception(error) from error
+        return self._answered(url, response)
+
+    async def _async_client(self):
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(http2=True, http1=not self.prior_knowledge, limits=self._limits,
+                                       headers=self._headers)
+            closer = _close_on_shutdown(client)
+            # Starting the generator registers it with the loop; asyncio.run closes it, and the client, on the way out
+            await closer.__anext__()
+            entry = self._async_clients[loop] = client, closer
+        return entry[0]
+
+    async def request_async(self, method, url, headers=None, json=None, data=None, timeout=None):
+        if self._uses_fallback(url):
+            return await self._fallback.request_async(method, url, headers, json, data, timeout)
+        client = await self._async_client()
+        try:
+            response = await client.request(
+                method, url, headers=headers, json=json, content=data, timeout=_to_httpx_timeout(timeout)
+            )
+        except _PREFACE_ERRORS as error:
+            self._fall_back(method, url, error)
+            return await self._fallback.request_async(method, url, headers, json, data, timeout)
+        except httpx.HTTPError as error:
+            raise _to_requests_exception(error) from error
+        return self._answered(url, response)
+
+    def close(self):
+        self._client.close()
+        for loop, (client, closer) in list(self._async_clients.items()):
+            # Clients of loops still open but idle are closed here; running loops close theirs on shutdown
+            if not loop.is_closed() and not loop.is_running():
+                loop.run_until_complete(closer.aclose())
+        self._async_clients.clear()
+        self._fallback.close()
+
+
+# An HTTP/1.1 server drops the connection on the HTTP/2 preface; depending on timing the client
+# sees a protocol error or a broken read or write
+_PREFACE_ERRORS = (httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError) if httpx else ()
+
+
+async def _close_on_shutdown(client):
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def _to_requests_response(httpx_response):
+    response = requests.Response()
+    response.status_code = httpx_response.status_code
+    response._content = httpx_response.content
+    response.headers = CaseInsensitiveDict(httpx_response.headers.items())
+    response.url = str(httpx_response.url)
+    response.reason = httpx_response.reason_phrase
+    response.encoding = httpx_response.encoding
+    response.elapsed = httpx_response.elapsed
+    response.http_version = httpx_response.http_version
+    response.wire_bytes = httpx_response.num_bytes_downloaded
+    request = requests.PreparedRequest()
+    request.prepare_method(httpx_response.request.method)
+    request.prepare_url(str(httpx_response.request.url), None)
+    response.request = request
+    return response
+
+
+def _to_httpx_timeout(timeout):
+    # requests takes (connect, read); httpx reads a tuple as (connect, read, write, pool)
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return timeout
+
+
+def _to_requests_exception(error):
+    # Keep send_request's contract: callers only ever see requests' exception types
+    if isinstance(error, httpx.ReadTimeout):
+        return requests.ReadTimeout(str(error))
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.ConnectTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return requests.Timeout(str(error))
+    if isinstance(error, (httpx.ConnectError, httpx.NetworkError)):
+        return requests.ConnectionError(str(error))
+    return requests.RequestException(str(error))
+
+
+def available_encodings():
+    """Content codings both transports can decode here: gzip and deflate always, br and zstd with their packages."""
+    encodings = ["gzip", "deflate"]
+    if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi"):
+        encodings.append("br")
+    if importlib.util.find_spec("zstandard"):
+        encodings.append("zstd")
+    return encodings
+
+
+def negotiated_encoding(wanted):
+    """
+    :param wanted: Codings in order of preference, e.g. `[compression] encodings`.
+    :return: `Accept-Encoding` value with the ones that can be decoded, or `identity` when none is left.
+    """
+    available = available_encodings()
+    return ", ".join(encoding for encoding in wanted if encoding in available) or "identity"
+
+
+def http2_available():
+    return httpx is not None and importlib.util.find_spec("h2") is not None
+
+
+def create_transport(protocol, prior_knowledge=False, pool_maxsize=10, accept_encoding=None):
+    """
+    :param protocol: `http1` or `http2`.
+    :param accept_encoding: Default `Accept-Encoding`; None keeps the HTTP library's own default.
+    :return: A transport instance; `http2` degrades to `http1` when its dependencies are missing.
+    """
+    if protocol == "http2":
+        if http2_available():
+            return Http2Transport(prior_knowledge=prior_knowledge, max_connections=pool_maxsize,
+                                  accept_encoding=accept_encoding)
+        _log.warning("HTTP/2 transport requested but httpx[http2] is not installed; using HTTP/1.1")
+    elif protocol != "http1":
+        raise ValueError(f"Unknown transport protocol: {protocol}")
+    return RequestsTransport(pool_maxsize=pool_maxsize, accept_encoding=accept_encoding)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Returns the process-wide transport configured in `[transport]`."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = create_transport(
+                    ReadConfig.get_transport_protocol(),
+                    prior_knowledge=ReadConfig.get_transport_http2_prior_knowledge(),
+                    pool_maxsize=ReadConfig.get_transport_pool_maxsize(),
+                    accept_encoding=negotiated_encoding(ReadConfig.get_compression_encodings()),
+                )
+    return _transport
+
+
+def set_transport(transport):
+    """Replaces the process-wide transport (benchmarks switch between transports this way)."""
+    global _transport
+    with _transport_lock:
+        previous, _transport = _transport, transport
+    return previous